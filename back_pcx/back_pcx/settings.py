@@ -52,6 +52,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Inactive unless REQUEST_PROFILING_ENABLED is set
+    'main.middleware.RequestProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.common.CommonMiddleware',
@@ -97,6 +99,19 @@ DATABASES = {
 }
 
 
+# Cache
+# Catalog responses are cached here (main.caching). locmem is per process; point
+# CACHE_BACKEND at the file or database backend when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'back-pcx'),
+    }
+}
+
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -146,8 +161,11 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ]
+        # JWTAuthentication that builds request.user from token claims (see main.authentication)
+        'main.authentication.ClaimsJWTAuthentication',
+    ],
+    # Keyset pagination is opt-in per request (?page_size= / ?cursor=) unless PAGE_SIZE is set
+    'DEFAULT_PAGINATION_CLASS': 'main.pagination.KeysetPagination',
     # 'DEFAULT_PAGINATION_CLASS': 'main.pagination.CustomPagination',
     # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     # 'PAGE_SIZE': 10
@@ -156,8 +174,15 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.environ.get('JWT_ACCESS_MINUTES', 55))),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=int(os.environ.get('JWT_REFRESH_DAYS', 1))),
+    # Tokens carry user_type, customer_id and vendor_id
+    'TOKEN_OBTAIN_SERIALIZER': 'main.authentication.AccountTokenObtainPairSerializer',
+    # Refreshing re-reads those claims, so role and profile changes reach the next access token
+    'TOKEN_REFRESH_SERIALIZER': 'main.authentication.AccountTokenRefreshSerializer',
 }
 
+# Seconds a user's active flag is trusted before ClaimsJWTAuthentication re-reads it
+AUTH_USER_STATE_TTL = int(os.environ.get('AUTH_USER_STATE_TTL', 60))
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = os.environ.get('CORS_ALLOW_ALL_ORIGINS', 'True') == 'True'
 
@@ -186,4 +211,47 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
-AUTH_USER_MODEL = 'main.CustomUser'
\ No newline at end of file
+AUTH_USER_MODEL = 'main.CustomUser'
+
+# Recommendation candidates kept per category pool (refresh_recommendation_pools) and seconds a worker keeps a pool
+RECOMMENDATION_POOL_SIZE = int(os.environ.get('RECOMMENDATION_POOL_SIZE', 500))
+RECOMMENDATION_POOL_TTL = int(os.environ.get('RECOMMENDATION_POOL_TTL', 300))
+
+# Product statistics counters are buffered per process and flushed in batches
+STATISTICS_FLUSH_INTERVAL = float(os.environ.get('STATISTICS_FLUSH_INTERVAL', 5))
+STATISTICS_MAX_PENDING = int(os.environ.get('STATISTICS_MAX_PENDING', 10000))
+
+# Responsive image derivatives (see main.images); 0 workers renders uploads in-process
+IMAGE_DERIVATIVE_WIDTHS = tuple(int(w) for w in os.environ.get('IMAGE_DERIVATIVE_WIDTHS', '160,320,640,1024').split(','))
+IMAGE_DERIVATIVE_FORMATS = tuple(os.environ.get('IMAGE_DERIVATIVE_FORMATS', 'webp,jpeg').split(','))
+IMAGE_DERIVATIVE_QUALITY = int(os.environ.get('IMAGE_DERIVATIVE_QUALITY', 80))
+IMAGE_DERIVATIVE_WORKERS = int(os.environ.get('IMAGE_DERIVATIVE_WORKERS', 2))
+
+# Most distinct products accepted in one /api/checkout/ cart
+CHECKOUT_MAX_ITEMS = int(os.environ.get('CHECKOUT_MAX_ITEMS', 100))
+
+# interaction_score = sum(weight * field) * 0.5 ** (age / half-life); see main.scoring
+INTERACTION_SCORE_WEIGHTS = {
+    field: float(weight) for field, weight in (
+        entry.split(':') for entry in os.environ.get(
+            'INTERACTION_SCORE_WEIGHTS', 'view_count:1,added_to_cart:3,added_to_wishlist:2,purchased:5'
+        ).split(',')
+    )
+}
+INTERACTION_SCORE_HALF_LIFE_DAYS = float(os.environ.get('INTERACTION_SCORE_HALF_LIFE_DAYS', 30))
+
+# Most events accepted in one /api/interaction-events/ batch
+INTERACTION_BATCH_MAX_EVENTS = int(os.environ.get('INTERACTION_BATCH_MAX_EVENTS', 500))
+
+# Where build_item_similarity publishes the item-item model that workers memory-map (main.itemcf)
+ITEM_SIMILARITY_DIR = os.environ.get('ITEM_SIMILARITY_DIR', os.path.join(BASE_DIR, 'var', 'item_similarity'))
+ITEM_SIMILARITY_TTL = int(os.environ.get('ITEM_SIMILARITY_TTL', 300))
+
+# Threads the async dashboard views run their queries on, shared by the process; 0 runs them in order
+DASHBOARD_QUERY_WORKERS = int(os.environ.get('DASHBOARD_QUERY_WORKERS', 4))
+
+# Per-request SQL and timing profiling (see main.middleware)
+REQUEST_PROFILING_ENABLED = os.environ.get('REQUEST_PROFILING_ENABLED', 'False') == 'True'
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 0.05))
+REQUEST_PROFILING_SLOW_MS = float(os.environ.get('REQUEST_PROFILING_SLOW_MS', 500))
+REQUEST_PROFILING_REPEAT_THRESHOLD = int(os.environ.get('REQUEST_PROFILING_REPEAT_THRESHOLD', 5))
@@ -0,0 +1,151 @@
+"""
+JWT authentication without a user query per request.
+
+Tokens issued by ``AccountToken`` (login and ``/api/token/``) carry the
+caller's ``user_type``, ``customer_id`` and ``vendor_id`` plus the staff
+flags. ``ClaimsJWTAuthentication`` turns such a token into a ``ClaimsUser``
+built from the claims alone; the only thing still read from the database
+is whether the account is active, and that answer is cached per process for
+``AUTH_USER_STATE_TTL`` seconds, so deactivating a user takes effect within
+that window. Tokens issued before these claims existed fall back to the
+regular ``JWTAuthentication`` lookup. Claims are re-read from the database
+whenever a refresh token is exchanged (``AccountTokenRefreshSerializer``),
+so role or profile changes show up in the next access token.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import models
+
+STATE_TTL = getattr(settings, 'AUTH_USER_STATE_TTL', 60)
+STATE_CACHE_SIZE = 10000
+
+
+def profile_claims(user):
+    """The role and profile-id claims for a user, as the login response reports them"""
+    vendor_id = customer_id = None
+    if user.isVendor:
+        vendor_id = models.Vendor.objects.filter(user_id=user.pk).values_list('pk', flat=True).first()
+    if user.isCustomer:
+        customer_id = models.Customer.objects.filter(user_id=user.pk).values_list('pk', flat=True).first()
+    return {
+        'username': user.username,
+        'user_type': 'vendor' if user.isVendor else 'customer' if user.isCustomer else None,
+        'vendor_id': vendor_id,
+        'customer_id': customer_id,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+    }
+
+
+class AccountToken(RefreshToken):
+    """Refresh token whose access tokens carry the profile claims"""
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim, value in profile_claims(user).items():
+            token[claim] = value
+        return token
+
+
+class AccountTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = AccountToken
+
+
+class RefreshedAccountToken(AccountToken):
+    """A refresh token read back from a client, with its profile claims re-read from the database"""
+    def __init__(self, token=None, verify=True):
+        super().__init__(token, verify)
+        if token is None:
+            return
+        user = models.CustomUser.objects.filter(pk=self.payload.get(api_settings.USER_ID_CLAIM)).first()
+        if user is not None:
+            for claim, value in profile_claims(user).items():
+                self[claim] = value
+
+
+class AccountTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RefreshedAccountToken
+
+
+class ClaimsUser(TokenUser):
+    """Request user rebuilt from token claims; ``user_type``/``*_id`` come from the token"""
+    @cached_property
+    def id(self):
+        # The user id claim is stored as a string; compare like CustomUser.pk
+        return models.CustomUser._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @property
+    def isVendor(self):
+        return self.token.get('user_type') == 'vendor'
+
+    @property
+    def isCustomer(self):
+        return self.token.get('user_type') == 'customer'
+
+
+class _UserStateCache:
+    """user id -> is_active, remembered for ``ttl`` seconds"""
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def is_active(self, user_id):
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        active = models.CustomUser.objects.filter(pk=user_id, is_active=True).exists()
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                self._entries.clear()
+            self._entries[user_id] = (now + self.ttl, active)
+        return active
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_states = _UserStateCache(STATE_TTL, STATE_CACHE_SIZE)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if 'user_type' not in validated_token:
+            # Issued before the profile claims existed
+            return super().get_user(validated_token)
+        user = ClaimsUser(validated_token)
+        if not user_states.is_active(user.id):
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+def vendor_id_for(user):
+    """The caller's Vendor id, from the token claims when there are any"""
+    if isinstance(user, ClaimsUser):
+        return user.vendor_id
+    if not user.is_authenticated:
+        return None
+    return models.Vendor.objects.filter(user_id=user.pk).values_list('pk', flat=True).first()
+
+
+def customer_id_for(user):
+    """The caller's Customer id, from the token claims when there are any"""
+    if isinstance(user, ClaimsUser):
+        return user.customer_id
+    if not user.is_authenticated:
+        return None
+    return models.Customer.objects.filter(user_id=user.pk).values_list('pk', flat=True).first()
@@ -0,0 +1,181 @@
+"""
+Load-test runner for the main API endpoints.
+
+Requests are built from the synthetic dataset (see main.synthetic), fired at
+a running server over HTTP from a thread pool at the requested concurrency,
+and summarised as throughput and p50/p95/p99 latency per endpoint. SQL
+queries per request can't be seen over HTTP, so a sample of the same
+requests is replayed in-process through the test client with the queries
+captured. The report is plain JSON with sorted keys so runs can be diffed.
+"""
+import json
+import math
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import models, synthetic
+from .authentication import AccountToken
+
+ENDPOINTS = ('products', 'product_detail', 'customer_dashboard', 'vendor_dashboard', 'customer_dashboard_async',
+             'vendor_dashboard_async', 'recommendations', 'login')
+DASHBOARDS = ('customer_dashboard', 'vendor_dashboard', 'customer_dashboard_async', 'vendor_dashboard_async')
+PRODUCT_ORDERINGS = ('id', '-price', '-rating')
+
+Call = namedtuple('Call', 'method path body token')
+
+
+def _accounts(kind, prefix, limit, rng):
+    """(profile id, user, access token) for a sample of generated vendors or customers"""
+    model = models.Vendor if kind == 'vendor' else models.Customer
+    rows = list(model.objects.filter(user__username__startswith=f'{prefix}_{kind}_').select_related('user').order_by('id')[:limit * 4])
+    rows = rng.sample(rows, min(limit, len(rows)))
+    return [(row.pk, row.user, str(AccountToken.for_user(row.user).access_token)) for row in rows]
+
+
+def build_calls(endpoint, count, rng, prefix=synthetic.DEFAULT_PREFIX, password=synthetic.DEFAULT_PASSWORD):
+    """``count`` requests for one endpoint, drawn from the dataset with ``rng``"""
+    if endpoint == 'products':
+        return [Call('GET', f'/api/products/?page_size=20&ordering={rng.choice(PRODUCT_ORDERINGS)}', None, None)
+                for _ in range(count)]
+    if endpoint == 'product_detail':
+        ids = list(models.Product.objects.order_by('id').values_list('id', flat=True))
+        return [Call('GET', f'/api/product/{rng.choice(ids)}/', None, None) for _ in range(count)] if ids else []
+    if endpoint in DASHBOARDS or endpoint == 'recommendations':
+        kind = 'vendor' if endpoint.startswith('vendor') else 'customer'
+        # The async views live under /api/async/ with the same paths
+        root = '/api/async/' if endpoint.endswith('_async') else '/api/'
+        accounts = _accounts(kind, prefix, 50, rng)
+        if not accounts:
+            return []
+        calls = []
+        for _ in range(count):
+            pk, _, token = rng.choice(accounts)
+            path = '/api/recommendations/?limit=10' if endpoint == 'recommendations' else f'{root}{kind}/dashboard/{pk}/'
+            calls.append(Call('GET', path, None, token))
+        return calls
+    if endpoint == 'login':
+        users = list(models.CustomUser.objects.filter(username__startswith=f'{prefix}_customer_')
+                     .order_by('id').values_list('username', flat=True)[:200])
+        return [Call('POST', '/api/login/', json.dumps({'username': rng.choice(users), 'password': password}), None)
+                for _ in range(count)] if users else []
+    raise ValueError(f'Unknown endpoint: {endpoint}')
+
+
+def send(base_url, call, timeout=10):
+    """Issue one request; returns (status, seconds). Transport errors count as status 0."""
+    request = urllib.request.Request(base_url.rstrip('/') + call.path, method=call.method,
+                                     data=call.body.encode('utf-8') if call.body else None)
+    if call.body:
+        request.add_header('Content-Type', 'application/json')
+    if call.token:
+        request.add_header('Authorization', f'Bearer {call.token}')
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 0
+    return status, time.perf_counter() - started
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(results, elapsed):
+    """Throughput and latency figures for [(status, seconds), ...]"""
+    latencies = sorted(seconds * 1000 for _, seconds in results)
+    statuses = Counter(str(status) for status, _ in results)
+    errors = sum(count for status, count in statuses.items() if not 200 <= int(status) < 400)
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'status_codes': dict(statuses),
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed > 0 else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'p50': _round(percentile(latencies, 0.50)),
+            'p95': _round(percentile(latencies, 0.95)),
+            'p99': _round(percentile(latencies, 0.99)),
+            'max': _round(latencies[-1] if latencies else None),
+        },
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def count_queries(calls, host):
+    """Replay requests in-process and report the SQL queries each one ran"""
+    client = Client(HTTP_HOST=host)
+    counts = []
+    for call in calls:
+        extra = {'HTTP_AUTHORIZATION': f'Bearer {call.token}'} if call.token else {}
+        with CaptureQueriesContext(connection) as captured:
+            client.generic(call.method, call.path, call.body or '', content_type='application/json', **extra)
+        counts.append(len(captured))
+    if not counts:
+        return {'mean': None, 'max': None, 'samples': 0}
+    return {'mean': round(sum(counts) / len(counts), 2), 'max': max(counts), 'samples': len(counts)}
+
+
+def run(base_url, endpoints=ENDPOINTS, concurrency=8, requests=200, warmup=10, query_samples=20, seed=1,
+        timeout=10, prefix=synthetic.DEFAULT_PREFIX, password=synthetic.DEFAULT_PASSWORD):
+    """Benchmark each endpoint in turn and return the JSON-ready report"""
+    rng = random.Random(seed)
+    report = {
+        'meta': {
+            'base_url': base_url,
+            'concurrency': concurrency,
+            'requests_per_endpoint': requests,
+            'warmup': warmup,
+            'seed': seed,
+            'started_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': {
+                'products': models.Product.objects.count(),
+                'customers': models.Customer.objects.count(),
+                'vendors': models.Vendor.objects.count(),
+                'orders': models.Order.objects.count(),
+            },
+        },
+        'endpoints': {},
+    }
+    host = urlsplit(base_url).netloc
+    for endpoint in endpoints:
+        calls = build_calls(endpoint, warmup + requests, rng, prefix=prefix, password=password)
+        if not calls:
+            report['endpoints'][endpoint] = {'skipped': 'no matching rows in the dataset'}
+            continue
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda call: send(base_url, call, timeout), calls[:warmup]))
+            started = time.perf_counter()
+            results = list(pool.map(lambda call: send(base_url, call, timeout), calls[warmup:]))
+            elapsed = time.perf_counter() - started
+        summary = summarize(results, elapsed)
+        summary['queries_per_request'] = count_queries(calls[warmup:warmup + query_samples], host)
+        report['endpoints'][endpoint] = summary
+    return report
+
+
+def dumps(report):
+    return json.dumps(report, indent=2, sort_keys=True)
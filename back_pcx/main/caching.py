@@ -0,0 +1,187 @@
+"""
+Versioned response cache for public catalog reads.
+
+Each cached model has a version counter in the cache. Response keys embed the
+versions of the models a view depends on, so saving or deleting a row only
+bumps one counter (O(1)) and every dependent entry stops matching at once;
+stale entries simply age out. Bumps wait for the writing transaction to
+commit, so a read racing the write can't store old rows under the new version. Works with any Django cache backend. Note that
+locmem is per process: use the file or database backend when several
+workers must see each other's invalidations.
+
+The same fingerprint doubles as the response's ``ETag``, and each bump also
+records when the model last changed, which gives ``Last-Modified``. A
+conditional GET whose validators still match gets ``304 Not Modified``
+from two cache round trips, before any query or serialization, but only
+while a 200 payload is cached under that key: errors are never validated.
+Labels can be scoped to one owner (``scoped_label``), so one customer's
+wishlist changing leaves the others' validators alone.
+"""
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+CACHE_ALIAS = getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')
+CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+PREFIX = 'catalog'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(label):
+    return f'{PREFIX}:version:{label}'
+
+
+def _modified_key(label):
+    return f'{PREFIX}:modified:{label}'
+
+
+def _incr(key):
+    cache = _cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Missing (never set or evicted); add() keeps a racing writer's value
+        if not cache.add(key, 1, timeout=None):
+            return cache.incr(key)
+        return 1
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+def scoped_label(model, scope):
+    """Label for the rows of ``model`` that belong to one owner, e.g. a customer's wishlist"""
+    return f'{model_label(model)}:{scope}'
+
+
+def get_state(labels):
+    """({label: version}, {label: last change timestamp or None}), in one cache round trip"""
+    keys = {label: (_version_key(label), _modified_key(label)) for label in labels}
+    found = _cache().get_many([key for pair in keys.values() for key in pair])
+    versions = {label: found.get(version, 0) for label, (version, _) in keys.items()}
+    modified = {label: found.get(stamp) for label, (_, stamp) in keys.items()}
+    return versions, modified
+
+
+def get_versions(labels):
+    """Current version of each label, fetched in one cache round trip"""
+    return get_state(labels)[0]
+
+
+def _bump_now(labels):
+    now = time.time()
+    for label in labels:
+        _incr(_version_key(label))
+        _cache().set(_modified_key(label), now, timeout=None)
+
+
+def bump_labels(*labels):
+    """
+    Invalidate the labels once the current transaction commits (at once
+    outside one). Bumping earlier would let a concurrent read store the
+    old rows under the new version.
+    """
+    transaction.on_commit(partial(_bump_now, labels))
+
+
+def bump(*models):
+    """Invalidate every cached response depending on these models"""
+    bump_labels(*(model_label(model) for model in models))
+
+
+def seed_modified(label):
+    """
+    Change time for a label the cache has lost (flushed or evicted). Claiming
+    "now" costs no query and is always safe: clients revalidate once and get
+    the full body. A concurrent bump wins.
+    """
+    stamp = time.time()
+    if not _cache().add(_modified_key(label), stamp, timeout=None):
+        stamp = _cache().get(_modified_key(label), stamp)
+    return stamp
+
+
+def record(hit):
+    _incr(f'{PREFIX}:stats:{"hits" if hit else "misses"}')
+
+
+def stats():
+    found = _cache().get_many([f'{PREFIX}:stats:hits', f'{PREFIX}:stats:misses'])
+    hits = found.get(f'{PREFIX}:stats:hits', 0)
+    misses = found.get(f'{PREFIX}:stats:misses', 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else None,
+    }
+
+
+def response_key(request, view_name, labels, versions=None):
+    if versions is None:
+        versions = get_versions(labels)
+    fingerprint = '|'.join(f'{label}={versions[label]}' for label in sorted(labels))
+    location = f'{request.get_host()}{request.get_full_path()}'
+    digest = hashlib.sha1(f'{fingerprint}|{location}'.encode('utf-8')).hexdigest()
+    return f'{PREFIX}:response:{view_name}:{digest}'
+
+
+class CachedResponseMixin:
+    """
+    Cache the serialized ``list``/``retrieve`` payload of a read-mostly view
+    and answer conditional GETs for it. ``cache_models`` names the models
+    whose changes must invalidate it; ``cache_labels()`` can add scoped labels.
+    """
+    cache_models = ()
+    cache_timeout = None
+
+    def cache_labels(self):
+        return [model_label(model) for model in self.cache_models]
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        labels = self.cache_labels()
+        versions, modified = get_state(labels)
+        key = response_key(request, type(self).__name__, labels, versions=versions)
+        etag = f'"{key.rsplit(":", 1)[1]}"'
+        stamps = [stamp if stamp is not None else seed_modified(label) for label, stamp in modified.items()]
+        last_modified = int(max(stamps)) if stamps else None
+
+        data = _cache().get(key)
+        if data is not None:
+            record(hit=True)
+            response = Response(data)
+        else:
+            record(hit=False)
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                # Errors (a 404 for a missing row) are never cached or answered with 304
+                return response
+            timeout = self.cache_timeout if self.cache_timeout is not None else CACHE_TIMEOUT
+            _cache().set(key, response.data, timeout)
+        # Only a 200 payload for this key can be validated
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        return self.validated(not_modified if not_modified is not None else response, etag, last_modified)
+
+    def validated(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Browsers keep the body but ask again every time, so changes show up at once
+        patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,61 @@
+"""
+Whole-cart checkout.
+
+``place_order()`` turns a cart into an Order and its OrderItems inside one
+transaction, with a fixed number of queries whatever the cart size. The lines
+go in with ``bulk_create``. Each purchased product's
+``ProductStatistics.purchase_count`` goes up by one, and the customer's
+``CustomerProductInteraction.purchased`` is set (see main.interactions), both
+as set-based upserts.
+``bulk_create`` skips the OrderItems signals, so the vendor sales rollups are
+updated explicitly. Either all of it is written or none of it is.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from . import counters, interactions, models, rollups
+
+MAX_ITEMS = getattr(settings, 'CHECKOUT_MAX_ITEMS', 100)
+
+
+class CheckoutError(ValueError):
+    pass
+
+
+def merge_lines(lines):
+    """[(product_id, quantity)] with repeated products folded into one line, first-seen order"""
+    quantities = Counter()
+    for product_id, quantity in lines:
+        if quantity < 1:
+            raise CheckoutError(f'Quantity for product {product_id} must be at least 1')
+        quantities[product_id] += quantity
+    return list(quantities.items())
+
+
+def place_order(customer_id, lines):
+    """Create the order for [(product_id, quantity)]; returns (order, items)"""
+    lines = merge_lines(lines)
+    if not lines:
+        raise CheckoutError('The cart is empty')
+    if len(lines) > MAX_ITEMS:
+        raise CheckoutError(f'A cart can hold at most {MAX_ITEMS} products')
+    product_ids = [product_id for product_id, _ in lines]
+
+    with transaction.atomic():
+        known = set(models.Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+        missing = [product_id for product_id in product_ids if product_id not in known]
+        if missing:
+            raise CheckoutError(f'Unknown products: {missing}')
+
+        order = models.Order.objects.create(customer_id=customer_id)
+        items = models.OrderItems.objects.bulk_create([
+            models.OrderItems(order=order, product_id=product_id, quantity=quantity)
+            for product_id, quantity in lines
+        ])
+        # bulk_create skips the signals that keep these in step
+        rollups.record_items(items)
+        counters.write_increments({product_id: Counter(purchase_count=1) for product_id in product_ids})
+        interactions.record(customer_id, [(product_id, 'purchase', 1) for product_id in product_ids])
+    return order, items
@@ -0,0 +1,160 @@
+"""
+Write-behind buffer for ProductStatistics counters.
+
+Increments are summed per product in process memory and written by a
+background flusher as one ``UPDATE ... SET x = x + CASE ...`` per chunk of
+products, so a popular product costs one write per flush instead of one per
+view. Buffered increments are flushed every ``STATISTICS_FLUSH_INTERVAL``
+seconds, as soon as ``STATISTICS_MAX_PENDING`` products are waiting, and at
+interpreter exit. An interval of 0 writes through synchronously.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('view_count', 'purchase_count', 'cart_add_count', 'wishlist_add_count')
+# Largest single increment accepted, as for interaction events
+MAX_INCREMENT = 1000
+# Errors caused by the values in a batch rather than the database being unavailable
+REJECTED = (IntegrityError, DataError, OverflowError)
+
+
+class CounterBuffer:
+    def __init__(self, interval=5.0, max_pending=10000, chunk_size=500):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self._pending = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, product_id, field, amount=1):
+        self.add_many({product_id: {field: amount}})
+
+    def add_many(self, increments):
+        """Queue {product_id: {field: amount}} in one go"""
+        for counts in increments.values():
+            for field, amount in counts.items():
+                if field not in FIELDS:
+                    raise ValueError(f'Unknown statistics counter: {field}')
+                if not 1 <= amount <= MAX_INCREMENT:
+                    raise ValueError(f'Statistics increments must be between 1 and {MAX_INCREMENT}, got {amount} for {field}')
+        with self._lock:
+            for product_id, counts in increments.items():
+                self._pending[int(product_id)].update(counts)
+            backlog = len(self._pending)
+        if self.interval <= 0:
+            self.flush()
+        else:
+            self._ensure_flusher()
+            if backlog >= self.max_pending:
+                self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return {product_id: dict(counts) for product_id, counts in self._pending.items()}
+
+    def flush(self):
+        """Write every buffered increment; returns the number of products touched"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+        if not pending:
+            return 0
+        try:
+            write_increments(pending, self.chunk_size)
+        except REJECTED:
+            # Retrying would fail the same way; write products one by one and drop the ones the database rejects
+            logger.exception('Product statistics batch rejected; retrying products individually')
+            return self._flush_each(pending)
+        except Exception:
+            # Put the increments back so the next flush retries them
+            with self._lock:
+                for product_id, counts in pending.items():
+                    self._pending[product_id].update(counts)
+            raise
+        return len(pending)
+
+    def _flush_each(self, pending):
+        written = 0
+        for product_id, counts in pending.items():
+            try:
+                write_increments({product_id: counts}, self.chunk_size)
+            except REJECTED:
+                logger.exception('Dropping rejected statistics increments for product %s: %s', product_id, dict(counts))
+            else:
+                written += 1
+        return written
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='statistics-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing product statistics failed')
+            finally:
+                close_old_connections()
+
+
+def write_increments(pending, chunk_size=500):
+    """Apply {product_id: {field: amount}} as set-based updates"""
+    product_ids = list(models.Product.objects.filter(pk__in=list(pending)).values_list('pk', flat=True))
+    with transaction.atomic():
+        models.ProductStatistics.objects.bulk_create(
+            [models.ProductStatistics(product_id=product_id) for product_id in product_ids],
+            ignore_conflicts=True,
+        )
+        now = timezone.now()
+        for start in range(0, len(product_ids), chunk_size):
+            chunk = product_ids[start:start + chunk_size]
+            changes = {'last_updated': now}
+            for field in FIELDS:
+                whens = [When(product_id=pid, then=Value(pending[pid][field])) for pid in chunk if pending[pid][field]]
+                if whens:
+                    changes[field] = F(field) + Case(*whens, default=Value(0), output_field=IntegerField())
+            models.ProductStatistics.objects.filter(product_id__in=chunk).update(**changes)
+
+
+buffer = CounterBuffer(
+    interval=getattr(settings, 'STATISTICS_FLUSH_INTERVAL', 5.0),
+    max_pending=getattr(settings, 'STATISTICS_MAX_PENDING', 10000),
+)
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        buffer.flush()
+    except Exception:
+        logger.exception('Dropping buffered product statistics at shutdown')
+
+
+def increment(product_id, field, amount=1):
+    """Queue ``amount`` on one of a product's ProductStatistics counters"""
+    buffer.add(product_id, field, amount)
+
+
+def increment_many(increments):
+    """Queue {product_id: {field: amount}} increments"""
+    buffer.add_many(increments)
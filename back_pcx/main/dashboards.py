@@ -0,0 +1,223 @@
+"""
+Customer and vendor dashboard aggregates.
+
+A dashboard is a handful of independent queries (profile and totals, recent
+orders, wishlist, top products), each keyed by name and filtered by the
+dashboard's primary key alone, so none waits for another's result. ``run()``
+executes them in order for the sync views. ``gather()``, used by the async
+views under ASGI, runs them concurrently and awaits them together, so a
+dashboard costs roughly its slowest query instead of the sum.
+
+Django's async ORM methods (``aget``, ``acount``...) all go through one
+thread-sensitive executor, so awaiting several at once still runs them one
+after another. ``gather()`` therefore uses its own pool of
+``DASHBOARD_QUERY_WORKERS`` threads, shared by the whole process. Each worker
+keeps one DB connection open between queries, so the pool size also caps how
+many extra connections the dashboards hold. With ``DASHBOARD_QUERY_WORKERS = 0`` the
+queries run in order on the request thread.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import models
+
+WORKERS = getattr(settings, 'DASHBOARD_QUERY_WORKERS', 4)
+RECENT_LIMIT = 5
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def count_subquery(model, field):
+    """Correlated ``COUNT(*)`` of ``model`` rows whose ``field`` points at the outer row"""
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def _customer(pk):
+    # The three totals ride along as correlated subqueries
+    return models.Customer.objects.annotate(
+        total_orders=count_subquery(models.Order, 'customer'),
+        total_wishlist_items=count_subquery(models.WishlistItem, 'customer'),
+        total_addresses=count_subquery(models.CustomerAddress, 'customer'),
+    ).filter(pk=pk).first()
+
+
+def _customer_recent_orders(pk):
+    # Item counts and totals are computed in SQL
+    orders = models.Order.objects.filter(customer_id=pk).annotate(
+        total_items=Count('order_items'),
+        total_amount=Coalesce(
+            Sum(F('order_items__quantity') * F('order_items__product__price'), output_field=FloatField()),
+            Value(0.0),
+        ),
+    ).order_by('-order_time')[:RECENT_LIMIT]
+    return [{
+        'id': order.id,
+        'date': order.order_time.strftime('%Y-%m-%d %H:%M'),
+        'total_items': order.total_items,
+        'total_amount': order.total_amount
+    } for order in orders]
+
+
+def _customer_recent_wishlist(pk):
+    items = models.WishlistItem.objects.filter(customer_id=pk).select_related('product').order_by('-added_at')[:RECENT_LIMIT]
+    return [{
+        'id': item.id,
+        'product_id': item.product.id,
+        'product_title': item.product.title,
+        'product_price': item.product.price,
+        'added_at': item.added_at.strftime('%Y-%m-%d %H:%M')
+    } for item in items]
+
+
+def customer_queries(pk):
+    return {
+        'customer': partial(_customer, pk),
+        'recent_orders': partial(_customer_recent_orders, pk),
+        'recent_wishlist': partial(_customer_recent_wishlist, pk),
+    }
+
+
+def customer_owner(results):
+    """The customer's user id, or None when there is no such customer"""
+    customer = results['customer']
+    return customer.user_id if customer is not None else None
+
+
+def customer_payload(results):
+    customer = results['customer']
+    return {
+        'total_orders': customer.total_orders,
+        'total_wishlist_items': customer.total_wishlist_items,
+        'total_addresses': customer.total_addresses,
+        'recent_orders': results['recent_orders'],
+        'recent_wishlist': results['recent_wishlist']
+    }
+
+
+def _vendor_owner(pk):
+    """The vendor's user id, or None when there is no such vendor"""
+    return models.Vendor.objects.filter(pk=pk).values_list('user_id', flat=True).first()
+
+
+def _vendor_totals(pk):
+    # Orders and revenue come from the incrementally maintained rollup
+    rollup = models.VendorSalesRollup.objects.filter(vendor_id=pk).first()
+    if rollup is not None:
+        return rollup.order_count, rollup.revenue
+    # Not rolled up yet (e.g. before rebuild_vendor_rollups): aggregate in SQL
+    totals = models.OrderItems.objects.filter(product__vendor_id=pk).aggregate(
+        orders=Count('order', distinct=True),
+        revenue=Sum(F('quantity') * F('product__price'), output_field=FloatField()),
+    )
+    return totals['orders'], totals['revenue'] or 0
+
+
+def _vendor_recent_orders(pk):
+    items = (models.OrderItems.objects.filter(product__vendor_id=pk).select_related('order', 'product')
+             .order_by('-order__order_time')[:RECENT_LIMIT])
+    return [{
+        'order_id': item.order.id,
+        'date': item.order.order_time.strftime('%Y-%m-%d %H:%M'),
+        'product': item.product.title,
+        'quantity': item.quantity,
+        'amount': item.product.price * item.quantity
+    } for item in items]
+
+
+def _vendor_top_products(pk):
+    # Ranked by distinct orders, from the per-product rollups
+    rows = (models.VendorProductSalesRollup.objects.filter(vendor_id=pk).select_related('product')
+            .order_by('-order_count')[:RECENT_LIMIT])
+    top = [{
+        'id': row.product.id,
+        'title': row.product.title,
+        'price': row.product.price,
+        'orders': row.order_count,
+        'quantity_sold': row.quantity_sold
+    } for row in rows]
+    if top:
+        return top
+    # Not rolled up yet: the same figures in SQL, like _vendor_totals
+    products = models.Product.objects.filter(vendor_id=pk).annotate(
+        order_count=Count('orderitems__order', distinct=True),
+        total_quantity=Coalesce(Sum('orderitems__quantity'), 0),
+    ).order_by('-order_count', 'id')[:RECENT_LIMIT]
+    return [{
+        'id': product.id,
+        'title': product.title,
+        'price': product.price,
+        'orders': product.order_count,
+        'quantity_sold': product.total_quantity
+    } for product in products]
+
+
+def vendor_queries(pk):
+    return {
+        'owner': partial(_vendor_owner, pk),
+        'total_products': models.Product.objects.filter(vendor_id=pk).count,
+        'totals': partial(_vendor_totals, pk),
+        'recent_orders': partial(_vendor_recent_orders, pk),
+        'top_products': partial(_vendor_top_products, pk),
+    }
+
+
+def vendor_owner(results):
+    return results['owner']
+
+
+def vendor_payload(results):
+    total_orders, total_revenue = results['totals']
+    return {
+        'total_products': results['total_products'],
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'recent_orders': results['recent_orders'],
+        'top_products': results['top_products']
+    }
+
+
+def run(queries):
+    """Run {name: callable} in order on the current thread; returns {name: result}"""
+    return {name: query() for name, query in queries.items()}
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='dashboard')
+        return _executor
+
+
+def _in_worker(query):
+    try:
+        return query()
+    finally:
+        # Workers keep their connection between queries (CONN_MAX_AGE is about
+        # request threads) and only drop one that has broken
+        for conn in connections.all(initialized_only=True):
+            if conn.connection is not None and conn.errors_occurred:
+                if conn.is_usable():
+                    conn.errors_occurred = False
+                else:
+                    conn.close()
+
+
+async def gather(queries):
+    """Run {name: callable} concurrently on the dashboard pool; returns {name: result}"""
+    if WORKERS <= 0:
+        return await sync_to_async(run)(queries)
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    results = await asyncio.gather(*(loop.run_in_executor(executor, _in_worker, query) for query in queries.values()))
+    return dict(zip(queries, results))
@@ -0,0 +1,123 @@
+"""
+Faceted product filtering.
+
+``parse()`` reads the storefront filters from the query string: ``category``
+and ``vendor`` (comma-separated ids, or a category title as before),
+``min_price``/``max_price`` and ``min_rating``. ``apply()`` narrows a
+Product queryset with them, and the composite ``(category, price)``, ``(vendor, price)`` and ``(price)`` indexes
+on Product back the resulting range scans.
+
+``counts()`` returns the products per category, per vendor and per price
+bucket for the same filters, with one grouped query per facet. Each facet is
+counted with every filter except its own, so the client can show what
+picking another category or vendor would return.
+"""
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Q, When
+
+from . import models
+
+# Upper edges of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = getattr(settings, 'PRODUCT_FACET_PRICE_BUCKETS', (25, 50, 100, 250, 500, 1000))
+
+
+class FacetError(ValueError):
+    pass
+
+
+def _ids(value, name):
+    try:
+        return [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise FacetError(f'{name} must be a comma-separated list of ids')
+
+
+def _number(value, name):
+    try:
+        return float(value)
+    except ValueError:
+        raise FacetError(f'{name} must be a number')
+
+
+def parse(params):
+    """{filter: value} for the filters present in ``params``"""
+    filters = {}
+    if params.get('category'):
+        try:
+            filters['category'] = _ids(params['category'], 'category')
+        except FacetError:
+            # Older clients pass a category title
+            category_id = (models.ProductCategory.objects.filter(title__icontains=params['category'])
+                           .values_list('pk', flat=True).first())
+            if category_id is not None:
+                filters['category'] = [category_id]
+    if params.get('vendor'):
+        filters['vendor'] = _ids(params['vendor'], 'vendor')
+    low, high = params.get('min_price'), params.get('max_price')
+    if low or high:
+        filters['price'] = (_number(low, 'min_price') if low else None, _number(high, 'max_price') if high else None)
+    if params.get('min_rating'):
+        filters['rating'] = _number(params['min_rating'], 'min_rating')
+    return filters
+
+
+def condition(filters, skip=None):
+    """Q object for ``filters``, leaving out the ``skip`` filter"""
+    q = Q()
+    if 'category' in filters and skip != 'category':
+        q &= Q(category_id__in=filters['category'])
+    if 'vendor' in filters and skip != 'vendor':
+        q &= Q(vendor_id__in=filters['vendor'])
+    if 'price' in filters and skip != 'price':
+        low, high = filters['price']
+        if low is not None:
+            q &= Q(price__gte=low)
+        if high is not None:
+            q &= Q(price__lte=high)
+    if 'rating' in filters and skip != 'rating':
+        q &= Q(rating_average__gte=filters['rating'])
+    return q
+
+
+def apply(queryset, filters):
+    return queryset.filter(condition(filters)) if filters else queryset
+
+
+def price_bucket():
+    """Index of the price bucket a product falls in"""
+    return Case(
+        *(When(price__lt=edge, then=index) for index, edge in enumerate(PRICE_BUCKETS)),
+        default=len(PRICE_BUCKETS),
+        output_field=IntegerField(),
+    )
+
+
+def _grouped(filters, skip, *fields):
+    return (models.Product.objects.filter(condition(filters, skip=skip))
+            .values(*fields).annotate(count=Count('id')).order_by('-count', fields[0]))
+
+
+def counts(filters):
+    """Facet counts for ``filters``, in three grouped queries"""
+    categories = _grouped(filters, 'category', 'category_id', 'category__title')
+    vendors = _grouped(filters, 'vendor', 'vendor_id', 'vendor__user__username')
+    buckets = {
+        row['bucket']: row['count']
+        for row in models.Product.objects.filter(condition(filters, skip='price')).order_by()
+        .annotate(bucket=price_bucket()).values('bucket').annotate(count=Count('id'))
+    }
+    edges = (0, *PRICE_BUCKETS, None)
+    return {
+        'categories': [
+            {'id': row['category_id'], 'title': row['category__title'], 'count': row['count']}
+            for row in categories if row['category_id'] is not None
+        ],
+        'vendors': [
+            {'id': row['vendor_id'], 'name': row['vendor__user__username'], 'count': row['count']}
+            for row in vendors if row['vendor_id'] is not None
+        ],
+        'price': [
+            {'min': edges[index], 'max': edges[index + 1], 'count': buckets.get(index, 0)}
+            for index in range(len(PRICE_BUCKETS) + 1)
+        ],
+    }
@@ -0,0 +1,229 @@
+"""
+Responsive image derivatives for product thumbnails and gallery images.
+
+Every original gets fixed-width WebP and JPEG copies under
+``MEDIA_ROOT/derivatives/``. Which copies exist is recorded on the row
+(``Product.thumbnail_variants`` / ``ProductImage.image_variants``) so
+serializers can build a ``srcset`` without touching the filesystem.
+Uploads are rendered after commit on a shared process pool; existing media
+is rendered in bulk by ``generate_image_derivatives``. Originals are never
+upscaled: widths larger than the source are skipped.
+"""
+import logging
+import os
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils._os import safe_join
+from PIL import Image, ImageOps
+
+from . import caching, models
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (160, 320, 640, 1024)))
+FORMATS = tuple(getattr(settings, 'IMAGE_DERIVATIVE_FORMATS', ('webp', 'jpeg')))
+QUALITY = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+WORKERS = getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2)
+DERIVATIVES_DIR = 'derivatives'
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+# (model, file field, variants field) for every image that gets derivatives
+TARGETS = {
+    'product': (models.Product, 'thumbnail', 'thumbnail_variants'),
+    'image': (models.ProductImage, 'image', 'image_variants'),
+}
+
+
+def derivative_name(name, width, fmt):
+    stem = posixpath.splitext(name)[0]
+    return posixpath.join(DERIVATIVES_DIR, f'{stem}-{width}w.{EXTENSIONS[fmt]}')
+
+
+def _save(image, path, fmt, quality):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    if fmt == 'jpeg':
+        image = image.convert('RGB')
+        image.save(temporary, 'JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(temporary, 'WEBP', quality=quality, method=4)
+    os.replace(temporary, path)
+
+
+def render(name, media_root, widths=WIDTHS, formats=FORMATS, quality=QUALITY):
+    """
+    Write the derivatives of one original and return its variants map:
+    ``{'source': name, 'webp': {'320': path, ...}, 'jpeg': {...}}``.
+    Pure Pillow work, safe to run in a worker process. Raises
+    SuspiciousFileOperation when ``name`` resolves outside ``media_root``.
+    """
+    source = safe_join(media_root, name)
+    with Image.open(source) as original:
+        largest = max(widths)
+        if original.format == 'JPEG':
+            # Let the decoder downscale by a power of two when it can
+            original.draft('RGB', (largest, largest * original.height // max(original.width, 1)))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        targets = sorted({min(width, image.width) for width in widths}, reverse=True)
+
+        variants = {'source': name}
+        for fmt in formats:
+            variants[fmt] = {}
+        for width in targets:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+            for fmt in formats:
+                path = derivative_name(name, width, fmt)
+                _save(resized, safe_join(media_root, path), fmt, quality)
+                variants[fmt][str(width)] = path
+            # Smaller widths are resampled from this one, which is much cheaper than the original
+            image = resized
+    return variants
+
+
+def render_job(job):
+    """(kind, pk, name) -> (kind, pk, variants or None); the process pool entry point"""
+    kind, pk, name = job
+    try:
+        return kind, pk, render(name, settings.MEDIA_ROOT)
+    except SuspiciousFileOperation:
+        logger.warning('Skipping derivatives of %s: the path leaves MEDIA_ROOT', name)
+        return kind, pk, None
+    except Exception:
+        logger.exception('Rendering derivatives of %s failed', name)
+        return kind, pk, None
+
+
+def is_current(name, variants):
+    return not name or (variants or {}).get('source') == name
+
+
+def srcset(variants, fmt, request=None):
+    """``"url 160w, url 320w"`` for one format of a variants map"""
+    sizes = (variants or {}).get(fmt) or {}
+    entries = []
+    for width in sorted(sizes, key=int):
+        url = default_storage.url(sizes[width])
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        entries.append(f'{url} {width}w')
+    return ', '.join(entries)
+
+
+def srcset_map(variants, request=None):
+    """``{'webp': srcset, 'jpeg': srcset}``, empty until derivatives exist"""
+    return {fmt: srcset(variants, fmt, request) for fmt in FORMATS if (variants or {}).get(fmt)}
+
+
+def stale_paths(old, new):
+    """Derivative files of ``old`` that ``new`` no longer uses"""
+    keep = {path for fmt in FORMATS for path in (new or {}).get(fmt, {}).values()}
+    return [path for fmt in FORMATS for path in (old or {}).get(fmt, {}).values() if path not in keep]
+
+
+def store(kind, results):
+    """Save variants maps {pk: variants}, dropping files of the maps they replace"""
+    model, file_field, field = TARGETS[kind]
+    if not results:
+        return 0
+    current = {
+        pk: (name, variants)
+        for pk, name, variants in model.objects.filter(pk__in=list(results)).values_list('pk', file_field, field)
+    }
+    rows, stale = [], []
+    for pk, variants in results.items():
+        name, previous = current.get(pk, (None, None))
+        if name != variants['source']:
+            # Deleted or re-uploaded while rendering: the newer upload renders its own
+            stale.extend(stale_paths(variants, previous))
+            continue
+        row = model(pk=pk)
+        setattr(row, field, variants)
+        rows.append(row)
+        stale.extend(stale_paths(previous, variants))
+    for path in stale:
+        default_storage.delete(path)
+    if rows:
+        model.objects.bulk_update(rows, [field], batch_size=500)
+        # bulk_update skips the signals that invalidate cached catalog responses
+        caching.bump(model)
+    return len(rows)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=WORKERS, initializer=django.setup)
+        return _executor
+
+
+def _stored(future):
+    try:
+        kind, pk, variants = future.result()
+        if variants is not None:
+            store(kind, {pk: variants})
+    except Exception:
+        logger.exception('Saving image derivatives failed')
+    finally:
+        close_old_connections()
+
+
+def schedule(kind, pk, name):
+    """Render one upload once the surrounding transaction commits"""
+    def submit():
+        if WORKERS <= 0:
+            _kind, _pk, variants = render_job((kind, pk, name))
+            if variants is not None:
+                store(kind, {pk: variants})
+        else:
+            get_executor().submit(render_job, (kind, pk, name)).add_done_callback(_stored)
+    transaction.on_commit(submit)
+
+
+def pending_jobs(kind, force=False):
+    """(kind, pk, name) for every row whose derivatives are missing or out of date"""
+    model, file_field, field = TARGETS[kind]
+    rows = model.objects.order_by('pk').values_list('pk', file_field, field).iterator(chunk_size=5000)
+    for pk, name, variants in rows:
+        if name and (force or not is_current(name, variants)):
+            yield kind, pk, name
+
+
+def generate(kinds=tuple(TARGETS), workers=None, force=False, batch_size=200):
+    """Render derivatives for existing media across a process pool; returns (rendered, failed)"""
+    jobs = [job for kind in kinds for job in pending_jobs(kind, force=force)]
+    rendered = failed = 0
+    if not jobs:
+        return rendered, failed
+    results = {kind: {} for kind in kinds}
+
+    def flush():
+        for kind, found in results.items():
+            store(kind, found)
+            found.clear()
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=django.setup) as pool:
+        for count, (kind, pk, variants) in enumerate(pool.map(render_job, jobs, chunksize=16), start=1):
+            if variants is None:
+                failed += 1
+            else:
+                results[kind][pk] = variants
+                rendered += 1
+            if count % batch_size == 0:
+                flush()
+    flush()
+    return rendered, failed
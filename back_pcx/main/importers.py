@@ -0,0 +1,251 @@
+"""
+Streaming bulk product import for vendors.
+
+Rows come from CSV (header row) or NDJSON (one object per line) with the
+columns ``title``, ``price`` and optionally ``detail``, ``category`` (title)
+or ``category_id``, ``thumbnail`` and ``images`` (list, or ``|``-separated
+paths already stored under MEDIA_ROOT, relative and without ``..``). Rows
+are validated in chunks with plain Python checks and written with
+``bulk_create``; a bad row is reported with its line number and skipped,
+never aborting the batch. An upload that is not UTF-8 is imported up to the
+first undecodable line, which is reported as that line's error.
+"""
+import codecs
+import csv
+import json
+import math
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import caching, models, search
+
+DEFAULT_CHUNK_SIZE = 2000
+TITLE_MAX_LENGTH = models.Product._meta.get_field('title').max_length
+IMAGE_MAX_LENGTH = models.ProductImage._meta.get_field('image').max_length
+
+
+def read_rows(lines, fmt):
+    """Yield (line number, row dict) from an iterable of text lines"""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, {'__error__': f'Invalid JSON: {e}'}
+                continue
+            yield line_number, row if isinstance(row, dict) else {'__error__': 'Expected a JSON object'}
+    else:
+        raise ValueError(f'Unsupported import format: {fmt}')
+
+
+class UndecodableLine(ValueError):
+    def __init__(self, line_number, error):
+        super().__init__(f'Line {line_number} is not valid UTF-8: {error}')
+        self.line_number = line_number
+
+
+def decode_lines(lines, encoding='utf-8-sig'):
+    """Decode byte lines, raising UndecodableLine with the offending line number"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for line_number, line in enumerate(lines, start=1):
+        try:
+            yield decoder.decode(line)
+        except UnicodeDecodeError as e:
+            raise UndecodableLine(line_number, e) from e
+
+
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _unsafe_path(path):
+    """Whether a media path is absolute or climbs out of MEDIA_ROOT"""
+    parts = path.replace('\\', '/').split('/')
+    return path.startswith(('/', '\\')) or ':' in parts[0] or '..' in parts
+
+
+class ProductImporter:
+    def __init__(self, vendor_id, chunk_size=DEFAULT_CHUNK_SIZE, create_categories=False, max_errors=1000):
+        self.vendor_id = vendor_id
+        self.chunk_size = chunk_size
+        self.create_categories = create_categories
+        self.max_errors = max_errors
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        # Category resolution map, loaded once: lower-cased title -> id
+        self.categories = {}
+        self.category_ids = set()
+        for pk, title in models.ProductCategory.objects.values_list('pk', 'title'):
+            self.categories.setdefault(title.strip().lower(), pk)
+            self.category_ids.add(pk)
+
+    def run(self, rows):
+        chunk = []
+        try:
+            for line_number, row in rows:
+                chunk.append((line_number, row))
+                if len(chunk) >= self.chunk_size:
+                    self._import_chunk(chunk)
+                    chunk = []
+        except UndecodableLine as e:
+            # The rest of the stream can't be trusted to split into rows; keep what was read
+            if chunk:
+                self._import_chunk(chunk)
+                chunk = []
+            self._error(e.line_number, {'row': f'{e} The rest of the file was skipped.'})
+        if chunk:
+            self._import_chunk(chunk)
+        return self.summary()
+
+    def summary(self):
+        return {'created': self.created, 'failed': self.failed, 'errors': self.errors}
+
+    def _error(self, line_number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': line_number, 'errors': errors})
+
+    def _category(self, row, errors):
+        category_id = _text(row.get('category_id'))
+        if category_id:
+            try:
+                category_id = int(category_id)
+            except ValueError:
+                errors['category_id'] = 'Must be an integer.'
+                return None
+            if category_id not in self.category_ids:
+                errors['category_id'] = f'Unknown category id {category_id}.'
+                return None
+            return category_id
+        title = _text(row.get('category'))
+        if not title:
+            return None
+        pk = self.categories.get(title.lower())
+        if pk is None and self.create_categories:
+            pk = models.ProductCategory.objects.create(title=title).pk
+            self.categories[title.lower()] = pk
+            self.category_ids.add(pk)
+        if pk is None:
+            errors['category'] = f'Unknown category "{title}".'
+        return pk
+
+    def validate(self, row):
+        """Return (product kwargs, image paths, errors) for one row"""
+        errors = {}
+        if '__error__' in row:
+            return None, [], {'row': row['__error__']}
+
+        title = _text(row.get('title'))
+        if not title:
+            errors['title'] = 'This field is required.'
+        elif len(title) > TITLE_MAX_LENGTH:
+            errors['title'] = f'Ensure this field has no more than {TITLE_MAX_LENGTH} characters.'
+
+        price = None
+        try:
+            price = float(_text(row.get('price')))
+            if not math.isfinite(price) or price < 0:
+                errors['price'] = 'Must be a non-negative number.'
+        except ValueError:
+            errors['price'] = 'A valid number is required.'
+
+        category_id = self._category(row, errors)
+
+        images = row.get('images') or []
+        if isinstance(images, str):
+            images = [path for path in (part.strip() for part in images.split('|')) if path]
+        elif not isinstance(images, list):
+            errors['images'] = 'Must be a list of paths.'
+            images = []
+        images = [_text(path) for path in images]
+        thumbnail = _text(row.get('thumbnail'))
+        if any(len(path) > IMAGE_MAX_LENGTH for path in images + [thumbnail]):
+            errors['images'] = f'Image paths are limited to {IMAGE_MAX_LENGTH} characters.'
+        elif any(_unsafe_path(path) for path in images):
+            errors['images'] = 'Image paths must be relative to MEDIA_ROOT and may not contain "..".'
+        if thumbnail and _unsafe_path(thumbnail):
+            errors['thumbnail'] = 'Image paths must be relative to MEDIA_ROOT and may not contain "..".'
+
+        if errors:
+            return None, [], errors
+        product = {
+            'title': title,
+            'detail': _text(row.get('detail')) or None,
+            'price': price,
+            'category_id': category_id,
+            'thumbnail': thumbnail,
+        }
+        return product, images, {}
+
+    def _import_chunk(self, chunk):
+        products, images = [], []
+        for line_number, row in chunk:
+            fields, paths, errors = self.validate(row)
+            if errors:
+                self._error(line_number, errors)
+                continue
+            products.append(models.Product(vendor_id=self.vendor_id, **fields))
+            images.append(paths)
+
+        if not products:
+            return
+        with transaction.atomic():
+            models.Product.objects.bulk_create(products)
+            _insert_images([
+                (product.pk, path) for product, paths in zip(products, images) for path in paths
+            ])
+        self.created += len(products)
+
+        # bulk_create skips signals: keep the search index and response cache in step
+        search.reindex(product_ids=[product.pk for product in products])
+        caching.bump(models.Product, models.ProductImage)
+
+
+def _insert_images(rows):
+    """
+    Insert (product_id, path) pairs with one executemany. Image rows only
+    carry a path and an empty variants map, so this skips the per-instance
+    model and field preparation that makes up most of ``bulk_create``'s cost.
+    """
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    opts = models.ProductImage._meta
+    variants = opts.get_field('image_variants')
+    empty = variants.get_db_prep_save(variants.get_default(), connection)
+    updated_at = opts.get_field('updated_at')
+    now = updated_at.get_db_prep_save(timezone.now(), connection)
+    columns = ', '.join(quote(opts.get_field(name).column) for name in ('product', 'image', 'image_variants', 'updated_at'))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(opts.db_table)} ({columns}) VALUES (%s, %s, %s, %s)',
+            [(product_id, path, empty, now) for product_id, path in rows],
+        )
+
+
+def import_products(vendor_id, lines, fmt='csv', **options):
+    """Import an iterable of text lines; returns {'created', 'failed', 'errors'}"""
+    return ProductImporter(vendor_id, **options).run(read_rows(lines, fmt))
+
+
+def import_upload(vendor_id, upload, fmt=None, **options):
+    """Import an uploaded file without reading it into memory first"""
+    fmt = fmt or detect_format(upload.name)
+    return import_products(vendor_id, decode_lines(upload), fmt, **options)
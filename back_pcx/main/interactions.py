@@ -0,0 +1,96 @@
+"""
+Batched customer interaction events.
+
+A browsing session produces bursts of view, cart and wishlist events.
+``record()`` folds a batch per (customer, product) in memory, reads the
+affected CustomerProductInteraction rows once and writes the merged rows
+back with a single ``bulk_create(update_conflicts=True)`` on the
+(customer, product) key. View counts add up, flags stay set once set, and
+``interaction_score`` is recomputed from the merged row with
+``INTERACTION_SCORE_WEIGHTS``; the row has just been touched, so this is also
+its time-decayed score (see main.scoring). ``count()`` queues the
+matching ProductStatistics increments on the write-behind buffer
+(see main.counters).
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from . import counters, models
+
+# event -> (CustomerProductInteraction flag, ProductStatistics counter)
+EVENTS = {
+    'view': ('viewed', 'view_count'),
+    'cart': ('added_to_cart', 'cart_add_count'),
+    'wishlist': ('added_to_wishlist', 'wishlist_add_count'),
+    'purchase': ('purchased', 'purchase_count'),
+}
+# Purchases are only recorded by checkout
+CLIENT_EVENTS = ('view', 'cart', 'wishlist')
+# Score per view and per flag; the defaults match recommendations.popularity()
+WEIGHTS = getattr(settings, 'INTERACTION_SCORE_WEIGHTS', {
+    'view_count': 1.0, 'added_to_cart': 3.0, 'added_to_wishlist': 2.0, 'purchased': 5.0,
+})
+FLAGS = ('viewed', 'added_to_cart', 'added_to_wishlist', 'purchased')
+MAX_EVENTS = getattr(settings, 'INTERACTION_BATCH_MAX_EVENTS', 500)
+
+
+def score(interaction):
+    """Undecayed score of one interaction row"""
+    return float(sum(weight * getattr(interaction, field) for field, weight in WEIGHTS.items()))
+
+
+def merge(events):
+    """{product_id: {'view_count': n, flag: True, ...}} for [(product_id, event, count)]"""
+    merged = defaultdict(lambda: {'view_count': 0})
+    for product_id, event, count in events:
+        if event not in EVENTS:
+            raise ValueError(f'Unknown interaction event: {event}')
+        entry = merged[product_id]
+        entry[EVENTS[event][0]] = True
+        if event == 'view':
+            entry['view_count'] += count
+    return merged
+
+
+def record(customer_id, events):
+    """Upsert a customer's interactions for [(product_id, event, count)]; returns the rows written"""
+    merged = merge(events)
+    if not merged:
+        return 0
+    with transaction.atomic():
+        # Events for products that no longer exist are dropped
+        product_ids = list(models.Product.objects.filter(pk__in=list(merged)).values_list('pk', flat=True))
+        existing = {
+            row['product_id']: row
+            for row in models.CustomerProductInteraction.objects.select_for_update()
+            .filter(customer_id=customer_id, product_id__in=product_ids)
+            .values('product_id', 'view_count', *FLAGS)
+        }
+        rows = []
+        for product_id in product_ids:
+            # Unsaved rows for every product: bulk_create would split rows with and without pks
+            row = models.CustomerProductInteraction(customer_id=customer_id, **existing.get(product_id, {'product_id': product_id}))
+            changes = merged[product_id]
+            row.view_count += changes['view_count']
+            for flag in FLAGS:
+                if changes.get(flag):
+                    setattr(row, flag, True)
+            row.interaction_score = score(row)
+            rows.append(row)
+        models.CustomerProductInteraction.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['customer', 'product'],
+            update_fields=[*FLAGS, 'view_count', 'interaction_score', 'last_interaction'],
+        )
+    return len(rows)
+
+
+def count(events):
+    """Queue the ProductStatistics increments for [(product_id, event, count)]"""
+    totals = defaultdict(Counter)
+    for product_id, event, amount in events:
+        totals[product_id][EVENTS[event][1]] += amount
+    counters.increment_many(totals)
@@ -0,0 +1,203 @@
+"""
+Item-item collaborative filtering.
+
+``build()`` reads every CustomerProductInteraction as a weighted
+customer x product entry (``interaction_score``, plus one for a purchase).
+It computes the cosine similarity of every pair of products that share a
+customer, with the same sort-and-offset pairing as main.relations, and keeps
+each product's ``top`` neighbours. The result is stored CSR-style as four
+flat ``.npy`` arrays in a new version directory under
+``ITEM_SIMILARITY_DIR``:
+
+- ``products``: sorted source product ids;
+- ``offsets``: where each product's neighbours start;
+- ``neighbors`` and ``scores``: neighbour ids and their similarity.
+
+The ``current`` symlink is then swapped to that directory atomically.
+
+Workers memory-map the arrays read-only, so every process on a host shares
+one copy through the page cache. They re-check ``current`` every
+``ITEM_SIMILARITY_TTL`` seconds. ``recommend()`` merges the neighbour lists
+of a customer's items in memory, without touching the database.
+"""
+import itertools
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from . import models, relations
+
+DIRECTORY = getattr(settings, 'ITEM_SIMILARITY_DIR', os.path.join(settings.BASE_DIR, 'var', 'item_similarity'))
+# Seconds a worker trusts its mapped model before checking for a newer build
+TTL = getattr(settings, 'ITEM_SIMILARITY_TTL', 300)
+ARRAYS = ('products', 'offsets', 'neighbors', 'scores')
+KEEP_VERSIONS = 2
+
+_model = None
+_checked = 0.0
+_lock = threading.Lock()
+
+
+def load_interactions(chunk_size=50000):
+    """(customer_id, product_id, weight) rows with a positive weight, as an (n, 3) float array"""
+    rows = (
+        models.CustomerProductInteraction.objects
+        .annotate(weight=F('interaction_score') + Cast('purchased', FloatField()))
+        .filter(weight__gt=0).order_by()
+        .values_list('customer_id', 'product_id', 'weight')
+        .iterator(chunk_size=chunk_size)
+    )
+    return np.fromiter(itertools.chain.from_iterable(rows), dtype=np.float64).reshape(-1, 3)
+
+
+def similarities(entries, max_basket=200):
+    """
+    Cosine similarity of products over customers.
+
+    Returns (product_ids, left, right, scores), with left/right indexing into
+    ``product_ids``. Customers with more than ``max_basket`` products are
+    left out of the pair sums, like oversized baskets in relations.co_occurrence,
+    but still count towards each product's norm.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if len(entries) == 0:
+        return empty, empty, empty, np.empty(0)
+    customers = np.unique(entries[:, 0], return_inverse=True)[1].ravel()
+    product_ids, items = np.unique(entries[:, 1].astype(np.int64), return_inverse=True)
+    items = items.ravel()
+    weights = entries[:, 2]
+    norms = np.sqrt(np.bincount(items, weights=weights * weights, minlength=len(product_ids)))
+
+    sizes = np.bincount(customers)
+    keep = sizes[customers] <= max_basket
+    customers, items, weights = customers[keep], items[keep], weights[keep]
+    order = np.lexsort((items, customers))
+    customers, items, weights = customers[order], items[order], weights[order]
+
+    n_products = len(product_ids)
+    keys, products = [], []
+    longest = int(sizes[sizes <= max_basket].max(initial=0))
+    for offset in range(1, longest):
+        same = customers[:-offset] == customers[offset:]
+        if not same.any():
+            break
+        a, b = items[:-offset][same], items[offset:][same]
+        product = weights[:-offset][same] * weights[offset:][same]
+        keys.extend((a * n_products + b, b * n_products + a))
+        products.extend((product, product))
+    if not keys:
+        return product_ids, empty, empty, np.empty(0)
+
+    unique_keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    dots = np.bincount(inverse.ravel(), weights=np.concatenate(products))
+    left, right = unique_keys // n_products, unique_keys % n_products
+    return product_ids, left, right, dots / (norms[left] * norms[right])
+
+
+def build(top=20, max_basket=200, directory=None):
+    """Compute and publish a new similarity model; returns (products with neighbours, pairs kept)"""
+    directory = directory or DIRECTORY
+    product_ids, left, right, scores = similarities(load_interactions(), max_basket=max_basket)
+    left, right, scores = relations.top_k(left, right, scores, top)
+
+    # top_k leaves the pairs grouped by source product in ascending order
+    sources, counts = np.unique(left, return_counts=True)
+    arrays = {
+        'products': product_ids[sources],
+        'offsets': np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+        'neighbors': product_ids[right],
+        'scores': scores.astype(np.float32),
+    }
+    version = os.path.join(directory, f'v{time.time_ns()}')
+    os.makedirs(version)
+    for name, array in arrays.items():
+        np.save(os.path.join(version, f'{name}.npy'), array)
+    publish(directory, version)
+    return len(sources), len(right)
+
+
+def publish(directory, version):
+    """Point ``current`` at ``version`` atomically and drop old versions"""
+    link = os.path.join(directory, 'current')
+    staging = f'{link}.{os.getpid()}'
+    os.symlink(os.path.basename(version), staging)
+    os.replace(staging, link)
+    versions = sorted(name for name in os.listdir(directory) if name.startswith('v'))
+    for name in versions[:-KEEP_VERSIONS]:
+        # Workers that still map an old version keep their open files
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+class SimilarityModel:
+    def __init__(self, path):
+        self.path = path
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+        self.products = arrays['products']
+        self.offsets = arrays['offsets']
+        self.neighbors = arrays['neighbors']
+        self.scores = arrays['scores']
+
+    def recommend(self, seeds, limit, exclude=()):
+        """
+        Top ``limit`` product ids for {product_id: weight} seeds. A candidate
+        scores the weighted sum of its similarity to every seed.
+        """
+        if not seeds or not len(self.products):
+            return []
+        ids = np.fromiter(seeds, dtype=np.int64, count=len(seeds))
+        weights = np.fromiter(seeds.values(), dtype=np.float64, count=len(seeds))
+        rows = np.searchsorted(self.products, ids)
+        rows = np.minimum(rows, len(self.products) - 1)
+        found = self.products[rows] == ids
+        rows, weights = rows[found], weights[found]
+        if not len(rows):
+            return []
+        starts, ends = self.offsets[rows], self.offsets[rows + 1]
+        candidates = np.concatenate([self.neighbors[start:end] for start, end in zip(starts, ends)])
+        contributions = np.concatenate([self.scores[start:end] * weight
+                                        for start, end, weight in zip(starts, ends, weights)])
+        unique, inverse = np.unique(candidates, return_inverse=True)
+        totals = np.bincount(inverse.ravel(), weights=contributions)
+        allowed = ~np.isin(unique, np.fromiter(set(exclude) | set(seeds), dtype=np.int64))
+        unique, totals = unique[allowed], totals[allowed]
+        # Highest score first, ties by id for stable results
+        order = np.lexsort((unique, -totals))[:limit]
+        return unique[order].tolist()
+
+
+def get_model():
+    """The published model, mapped once per process and re-checked every ``TTL`` seconds"""
+    global _model, _checked
+    now = time.monotonic()
+    with _lock:
+        if now - _checked < TTL:
+            return _model
+        _checked = now
+        link = os.path.join(DIRECTORY, 'current')
+        if not os.path.islink(link):
+            # Not built yet
+            _model = None
+            return None
+        path = os.path.realpath(link)
+        if _model is None or _model.path != path:
+            _model = SimilarityModel(path)
+        return _model
+
+
+def reset():
+    """Forget the mapped model; the next request looks for ``current`` again"""
+    global _model, _checked
+    with _lock:
+        _model, _checked = None, 0.0
+
+
+def recommend(seeds, limit, exclude=()):
+    """Product ids for {product_id: weight}; [] when no model has been built"""
+    model = get_model()
+    return model.recommend(seeds, limit, exclude) if model is not None else []
@@ -0,0 +1,52 @@
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from main import queryplans
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the API\'s representative queries, flag full scans and temp sorts, and suggest indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', action='append', default=[],
+                            help='Also explain the statements in this query log (JSON lines with "sql"/"params", or plain SQL)')
+        parser.add_argument('--no-representative', action='store_true',
+                            help='Only explain the --log statements')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not just flagged ones')
+        parser.add_argument('--write-migration', action='store_true',
+                            help='Write the suggested indexes as a new migration of the main app')
+        parser.add_argument('--check', action='store_true',
+                            help='Exit with an error when an index is suggested (for CI)')
+
+    def handle(self, *args, **options):
+        statements = [statement for path in options['log'] for statement in queryplans.load_log(path)]
+        plans = queryplans.capture(queries={} if options['no_representative'] else None, statements=statements)
+
+        flagged = [plan for plan in plans if plan.findings]
+        for plan in plans:
+            if not plan.findings and not options['verbose_plans']:
+                continue
+            summary = '; '.join(f'{kind}: {target}' for kind, target in plan.findings) or 'ok'
+            self.stdout.write(f'{plan.name}: {summary}')
+            for line in plan.lines:
+                self.stdout.write(f'    {line}')
+
+        indexes = queryplans.suggested_indexes(plans)
+        if indexes:
+            self.stdout.write('\nSuggested Meta.indexes:')
+            for model, index in indexes:
+                self.stdout.write(f'    {model.__name__}: models.Index(fields={list(index.fields)!r}, name={index.name!r})')
+        if indexes and options['write_migration']:
+            filename, source = queryplans.migration(indexes)
+            path = os.path.join(apps.get_app_config('main').path, 'migrations', filename)
+            with open(path, 'w', encoding='utf-8') as handle:
+                handle.write(source)
+            self.stdout.write(f'Wrote {path}; add the same indexes to the models\' Meta.indexes')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Explained {len(plans)} queries: {len(flagged)} flagged, {len(indexes)} indexes suggested'
+        ))
+        if indexes and options['check']:
+            raise CommandError(f'{len(indexes)} suggested indexes are missing')
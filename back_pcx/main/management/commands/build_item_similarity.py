@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import itemcf
+
+
+class Command(BaseCommand):
+    help = 'Build the item-item similarity model behind /api/recommendations/ from customer interactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=20, help='Neighbours kept per product')
+        parser.add_argument('--max-basket', type=int, default=200,
+                            help='Leave customers with more interacted products than this out of the pair sums')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        products, pairs = itemcf.build(top=options['top_k'], max_basket=options['max_basket'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{products} products -> {pairs} neighbours in {time.monotonic() - started:.1f}s'
+        ))
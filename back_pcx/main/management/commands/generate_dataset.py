@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main import synthetic
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a deterministic synthetic catalog for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendors', type=int, default=10)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--customers', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--ratings', type=int, default=5000)
+        parser.add_argument('--interactions', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Same seed and sizes produce the same dataset')
+        parser.add_argument('--prefix', default=synthetic.DEFAULT_PREFIX,
+                            help='Username prefix of the generated accounts')
+        parser.add_argument('--password', default=synthetic.DEFAULT_PASSWORD,
+                            help='Password shared by every generated account')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            created = synthetic.generate(
+                vendors=options['vendors'], categories=options['categories'], products=options['products'],
+                customers=options['customers'], orders=options['orders'], ratings_count=options['ratings'],
+                interactions=options['interactions'], seed=options['seed'], prefix=options['prefix'],
+                password=options['password'], batch_size=options['batch_size'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        summary = ', '.join(f'{count} {name}' for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f'Generated {summary}'))
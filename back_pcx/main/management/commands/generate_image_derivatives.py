@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from main import images
+
+
+class Command(BaseCommand):
+    help = 'Render responsive WebP/JPEG derivatives for existing product thumbnails and images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (defaults to the number of CPUs)')
+        parser.add_argument('--only', choices=sorted(images.TARGETS), action='append',
+                            help='Restrict to product thumbnails or gallery images (repeatable)')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render originals whose derivatives are already current')
+
+    def handle(self, *args, **options):
+        kinds = options['only'] or tuple(images.TARGETS)
+        rendered, failed = images.generate(kinds=kinds, workers=options['workers'], force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'Rendered derivatives for {rendered} image(s), {failed} failed'))
@@ -0,0 +1,40 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import importers, models
+
+
+class Command(BaseCommand):
+    help = 'Bulk import products for a vendor from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with header row) or NDJSON file')
+        parser.add_argument('--vendor', type=int, required=True, help='Vendor id owning the products')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=importers.DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--create-categories', action='store_true',
+                            help='Create categories that do not exist yet instead of rejecting the row')
+
+    def handle(self, *args, **options):
+        if not models.Vendor.objects.filter(pk=options['vendor']).exists():
+            raise CommandError(f"Vendor {options['vendor']} does not exist")
+
+        fmt = options['format'] or importers.detect_format(options['path'])
+        started = time.monotonic()
+        with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+            result = importers.import_products(
+                options['vendor'], lines, fmt,
+                chunk_size=options['chunk_size'],
+                create_categories=options['create_categories'],
+            )
+        elapsed = time.monotonic() - started
+
+        for error in result['errors']:
+            self.stderr.write(json.dumps(error))
+        rate = result['created'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} product(s), {result['failed']} row(s) rejected "
+            f"in {elapsed:.1f}s ({rate:.0f} rows/s)"
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import relations
+
+
+class Command(BaseCommand):
+    help = 'Fill RelatedProduct with "purchased together" and "viewed together" relations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['orders', 'views', 'all'], default='all',
+                            help='Baskets to mine: order lines, customer views, or both')
+        parser.add_argument('--method', choices=['lift', 'cosine'], default='lift')
+        parser.add_argument('--top-k', type=int, default=10, help='Neighbours kept per product')
+        parser.add_argument('--min-count', type=int, default=2,
+                            help='Minimum number of shared baskets for a pair to count')
+        parser.add_argument('--max-basket', type=int, default=50,
+                            help='Ignore baskets with more products than this')
+
+    def handle(self, *args, **options):
+        sources = {
+            'orders': [('purchased_together', relations.order_baskets)],
+            'views': [('viewed_together', relations.view_baskets)],
+        }
+        jobs = sources['orders'] + sources['views'] if options['source'] == 'all' else sources[options['source']]
+
+        for relation_type, loader in jobs:
+            started = time.monotonic()
+            pairs = loader()
+            written = relations.mine(
+                pairs, relation_type,
+                method=options['method'],
+                top=options['top_k'],
+                min_count=options['min_count'],
+                max_basket=options['max_basket'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{relation_type}: {len(pairs)} basket lines -> {written} relations '
+                f'in {time.monotonic() - started:.1f}s'
+            ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from main import ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-product rating count, sum, average and histogram from ProductRating'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', dest='products',
+                            help='Only rebuild this product id (can be repeated)')
+
+    def handle(self, *args, **options):
+        count = ratings.rebuild(product_ids=options['products'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {count} rated product(s)'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from main import search
+
+
+class Command(BaseCommand):
+    help = 'Create the full-text product search index if needed and refill it from the product table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        backend = search.get_backend(using)
+        if backend == 'basic':
+            self.stdout.write(self.style.WARNING('No full-text index for this database backend; search uses icontains'))
+            return
+        search.create_index(using=using)
+        search.reindex(using=using)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the {backend} product search index'))
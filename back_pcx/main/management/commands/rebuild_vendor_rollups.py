@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from main import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-vendor and per-product sales rollups from OrderItems'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', type=int, action='append', dest='vendors',
+                            help='Only rebuild this vendor id (can be repeated)')
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild(vendor_ids=options['vendors'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups for {count} vendor(s)'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from main import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-category and global recommendation candidate pools'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=recommendations.POOL_SIZE,
+                            help='Products kept per pool')
+
+    def handle(self, *args, **options):
+        count = recommendations.refresh_pools(size=options['size'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {count} recommendation pool(s)'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import scoring
+
+
+class Command(BaseCommand):
+    help = 'Recompute the time-decayed interaction_score of every customer-product interaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows loaded into memory at a time')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per executemany UPDATE batch')
+        parser.add_argument('--half-life-days', type=float,
+                            help='Days for a score to halve (default: INTERACTION_SCORE_HALF_LIFE_DAYS)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        scored, updated = scoring.rescore(
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            half_life_days=options['half_life_days'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {scored} interactions, {updated} changed, in {time.monotonic() - started:.1f}s'
+        ))
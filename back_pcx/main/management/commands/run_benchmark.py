@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from main import benchmark, synthetic
+
+
+class Command(BaseCommand):
+    help = 'Load-test the main API endpoints of a running server and report the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server under test')
+        parser.add_argument('--endpoint', choices=benchmark.ENDPOINTS, action='append', dest='endpoints',
+                            help='Only benchmark this endpoint (can be repeated)')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per endpoint')
+        parser.add_argument('--query-samples', type=int, default=20,
+                            help='Requests replayed in-process to count SQL queries')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--prefix', default=synthetic.DEFAULT_PREFIX)
+        parser.add_argument('--password', default=synthetic.DEFAULT_PASSWORD)
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+
+    def handle(self, *args, **options):
+        report = benchmark.run(
+            options['url'], endpoints=options['endpoints'] or benchmark.ENDPOINTS,
+            concurrency=options['concurrency'], requests=options['requests'], warmup=options['warmup'],
+            query_samples=options['query_samples'], seed=options['seed'], timeout=options['timeout'],
+            prefix=options['prefix'], password=options['password'],
+        )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(benchmark.dumps(report) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Wrote benchmark report to {options["output"]}'))
+        else:
+            self.stdout.write(benchmark.dumps(report))
@@ -0,0 +1,210 @@
+"""
+Per-request SQL and timing instrumentation.
+
+``RequestProfilingMiddleware`` is switched on with ``REQUEST_PROFILING_ENABLED``
+and then profiles a ``REQUEST_PROFILING_SAMPLE_RATE`` fraction of requests
+under ``REQUEST_PROFILING_PATHS``. For a sampled request it records:
+
+- SQL query count and DB time, through ``connection.execute_wrapper`` (no
+  DEBUG query log involved);
+- time in the view, in DRF serialization (``serializer.data``) and in
+  response rendering;
+- repeated query shapes: the same SQL run ``REQUEST_PROFILING_REPEAT_THRESHOLD``
+  or more times in one request, which is what an N+1 loop looks like.
+
+The figures go into a ``Server-Timing`` header. Requests slower than
+``REQUEST_PROFILING_SLOW_MS``, or with repeated shapes, are also logged as one
+JSON object on the ``main.profiling`` logger. Unsampled requests only pay for
+a random draw and two clock reads. DB time is only seen for queries run on
+the request thread.
+"""
+import contextvars
+import json
+import logging
+import random
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger('main.profiling')
+
+_current = contextvars.ContextVar('request_profile', default=None)
+# Placeholder runs of different lengths ("IN (%s, %s)" vs "IN (%s, %s, %s)") are one shape
+_PLACEHOLDERS = re.compile(r'(%s|\?)(\s*,\s*(%s|\?))+')
+
+
+def query_shape(sql):
+    return _PLACEHOLDERS.sub('%s, ...', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = defaultdict(lambda: [0, 0.0])
+        self.serialize_time = 0.0
+        self.serialize_depth = 0
+        self.view_started = None
+        self.view_time = None
+        self.render_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            shape = self.shapes[sql]
+            shape[0] += 1
+            shape[1] += elapsed
+
+    def repeated(self, threshold):
+        """[(shape, count, seconds)] run at least ``threshold`` times, worst first"""
+        merged = defaultdict(lambda: [0, 0.0])
+        for sql, (count, seconds) in self.shapes.items():
+            entry = merged[query_shape(sql)]
+            entry[0] += count
+            entry[1] += seconds
+        found = [(shape, count, seconds) for shape, (count, seconds) in merged.items() if count >= threshold]
+        return sorted(found, key=lambda item: (-item[1], -item[2]))
+
+
+def _timed_data(data):
+    """Wrap BaseSerializer.data so the outermost call per request is timed"""
+    def timed(self):
+        profile = _current.get()
+        if profile is None:
+            return data.fget(self)
+        profile.serialize_depth += 1
+        started = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            profile.serialize_depth -= 1
+            if profile.serialize_depth == 0:
+                profile.serialize_time += time.perf_counter() - started
+    timed._profiled = True
+    return property(timed)
+
+
+def install_serializer_timing():
+    for cls in (serializers.BaseSerializer, serializers.Serializer, serializers.ListSerializer):
+        data = cls.__dict__.get('data')
+        if data is not None and not getattr(data.fget, '_profiled', False):
+            cls.data = _timed_data(data)
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 1.0)
+        self.slow_ms = getattr(settings, 'REQUEST_PROFILING_SLOW_MS', 500)
+        self.repeat_threshold = getattr(settings, 'REQUEST_PROFILING_REPEAT_THRESHOLD', 5)
+        self.paths = tuple(getattr(settings, 'REQUEST_PROFILING_PATHS', ('/api/',)))
+        install_serializer_timing()
+
+    def __call__(self, request):
+        if not request.path.startswith(self.paths):
+            return self.get_response(request)
+        started = time.perf_counter()
+        if random.random() >= self.sample_rate:
+            response = self.get_response(request)
+            self.log(request, response, (time.perf_counter() - started) * 1000, None)
+            return response
+
+        profile = RequestProfile()
+        request._profile = profile
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        ended = time.perf_counter()
+        if profile.view_time is None and profile.view_started is not None:
+            # Plain HttpResponses have no render step
+            profile.view_time = ended - profile.view_started
+        total_ms = (ended - started) * 1000
+        response['Server-Timing'] = self.server_timing(profile, total_ms)
+        self.log(request, response, total_ms, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(request, '_profile', None)
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook, so it marks the end of the view
+        profile = getattr(request, '_profile', None)
+        if profile is not None and profile.view_started is not None:
+            view_ended = time.perf_counter()
+            profile.view_time = view_ended - profile.view_started
+
+            def rendered(response):
+                profile.render_time = time.perf_counter() - view_ended
+            response.add_post_render_callback(rendered)
+        return response
+
+    def metrics(self, profile, total_ms):
+        """(name, milliseconds or None, description) entries for Server-Timing and the log"""
+        entries = [('db', profile.db_time * 1000, f'{profile.queries} queries')]
+        if profile.view_time is not None:
+            entries.append(('view', (profile.view_time - profile.serialize_time) * 1000, 'view code'))
+        entries.append(('serialize', profile.serialize_time * 1000, 'serializer.data'))
+        if profile.render_time is not None:
+            entries.append(('render', profile.render_time * 1000, 'response rendering'))
+        repeated = profile.repeated(self.repeat_threshold)
+        if repeated:
+            entries.append(('repeated', None, f'{len(repeated)} repeated query shapes'))
+        entries.append(('total', total_ms, None))
+        return entries
+
+    def server_timing(self, profile, total_ms):
+        parts = []
+        for name, duration, description in self.metrics(profile, total_ms):
+            part = name
+            if duration is not None:
+                part += f';dur={duration:.2f}'
+            if description:
+                part += f';desc="{description}"'
+            parts.append(part)
+        return ', '.join(parts)
+
+    def log(self, request, response, total_ms, profile):
+        repeated = profile.repeated(self.repeat_threshold) if profile is not None else []
+        if total_ms < self.slow_ms and not repeated:
+            return
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'sampled': profile is not None,
+        }
+        if profile is not None:
+            record.update({
+                'queries': profile.queries,
+                'db_ms': round(profile.db_time * 1000, 2),
+                'view_ms': round((profile.view_time - profile.serialize_time) * 1000, 2) if profile.view_time is not None else None,
+                'serialize_ms': round(profile.serialize_time * 1000, 2),
+                'render_ms': round(profile.render_time * 1000, 2) if profile.render_time is not None else None,
+                'repeated_queries': [
+                    {'sql': shape[:500], 'count': count, 'db_ms': round(seconds * 1000, 2)}
+                    for shape, count, seconds in repeated[:5]
+                ],
+            })
+        event = 'slow_request' if total_ms >= self.slow_ms else 'repeated_queries'
+        logger.warning('%s %s', event, json.dumps(record, sort_keys=True), extra={'profile': record})
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-17 21:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_productstatistics_relatedproduct_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revenue', models.FloatField(default=0.0)),
+                ('order_count', models.IntegerField(default=0)),
+                ('quantity_sold', models.IntegerField(default=0)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('vendor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollup', to='main.vendor')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VendorProductSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revenue', models.FloatField(default=0.0)),
+                ('order_count', models.IntegerField(default=0)),
+                ('quantity_sold', models.IntegerField(default=0)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollup', to='main.product')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_sales_rollups', to='main.vendor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vendor', '-order_count'], name='main_vendor_vendor__5c134c_idx')],
+            },
+        ),
+    ]
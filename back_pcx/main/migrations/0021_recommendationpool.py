@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-17 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_vendorsalesrollup_vendorproductsalesrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationPool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('product_ids', models.BinaryField()),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:07
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    ProductRating = apps.get_model('main', 'ProductRating')
+    buckets = {
+        'rating_1_count': Q(rating__lte=1), 'rating_2_count': Q(rating=2), 'rating_3_count': Q(rating=3),
+        'rating_4_count': Q(rating=4), 'rating_5_count': Q(rating__gte=5),
+    }
+    rows = []
+    totals = ProductRating.objects.order_by().values('product_id').annotate(
+        count=Count('id'), total=Sum('rating'), **{field: Count('id', filter=q) for field, q in buckets.items()},
+    )
+    for row in totals.iterator():
+        product = Product(pk=row['product_id'], rating_count=row['count'], rating_sum=row['total'],
+                          rating_average=row['total'] / row['count'])
+        for field in buckets:
+            setattr(product, field, row[field])
+        rows.append(product)
+    Product.objects.bulk_update(rows, ['rating_count', 'rating_sum', 'rating_average', *buckets], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0022_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_average',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating_average', 'id'], name='main_product_rating_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
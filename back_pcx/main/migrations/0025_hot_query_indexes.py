@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0024_product_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customerproductinteraction',
+            index=models.Index(fields=['customer', 'interaction_score'], name='main_cpi_customer_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'order_time'], name='main_order_customer_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productrating',
+            index=models.Index(fields=['product', 'add_time', 'id'], name='main_rating_product_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='relatedproduct',
+            index=models.Index(fields=['source_product', 'relevance_score'], name='main_related_source_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wishlistitem',
+            index=models.Index(fields=['customer', 'added_at'], name='main_wishlist_cust_time_idx'),
+        ),
+    ]
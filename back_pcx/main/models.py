@@ -1,5 +1,7 @@
 import datetime
+from collections import defaultdict
 from django.db import models
+from django.db.models.functions import RowNumber
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import Group, Permission
 from django.utils import timezone
@@ -45,6 +47,7 @@ class ProductCategory(models.Model):
     title=models.CharField(max_length=250)
     detail=models.TextField(null=True)
     image=models.ImageField(upload_to='uploads/categories/thumbnail', null=True, blank=True) 
+    updated_at=models.DateTimeField(auto_now=True)
 
     def __str__(self):                                  
         return self.title
@@ -57,27 +60,93 @@ class Product(models.Model):
     detail=models.TextField(null=True)
     price=models.FloatField()
     thumbnail=models.ImageField(upload_to='uploads/products/thumbnail')
+    # Responsive derivatives of the thumbnail, maintained by main.images
+    thumbnail_variants=models.JSONField(default=dict, blank=True, editable=False)
+    # Rating aggregates, maintained from ProductRating by main.ratings
+    rating_count=models.PositiveIntegerField(default=0, editable=False)
+    rating_sum=models.IntegerField(default=0, editable=False)
+    rating_average=models.FloatField(default=0.0, editable=False)
+    rating_1_count=models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count=models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count=models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count=models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count=models.PositiveIntegerField(default=0, editable=False)
+    # Seeds Last-Modified for conditional GETs (main.caching); bulk .update() calls leave it alone
+    updated_at=models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Backs ?ordering=rating / -rating with the id tie-breaker the paginator adds
+            models.Index(fields=['rating_average', 'id'], name='main_product_rating_idx'),
+            # Faceted filtering (main.facets): price ranges alone, within a category or a vendor
+            models.Index(fields=['price', 'id'], name='main_product_price_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='main_product_cat_price_idx'),
+            models.Index(fields=['vendor', 'price', 'id'], name='main_product_vendor_price_idx'),
+        ]
+
+    # Written only by set-based updates (main.ratings, main.images)
+    MAINTAINED_FIELDS = ('thumbnail_variants', 'rating_count', 'rating_sum', 'rating_average', 'rating_1_count',
+                         'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count')
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # A full save of an older copy would write its stale aggregates back over newer ratings and derivatives
+        if kwargs.get('update_fields') is None and not kwargs.get('force_insert') and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     def get_related_products(self, limit=5):
         """Get related products based on explicit relationships, same category, or user behavior"""
+        if getattr(self, '_related_products_limit', 0) < limit:
+            Product.prefetch_related_products([self], limit=limit)
+        return self._related_products[:limit]
+
+    @classmethod
+    def prefetch_related_products(cls, products, limit=5):
+        """
+        Load the related products of many products in at most two queries and
+        cache them for get_related_products(). Explicit relations (best score
+        first) win; products without any fall back to their category.
+        """
+        products = [product for product in products if product.pk is not None]
+        related = {product.pk: [] for product in products}
+        if not related:
+            return
         # First check for explicitly defined related products
-        explicit_related = RelatedProduct.objects.filter(source_product=self).values_list('target_product', flat=True)
-        if explicit_related.exists():
-            return Product.objects.filter(id__in=explicit_related)[:limit]
-        
-        # Then try products from the same category
-        if self.category:
-            return Product.objects.filter(category=self.category).exclude(id=self.id)[:limit]
-            
-        # If no related products found, return empty queryset
-        return Product.objects.none()
+        relations = RelatedProduct.objects.filter(source_product_id__in=related).select_related('target_product').annotate(
+            rank=models.Window(RowNumber(), partition_by=models.F('source_product_id'),
+                               order_by=[models.F('relevance_score').desc(), models.F('target_product_id').asc()])
+        ).filter(rank__lte=limit)
+        for relation in relations:
+            related[relation.source_product_id].append(relation.target_product)
+
+        # Then try products from the same category; one spare row covers excluding the product itself
+        categories = {product.category_id for product in products if not related[product.pk] and product.category_id}
+        by_category = defaultdict(list)
+        if categories:
+            candidates = Product.objects.filter(category_id__in=categories).annotate(
+                rank=models.Window(RowNumber(), partition_by=models.F('category_id'), order_by=models.F('id').asc())
+            ).filter(rank__lte=limit + 1)
+            for candidate in candidates:
+                by_category[candidate.category_id].append(candidate)
+        for product in products:
+            if not related[product.pk] and product.category_id:
+                related[product.pk] = [c for c in by_category[product.category_id] if c.pk != product.pk][:limit]
+            product._related_products = related[product.pk]
+            product._related_products_limit = limit
 
 class ProductImage(models.Model):
     product=models.ForeignKey(Product, on_delete=models.CASCADE, related_name='product_images')
     image=models.ImageField(upload_to='uploads/products/display_images')
+    # Responsive derivatives of the image, maintained by main.images
+    image_variants=models.JSONField(default=dict, blank=True, editable=False)
+    updated_at=models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.image.url
@@ -98,6 +167,10 @@ class RelatedProduct(models.Model):
     
     class Meta:
         unique_together = ('source_product', 'target_product')
+        indexes = [
+            # Best related products first (advise_indexes)
+            models.Index(fields=['source_product', 'relevance_score'], name='main_related_source_score_idx'),
+        ]
         
     def __str__(self):
         return f"{self.source_product.title} → {self.target_product.title} ({self.relation_type})"
@@ -128,6 +201,10 @@ class CustomerProductInteraction(models.Model):
     
     class Meta:
         unique_together = ('customer', 'product')
+        indexes = [
+            # A customer's strongest interests first, for recommendations (advise_indexes)
+            models.Index(fields=['customer', 'interaction_score'], name='main_cpi_customer_score_idx'),
+        ]
         
     def __str__(self):
         return f"{self.customer} - {self.product.title} interaction"
@@ -140,6 +217,12 @@ class ProductRating(models.Model):
     reviews = models.TextField()
     add_time = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Newest ratings of a product (advise_indexes)
+            models.Index(fields=['product', 'add_time', 'id'], name='main_rating_product_time_idx'),
+        ]
+
     def __str__(self):
         return f'{self.rating}-{self.reviews}'
 
@@ -150,6 +233,12 @@ class Order(models.Model):
     customer=models.ForeignKey(Customer, on_delete=models.CASCADE)
     order_time=models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A customer's recent orders (advise_indexes)
+            models.Index(fields=['customer', 'order_time'], name='main_order_customer_time_idx'),
+        ]
+
     def __unicode__(self):
         return '%s' % (self.order_time)
 
@@ -163,6 +252,40 @@ class OrderItems(models.Model):
     def __str__(self):
         return self.product.title
     
+# Recommendation Pools - Precomputed candidate product ids, see main.recommendations
+class RecommendationPool(models.Model):
+    key = models.CharField(max_length=64, unique=True)  # 'global' or 'category:<id>'
+    product_ids = models.BinaryField()  # packed int64 array
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
+
+# Vendor Sales Rollups - Kept in step with OrderItems by main.rollups
+class VendorSalesRollup(models.Model):
+    vendor = models.OneToOneField(Vendor, on_delete=models.CASCADE, related_name='sales_rollup')
+    revenue = models.FloatField(default=0.0)
+    order_count = models.IntegerField(default=0)
+    quantity_sold = models.IntegerField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Sales for {self.vendor}"
+
+class VendorProductSalesRollup(models.Model):
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='product_sales_rollups')
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='sales_rollup')
+    revenue = models.FloatField(default=0.0)
+    order_count = models.IntegerField(default=0)
+    quantity_sold = models.IntegerField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['vendor', '-order_count'])]
+
+    def __str__(self):
+        return f"Sales for {self.product.title}"
+
 # Customer WishLIst   
 class WishlistItem(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='wishlist')
@@ -171,6 +294,10 @@ class WishlistItem(models.Model):
 
     class Meta:
         unique_together = ('customer', 'product')  # To ensure a user can't add the same product multiple times
+        indexes = [
+            # A customer's recently wishlisted products (advise_indexes)
+            models.Index(fields=['customer', 'added_at'], name='main_wishlist_cust_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.customer.user.username}'s wishlist - {self.product.title}"
@@ -1,5 +1,12 @@
+import base64
+import json
+
+from django.db import connections
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 class CustomPagination(pagination.PageNumberPagination):
     def get_paginated_response(self, data):
@@ -10,4 +17,169 @@ class CustomPagination(pagination.PageNumberPagination):
             },
             'count':self.page.paginator.count,
             'data':data
-        })
\ No newline at end of file
+        })
+
+
+class SearchPagination(CustomPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Cursor pagination keyed on (sort key, id) that never issues an OFFSET.
+
+    Pagination is opt-in: a request is only paginated when it carries
+    ``?page_size=`` or ``?cursor=`` (or when ``PAGE_SIZE`` is set in
+    ``REST_FRAMEWORK``), so clients that expect a plain list keep working.
+    Views pick their sortable fields with ``ordering_fields`` (public name ->
+    model field) and their default with ``ordering``.
+
+    ``?count=exact`` runs a ``COUNT(*)``, ``?count=none`` skips it and the
+    default ``estimate`` asks the planner for a row estimate where one exists.
+    """
+    page_size = pagination.api_settings.PAGE_SIZE
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    count_query_param = 'count'
+    default_ordering = 'id'
+    count_mode = 'estimate'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        # Featured lists and other pre-sliced querysets can't be filtered further
+        if self.page_size is None or queryset.query.is_sliced:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.sort_field, self.descending = self.get_ordering(request, view)
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor['r'])
+
+        self.count = self.get_count(queryset, request)
+
+        if cursor is not None:
+            queryset = queryset.filter(self.keyset_filter(cursor['v'], cursor['id']))
+        queryset = queryset.order_by(*self.order_by_fields())
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'links':{
+                'next':self.get_next_link(),
+                'previous':self.get_previous_link()
+            },
+            'count':self.count,
+            'data':data
+        })
+
+    def get_page_size(self, request):
+        if self.page_size_query_param in request.query_params:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+            except (TypeError, ValueError):
+                size = 0
+            if size > 0:
+                return min(size, self.max_page_size)
+        if self.cursor_query_param in request.query_params:
+            return self.page_size or self.max_page_size
+        return self.page_size
+
+    def get_ordering(self, request, view):
+        """Return the (model field, descending) pair used as the sort key."""
+        fields = getattr(view, 'ordering_fields', None) or {'id': 'id'}
+        default = getattr(view, 'ordering', None) or self.default_ordering
+        for candidate in (request.query_params.get(self.ordering_query_param), default):
+            if not candidate:
+                continue
+            name = candidate.lstrip('-')
+            if name in fields:
+                return fields[name], candidate.startswith('-')
+        return 'id', False
+
+    def order_by_fields(self):
+        descending = self.descending != self.reverse
+        prefix = '-' if descending else ''
+        if self.sort_field in ('id', 'pk'):
+            return [prefix + 'pk']
+        return [prefix + self.sort_field, prefix + 'pk']
+
+    def keyset_filter(self, value, pk):
+        lookup = 'lt' if self.descending != self.reverse else 'gt'
+        if self.sort_field in ('id', 'pk'):
+            return Q(**{'pk__' + lookup: pk})
+        return (
+            Q(**{self.sort_field + '__' + lookup: value}) |
+            Q(**{self.sort_field: value, 'pk__' + lookup: pk})
+        )
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param, self.count_mode)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return self.estimate_count(queryset)
+        return None
+
+    def estimate_count(self, queryset):
+        """Planner row estimate, or None on backends that don't offer one."""
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def encode_cursor(self, row, reverse):
+        value = row.pk if self.sort_field in ('id', 'pk') else getattr(row, self.sort_field)
+        if not isinstance(value, (int, float, str)) and value is not None:
+            value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        payload = json.dumps({'v': value, 'id': row.pk, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            return {'v': data['v'], 'id': int(data['id']), 'r': bool(data.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
@@ -0,0 +1,251 @@
+"""
+Query-plan capture and index suggestions.
+
+``representative_queries()`` builds the querysets behind the API's hot
+paths (dashboards, order and wishlist lists, recommendations, product
+lists, the sales rollups' order-line lookups), using the first customer,
+vendor, product, category and order in the database as sample ids.
+``explain()`` runs a statement through ``EXPLAIN QUERY PLAN`` on SQLite or
+``EXPLAIN (FORMAT JSON)`` on Postgres.
+It reports two kinds of finding: full table scans and sorts done in a
+temporary structure instead of read off an index.
+
+For a flagged queryset, ``suggest()`` proposes an index on the queried
+model: the columns compared for equality first, then the ``ORDER BY``
+columns, or else the first range-filtered column. Suggestions already
+covered by an existing index prefix are dropped. ``migration()`` renders
+the suggestions as an ``AddIndex`` migration. Replayed SQL (``load_log()``)
+is explained and flagged only, since its columns cannot be read back.
+"""
+import json
+from dataclasses import dataclass, field
+
+from django.db import connection, models as db_models
+from django.db.migrations import Migration
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.operations import AddIndex
+from django.db.migrations.writer import MigrationWriter
+from django.db.models.expressions import Col
+from django.db.models.lookups import Lookup
+from django.db.models.sql.where import AND, WhereNode
+
+from . import facets, models
+
+FULL_SCAN = 'full scan'
+TEMP_SORT = 'temp sort'
+EQUALITY_LOOKUPS = ('exact', 'in', 'isnull')
+RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte', 'range')
+
+
+@dataclass
+class Plan:
+    name: str
+    sql: str
+    lines: list
+    findings: list = field(default_factory=list)
+    suggestion: tuple = None
+
+
+def _first(model):
+    return model.objects.order_by('pk').values_list('pk', flat=True).first()
+
+
+def representative_queries():
+    """{name: queryset} for the API's hot queries; skipped when there is no sample row"""
+    customer, vendor, product, category, order = (
+        _first(models.Customer), _first(models.Vendor), _first(models.Product), _first(models.ProductCategory),
+        _first(models.Order),
+    )
+    queries = {}
+    if customer is not None:
+        queries.update({
+            'customer_recent_orders': models.Order.objects.filter(customer_id=customer).order_by('-order_time')[:5],
+            'customer_recent_wishlist': models.WishlistItem.objects.filter(customer_id=customer)
+            .select_related('product').order_by('-added_at')[:5],
+            'customer_order_count': models.Order.objects.filter(customer_id=customer).order_by(),
+            'customer_interests': models.CustomerProductInteraction.objects.filter(customer_id=customer)
+            .order_by('-interaction_score').values_list('product_id', 'interaction_score'),
+        })
+    if vendor is not None:
+        queries.update({
+            'vendor_recent_orders': models.OrderItems.objects.filter(product__vendor_id=vendor)
+            .select_related('order', 'product').order_by('-order__order_time')[:5],
+            'vendor_products': models.Product.objects.filter(vendor_id=vendor).order_by('price', 'id')[:20],
+            'vendor_top_products': models.VendorProductSalesRollup.objects.filter(vendor_id=vendor)
+            .order_by('-order_count')[:5],
+        })
+    if product is not None:
+        queries.update({
+            'product_orders': models.OrderItems.objects.filter(product_id=product).values_list('order_id', flat=True),
+            'product_recent_ratings': models.ProductRating.objects.filter(product_id=product)
+            .order_by('-add_time', '-id')[:10],
+            'product_related': models.RelatedProduct.objects.filter(source_product_id=product)
+            .order_by('-relevance_score'),
+        })
+    if order is not None:
+        # The (order, product) pairs rollups.record_items and the order-count checks read back
+        queries['order_existing_lines'] = models.OrderItems.objects.filter(order_id__in=[order]).exclude(
+            pk__in=[0]).values_list('order_id', 'product_id', 'product__vendor_id')
+    if category is not None:
+        queries['category_products_by_price'] = facets.apply(
+            models.Product.objects.all(), {'category': [category], 'price': (10.0, 500.0)}
+        ).order_by('price', 'id')[:20]
+    queries['products_by_rating'] = models.Product.objects.order_by('-rating_average', '-id')[:20]
+    return queries
+
+
+def load_log(path):
+    """
+    Statements from a captured query log: one JSON object per line with
+    ``sql`` and optional ``params``, or one plain SQL statement per line.
+    Placeholders without params are bound to NULL, which is enough for a plan.
+    """
+    statements = []
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                entry = json.loads(line)
+                sql, params = entry['sql'], entry.get('params')
+            else:
+                sql, params = line, None
+            if params is None:
+                params = [None] * (sql.count('%s') + sql.count('?'))
+                sql = sql.replace('?', '%s')
+            statements.append((sql, params))
+    return statements
+
+
+def _tables():
+    return set(connection.introspection.table_names())
+
+
+def explain(sql, params):
+    """(plan lines, findings) for one statement on the default connection"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            return _postgres_findings(cursor.fetchone()[0][0]['Plan'])
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return _sqlite_findings(cursor.fetchall())
+
+
+def _sqlite_findings(rows):
+    tables = _tables()
+    lines, findings = [], []
+    for row in rows:
+        detail = row[-1]
+        lines.append(detail)
+        words = detail.split()
+        # "SCAN t" reads the whole table; "SCAN t USING [COVERING] INDEX" walks an index in order
+        if words[0] == 'SCAN' and len(words) > 1 and words[1] in tables and 'USING' not in words:
+            findings.append((FULL_SCAN, words[1]))
+        elif detail.startswith('USE TEMP B-TREE FOR'):
+            findings.append((TEMP_SORT, detail[len('USE TEMP B-TREE FOR '):]))
+    return lines, findings
+
+
+def _postgres_findings(node, depth=0):
+    lines = ['  ' * depth + node['Node Type'] + (f" on {node['Relation Name']}" if 'Relation Name' in node else '')]
+    findings = []
+    if node['Node Type'] == 'Seq Scan':
+        findings.append((FULL_SCAN, node['Relation Name']))
+    elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+        findings.append((TEMP_SORT, ', '.join(node.get('Sort Key', []))))
+    for child in node.get('Plans', []):
+        child_lines, child_findings = _postgres_findings(child, depth + 1)
+        lines.extend(child_lines)
+        findings.extend(child_findings)
+    return lines, findings
+
+
+def _columns(query, node, equality, ranges):
+    """Collect the base-table fields compared in an AND-only WHERE tree"""
+    if isinstance(node, WhereNode):
+        if node.connector != AND or node.negated:
+            return
+        for child in node.children:
+            _columns(query, child, equality, ranges)
+    elif isinstance(node, Lookup) and isinstance(node.lhs, Col) and node.lhs.alias == query.base_table:
+        name = node.lhs.target.name
+        if node.lookup_name in EQUALITY_LOOKUPS and name not in equality:
+            equality.append(name)
+        elif node.lookup_name in RANGE_LOOKUPS and name not in ranges:
+            ranges.append(name)
+
+
+def suggest(queryset):
+    """(model, fields) of a helpful index for ``queryset``, or None"""
+    query = queryset.query
+    model = query.model
+    equality, ranges = [], []
+    _columns(query, query.where, equality, ranges)
+    ordering = []
+    for name in query.order_by:
+        if not isinstance(name, str) or '__' in name:
+            # Ordering on a joined table can't come from this table's index
+            ordering = []
+            break
+        name = name.lstrip('-')
+        ordering.append(model._meta.pk.name if name == 'pk' else name)
+    tail = [name for name in ordering if name not in equality] or ranges[:1]
+    fields = equality + tail
+    if not fields or fields == [model._meta.pk.name] or covered(model, fields):
+        return None
+    return model, tuple(fields)
+
+
+def existing_indexes(model):
+    """Field lists of the indexes a model already has, FK indexes included"""
+    found = [[name.lstrip('-') for name in index.fields] for index in model._meta.indexes]
+    found += [list(fields) for fields in model._meta.unique_together]
+    found += [[f.name] for f in model._meta.concrete_fields if f.db_index or f.unique or f.primary_key]
+    return found
+
+
+def covered(model, fields):
+    """Whether an existing index starts with ``fields``"""
+    fields = [model._meta.get_field(name).name for name in fields]
+    return any(existing[:len(fields)] == fields for existing in existing_indexes(model))
+
+
+def capture(queries=None, statements=()):
+    """Explain the representative queries and any replayed statements; returns [Plan]"""
+    if queries is None:
+        queries = representative_queries()
+    plans = []
+    for name, queryset in queries.items():
+        sql, params = queryset.query.sql_with_params()
+        lines, findings = explain(sql, params)
+        plan = Plan(name, sql, lines, findings)
+        if findings:
+            plan.suggestion = suggest(queryset)
+        plans.append(plan)
+    for number, (sql, params) in enumerate(statements, 1):
+        lines, findings = explain(sql, params)
+        plans.append(Plan(f'log:{number}', sql, lines, findings))
+    return plans
+
+
+def suggested_indexes(plans):
+    """Distinct suggested indexes as [(model, Index)], in the order they were found"""
+    seen = {}
+    for plan in plans:
+        if plan.suggestion is not None and plan.suggestion not in seen:
+            model, fields = plan.suggestion
+            index = db_models.Index(fields=list(fields))
+            index.set_name_with_model(model)
+            seen[plan.suggestion] = (model, index)
+    return list(seen.values())
+
+
+def migration(indexes, app_label='main', name='suggested_indexes'):
+    """(file name, source) of a migration adding ``indexes`` after the app's latest migration"""
+    leaves = MigrationLoader(None, ignore_no_migrations=True).graph.leaf_nodes(app_label)
+    number = int(leaves[0][1].split('_')[0]) + 1 if leaves else 1
+    instance = Migration(f'{number:04d}_{name}', app_label)
+    instance.dependencies = leaves
+    instance.operations = [AddIndex(model._meta.model_name, index) for model, index in indexes]
+    return f'{instance.name}.py', MigrationWriter(instance).as_string()
@@ -0,0 +1,113 @@
+"""
+Denormalized rating aggregates on Product.
+
+``rating_count``, ``rating_sum``, the 1-5 star histogram and the derived
+``rating_average`` are adjusted with one ``UPDATE ... SET x = x + n`` per
+ProductRating write (see main.signals), so grids can show stars and sort by
+rating without aggregating reviews. Ratings outside 1-5 still count towards
+the sum and count but land in the nearest histogram bucket.
+``rebuild_product_ratings`` recomputes everything with one grouped query.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+from . import caching, models
+
+STARS = (1, 2, 3, 4, 5)
+HISTOGRAM_FIELDS = {stars: f'rating_{stars}_count' for stars in STARS}
+
+
+def bucket(rating):
+    return min(max(int(rating), STARS[0]), STARS[-1])
+
+
+def histogram(product):
+    return {str(stars): getattr(product, field) for stars, field in HISTOGRAM_FIELDS.items()}
+
+
+def _apply(deltas):
+    """Add {product_id: [count, sum, {stars: count}]} deltas to the product rows"""
+    changed = False
+    for product_id, (count, total, stars) in deltas.items():
+        if not count and not total and not any(stars.values()):
+            continue
+        new_count = F('rating_count') + count
+        new_sum = F('rating_sum') + total
+        changes = {
+            'rating_count': new_count,
+            'rating_sum': new_sum,
+            # Evaluated against the old row, like the other assignments in the UPDATE
+            'rating_average': Case(
+                When(rating_count__gt=-count, then=Cast(new_sum, FloatField()) / Cast(new_count, FloatField())),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        }
+        for value, amount in stars.items():
+            if amount:
+                changes[HISTOGRAM_FIELDS[value]] = F(HISTOGRAM_FIELDS[value]) + amount
+        changed |= bool(models.Product.objects.filter(pk=product_id).update(**changes))
+    if changed:
+        # update() skips the signals that invalidate cached catalog responses
+        caching.bump(models.Product)
+
+
+def _deltas(added=(), removed=()):
+    deltas = defaultdict(lambda: [0, 0, defaultdict(int)])
+    for rating, sign in [(rating, 1) for rating in added] + [(rating, -1) for rating in removed]:
+        product_id, value = rating
+        entry = deltas[product_id]
+        entry[0] += sign
+        entry[1] += sign * value
+        entry[2][bucket(value)] += sign
+    return deltas
+
+
+def record(product_id, rating):
+    _apply(_deltas(added=[(product_id, rating)]))
+
+
+def retract(product_id, rating):
+    _apply(_deltas(removed=[(product_id, rating)]))
+
+
+def change(previous, current):
+    """Move a rating from (product_id, rating) ``previous`` to ``current``"""
+    _apply(_deltas(added=[current], removed=[previous]))
+
+
+def rebuild(product_ids=None, batch_size=1000):
+    """Recompute the aggregates from ProductRating; returns the number of products rated"""
+    ratings = models.ProductRating.objects.order_by()
+    products = models.Product.objects.all()
+    if product_ids is not None:
+        ratings = ratings.filter(product_id__in=product_ids)
+        products = products.filter(pk__in=product_ids)
+
+    bucket_filters = {
+        stars: Q(rating__lte=stars) if stars == STARS[0] else Q(rating__gte=stars) if stars == STARS[-1] else Q(rating=stars)
+        for stars in STARS
+    }
+    totals = ratings.values('product_id').annotate(
+        count=Count('id'), total=Sum('rating'),
+        **{field: Count('id', filter=bucket_filters[stars]) for stars, field in HISTOGRAM_FIELDS.items()},
+    )
+    fields = ['rating_count', 'rating_sum', 'rating_average', *HISTOGRAM_FIELDS.values()]
+
+    with transaction.atomic():
+        products.update(rating_count=0, rating_sum=0, rating_average=0.0,
+                        **{field: 0 for field in HISTOGRAM_FIELDS.values()})
+        rows = []
+        for row in totals.iterator():
+            product = models.Product(pk=row['product_id'], rating_count=row['count'], rating_sum=row['total'],
+                                     rating_average=row['total'] / row['count'])
+            for field in HISTOGRAM_FIELDS.values():
+                setattr(product, field, row[field])
+            rows.append(product)
+        models.Product.objects.bulk_update(rows, fields, batch_size=batch_size)
+    # Bulk writes skip the signals that invalidate cached catalog responses
+    caching.bump(models.Product)
+    return len(rows)
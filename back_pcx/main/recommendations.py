@@ -0,0 +1,106 @@
+"""
+Candidate pools for product recommendations.
+
+A periodic job ranks products by popularity and stores the best ids of every
+category, plus a global pool, as packed int64 arrays in RecommendationPool.
+Requests sample from those arrays in memory instead of running
+``ORDER BY RANDOM()`` over the product table.
+"""
+import random
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from . import models
+
+GLOBAL_POOL = 'global'
+POOL_SIZE = getattr(settings, 'RECOMMENDATION_POOL_SIZE', 500)
+# Seconds a worker keeps a pool before reading it again
+POOL_TTL = getattr(settings, 'RECOMMENDATION_POOL_TTL', 300)
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def category_key(category_id):
+    return f'category:{category_id}'
+
+
+def pack(ids):
+    return array('q', ids).tobytes()
+
+
+def unpack(data):
+    ids = array('q')
+    ids.frombytes(bytes(data))
+    return ids
+
+
+def popularity():
+    """Ranking expression used to fill the pools"""
+    return (
+        Coalesce(F('statistics__purchase_count'), Value(0)) * 5 +
+        Coalesce(F('statistics__cart_add_count'), Value(0)) * 3 +
+        Coalesce(F('statistics__wishlist_add_count'), Value(0)) * 2 +
+        Coalesce(F('statistics__view_count'), Value(0))
+    )
+
+
+def refresh_pools(size=POOL_SIZE):
+    """Rebuild every pool; returns the number of pools written"""
+    ranked = models.Product.objects.annotate(
+        score=popularity(),
+        rank=Window(RowNumber(), partition_by=[F('category_id')], order_by=[F('score').desc(), F('id').desc()]),
+    ).filter(rank__lte=size).values_list('category_id', 'id', 'score')
+
+    by_category = {}
+    for category_id, product_id, score in ranked.iterator(chunk_size=10000):
+        by_category.setdefault(category_id, []).append((score, product_id))
+
+    pools = {GLOBAL_POOL: sorted(
+        (entry for entries in by_category.values() for entry in entries), reverse=True
+    )[:size]}
+    for category_id, entries in by_category.items():
+        if category_id is not None:
+            pools[category_key(category_id)] = entries
+
+    with transaction.atomic():
+        models.RecommendationPool.objects.exclude(key__in=list(pools)).delete()
+        models.RecommendationPool.objects.bulk_create(
+            [models.RecommendationPool(key=key, product_ids=pack(pid for _, pid in entries)) for key, entries in pools.items()],
+            update_conflicts=True, unique_fields=['key'], update_fields=['product_ids', 'refreshed_at'],
+        )
+    with _lock:
+        _pools.clear()
+    return len(pools)
+
+
+def get_pools(keys):
+    """Return {key: id array} for the requested pools, reading stale or missing ones in one query"""
+    now = time.monotonic()
+    with _lock:
+        found = {key: _pools[key][1] for key in keys if key in _pools and now - _pools[key][0] < POOL_TTL}
+    missing = [key for key in keys if key not in found]
+    if missing:
+        rows = dict(models.RecommendationPool.objects.filter(key__in=missing).values_list('key', 'product_ids'))
+        with _lock:
+            for key in missing:
+                ids = unpack(rows[key]) if key in rows else array('q')
+                _pools[key] = (now, ids)
+                found[key] = ids
+    return found
+
+
+def sample(keys, limit, exclude=()):
+    """Draw up to ``limit`` distinct product ids from the union of the pools"""
+    exclude = set(exclude)
+    candidates = set()
+    for ids in get_pools(keys).values():
+        candidates.update(ids)
+    candidates.difference_update(exclude)
+    return random.sample(sorted(candidates), min(limit, len(candidates)))
@@ -0,0 +1,129 @@
+"""
+Offline "purchased together" / "viewed together" mining for RelatedProduct.
+
+Baskets (orders, or a customer's viewed products) are loaded as two flat id
+arrays, pairs are counted with a sort and ``np.unique`` instead of a Python
+loop, and each pair is scored by lift or cosine similarity before the top-K
+neighbours of every product are written back in bulk.
+"""
+import itertools
+
+import numpy as np
+from django.db import transaction
+
+from . import caching, models
+
+
+def load_baskets(queryset, chunk_size=50000):
+    """Stream (basket_id, product_id) rows of a values_list queryset into an (n, 2) array"""
+    rows = queryset.order_by().distinct().iterator(chunk_size=chunk_size)
+    flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64)
+    return flat.reshape(-1, 2)
+
+
+def order_baskets():
+    return load_baskets(models.OrderItems.objects.values_list('order_id', 'product_id'))
+
+
+def view_baskets():
+    return load_baskets(
+        models.CustomerProductInteraction.objects.filter(viewed=True).values_list('customer_id', 'product_id')
+    )
+
+
+def co_occurrence(pairs, max_basket=50):
+    """
+    Count how often two products share a basket.
+
+    Returns (product_ids, support, left, right, together) where ``support`` is
+    the number of baskets holding each product and left/right index into
+    ``product_ids``. Baskets larger than ``max_basket`` are skipped: they are
+    rare, carry little signal and would dominate the pair count.
+    """
+    if len(pairs) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty, empty
+
+    baskets = np.unique(pairs[:, 0], return_inverse=True)[1].ravel()
+    product_ids, items = np.unique(pairs[:, 1], return_inverse=True)
+    items = items.ravel()
+    support = np.bincount(items, minlength=len(product_ids))
+
+    sizes = np.bincount(baskets)
+    keep = sizes[baskets] <= max_basket
+    baskets, items = baskets[keep], items[keep]
+    order = np.lexsort((items, baskets))
+    baskets, items = baskets[order], items[order]
+
+    # Members of a basket are contiguous, so pairing each row with the row
+    # `offset` places later covers every pair once per offset up to max_basket
+    n_products = len(product_ids)
+    keys = []
+    longest = int(sizes[sizes <= max_basket].max(initial=0))
+    for offset in range(1, longest):
+        same = baskets[:-offset] == baskets[offset:]
+        if not same.any():
+            break
+        a = items[:-offset][same]
+        b = items[offset:][same]
+        keys.append(a * n_products + b)
+        keys.append(b * n_products + a)
+    if not keys:
+        empty = np.empty(0, dtype=np.int64)
+        return product_ids, support, empty, empty, empty
+
+    unique_keys, together = np.unique(np.concatenate(keys), return_counts=True)
+    return product_ids, support, unique_keys // n_products, unique_keys % n_products, together
+
+
+def score_pairs(support, left, right, together, n_baskets, method='lift'):
+    if method == 'cosine':
+        return together / np.sqrt(support[left].astype(np.float64) * support[right])
+    return together * float(n_baskets) / (support[left].astype(np.float64) * support[right])
+
+
+def top_k(left, right, scores, k):
+    """Keep the k best-scoring neighbours of every left-hand product"""
+    order = np.lexsort((-scores, left))
+    left, right, scores = left[order], right[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, left[1:] != left[:-1]])
+    rank = np.arange(len(left)) - np.repeat(starts, np.diff(np.r_[starts, len(left)]))
+    keep = rank < k
+    return left[keep], right[keep], scores[keep]
+
+
+def mine(pairs, relation_type, method='lift', top=10, min_count=2, max_basket=50, batch_size=5000):
+    """Mine related products from basket pairs and store them; returns the number of rows written"""
+    n_baskets = len(np.unique(pairs[:, 0])) if len(pairs) else 0
+    product_ids, support, left, right, together = co_occurrence(pairs, max_basket=max_basket)
+    frequent = together >= min_count
+    left, right, together = left[frequent], right[frequent], together[frequent]
+    scores = score_pairs(support, left, right, together, n_baskets, method=method)
+    left, right, scores = top_k(left, right, scores, top)
+    return store(product_ids[left], product_ids[right], scores, relation_type, batch_size=batch_size)
+
+
+def store(sources, targets, scores, relation_type, batch_size=5000):
+    """
+    Replace the mined rows of ``relation_type``. Pairs already related some
+    other way (e.g. manually) win the ``unique_together`` conflict and are kept.
+    """
+    rows = (
+        models.RelatedProduct(source_product_id=int(s), target_product_id=int(t),
+                              relation_type=relation_type, relevance_score=float(score))
+        for s, t, score in zip(sources, targets, scores)
+    )
+    written = 0
+    with transaction.atomic():
+        # Nothing cascades from RelatedProduct, so skip per-row delete signals
+        stale = models.RelatedProduct.objects.filter(relation_type=relation_type)
+        stale._raw_delete(stale.db)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            models.RelatedProduct.objects.bulk_create(batch, ignore_conflicts=True)
+            written += len(batch)
+    # Bulk writes skip the signals that normally invalidate cached responses
+    caching.bump(models.RelatedProduct)
+    return written
@@ -0,0 +1,206 @@
+"""
+Per-vendor and per-product sales rollups.
+
+Revenue and quantity are additive, so every OrderItems write just adds or
+subtracts its line. Order counts are distinct orders: an order is counted the
+first time a vendor's (or product's) line lands in it, and uncounted after
+commit once its last such line is gone. Revenue follows the dashboard's
+definition (current price x quantity), so price changes re-value the rollup.
+A batch of deltas is written with one CASE-based UPDATE per rollup table.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, IntegerField, Sum, Value, When
+
+from . import models
+
+# Rollup columns in the order of the [revenue, quantity, orders] deltas
+_TOTALS = (('revenue', FloatField()), ('quantity_sold', IntegerField()), ('order_count', IntegerField()))
+
+
+def _product_info(product_ids):
+    return {
+        pk: (vendor_id, price)
+        for pk, vendor_id, price in models.Product.objects.filter(pk__in=set(product_ids)).values_list('pk', 'vendor_id', 'price')
+    }
+
+
+def _update(model, key_field, deltas, chunk_size=500):
+    """One ``UPDATE ... SET x = x + CASE key WHEN ... END`` per chunk of rows"""
+    keys = [key for key, values in deltas.items() if any(values)]
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        changes = {}
+        for index, (field, output_field) in enumerate(_TOTALS):
+            whens = [When(**{key_field: key}, then=Value(deltas[key][index])) for key in chunk if deltas[key][index]]
+            if whens:
+                changes[field] = F(field) + Case(*whens, default=Value(0), output_field=output_field)
+        model.objects.filter(**{f'{key_field}__in': chunk}).update(**changes)
+
+
+def _apply(vendor_deltas, product_deltas, create=False):
+    """Add {key: [revenue, quantity, orders]} deltas to the rollup rows"""
+    if create:
+        models.VendorProductSalesRollup.objects.bulk_create(
+            [models.VendorProductSalesRollup(product_id=product_id, vendor_id=vendor_id)
+             for vendor_id, product_id in product_deltas],
+            ignore_conflicts=True,
+        )
+        models.VendorSalesRollup.objects.bulk_create(
+            [models.VendorSalesRollup(vendor_id=vendor_id) for vendor_id in vendor_deltas],
+            ignore_conflicts=True,
+        )
+    _update(models.VendorProductSalesRollup, 'product_id',
+            {product_id: values for (_, product_id), values in product_deltas.items()})
+    _update(models.VendorSalesRollup, 'vendor_id', vendor_deltas)
+
+
+def record_items(items, replaced=()):
+    """
+    Add freshly written OrderItems (saved or bulk created) to the rollups.
+    ``replaced`` holds the previous state of edited lines, whose orders were
+    already counted.
+    """
+    items = [item for item in items if item.pk is not None]
+    if not items:
+        return
+    info = _product_info([item.product_id for item in items] + [old.product_id for old in replaced])
+
+    # (order, product, vendor) triples that were already present before this batch
+    existing = set(
+        models.OrderItems.objects.filter(order_id__in={item.order_id for item in items})
+        .exclude(pk__in=[item.pk for item in items])
+        .values_list('order_id', 'product_id', 'product__vendor_id')
+    )
+    existing.update((old.order_id, old.product_id, info.get(old.product_id, (None,))[0]) for old in replaced)
+    seen_vendor_orders = {(order_id, vendor_id) for order_id, _, vendor_id in existing}
+    seen_product_orders = {(order_id, product_id) for order_id, product_id, _ in existing}
+
+    vendor_deltas = defaultdict(lambda: [0.0, 0, 0])
+    product_deltas = defaultdict(lambda: [0.0, 0, 0])
+    for item in items:
+        vendor_id, price = info.get(item.product_id, (None, 0.0))
+        if vendor_id is None:
+            continue
+        revenue = price * item.quantity
+        for deltas, key, seen, pair in (
+            (vendor_deltas, vendor_id, seen_vendor_orders, (item.order_id, vendor_id)),
+            (product_deltas, (vendor_id, item.product_id), seen_product_orders, (item.order_id, item.product_id)),
+        ):
+            deltas[key][0] += revenue
+            deltas[key][1] += item.quantity
+            if pair not in seen:
+                seen.add(pair)
+                deltas[key][2] += 1
+    _apply(vendor_deltas, product_deltas, create=True)
+
+
+def retract_items(items):
+    """Take removed OrderItems lines out of the rollups; order counts settle on commit"""
+    info = _product_info(item.product_id for item in items)
+    vendor_deltas = defaultdict(lambda: [0.0, 0, 0])
+    product_deltas = defaultdict(lambda: [0.0, 0, 0])
+    for item in items:
+        vendor_id, price = info.get(item.product_id, (None, 0.0))
+        if vendor_id is None:
+            continue
+        revenue = price * item.quantity
+        vendor_deltas[vendor_id][0] -= revenue
+        vendor_deltas[vendor_id][1] -= item.quantity
+        product_deltas[(vendor_id, item.product_id)][0] -= revenue
+        product_deltas[(vendor_id, item.product_id)][1] -= item.quantity
+        _schedule_order_check(item.order_id, item.product_id, vendor_id)
+    _apply(vendor_deltas, product_deltas)
+
+
+def requantify_item(item, previous_quantity):
+    """Move the additive totals after a line's quantity changed in place"""
+    vendor_id, price = _product_info([item.product_id]).get(item.product_id, (None, 0.0))
+    if vendor_id is None:
+        return
+    change = item.quantity - previous_quantity
+    _apply({vendor_id: [price * change, change, 0]}, {(vendor_id, item.product_id): [price * change, change, 0]})
+
+
+class _OrderChecks:
+    """on_commit hook settling the order counts touched by one transaction"""
+    def __init__(self):
+        self.pending = set()
+
+    def __call__(self):
+        _settle_order_checks(self.pending)
+
+
+def _schedule_order_check(order_id, product_id, vendor_id):
+    # Several lines of one order can go in the same transaction (cascades),
+    # so the "is the order gone for this vendor" check is deduplicated and
+    # deferred. The pending set lives on the on_commit hook itself, so a
+    # rollback throws it away. Rows of products deleted meanwhile are
+    # simply not updated.
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        for _, hook, _ in connection.run_on_commit:
+            if isinstance(hook, _OrderChecks):
+                hook.pending.add((order_id, product_id, vendor_id))
+                return
+    hook = _OrderChecks()
+    hook.pending.add((order_id, product_id, vendor_id))
+    transaction.on_commit(hook)
+
+
+def _settle_order_checks(pending):
+    remaining = set(
+        models.OrderItems.objects.filter(order_id__in={order_id for order_id, _, _ in pending})
+        .values_list('order_id', 'product_id', 'product__vendor_id')
+    )
+    vendor_orders = {(order_id, vendor_id) for order_id, _, vendor_id in remaining}
+    product_orders = {(order_id, product_id) for order_id, product_id, _ in remaining}
+
+    vendor_deltas = defaultdict(lambda: [0.0, 0, 0])
+    product_deltas = defaultdict(lambda: [0.0, 0, 0])
+    for order_id, vendor_id in {(order_id, vendor_id) for order_id, _, vendor_id in pending}:
+        if (order_id, vendor_id) not in vendor_orders:
+            vendor_deltas[vendor_id][2] -= 1
+    for order_id, product_id, vendor_id in pending:
+        if (order_id, product_id) not in product_orders:
+            product_deltas[(vendor_id, product_id)][2] -= 1
+    _apply(vendor_deltas, product_deltas)
+
+
+def revalue_product(product_id, vendor_id, price_delta):
+    """Re-price a product's sold quantity after its price changed"""
+    rollup = models.VendorProductSalesRollup.objects.filter(product_id=product_id).values_list('quantity_sold', flat=True).first()
+    if not rollup or vendor_id is None:
+        return
+    _apply({vendor_id: [price_delta * rollup, 0, 0]}, {(vendor_id, product_id): [price_delta * rollup, 0, 0]})
+
+
+def rebuild(vendor_ids=None):
+    """Recompute rollups from OrderItems with two grouped queries"""
+    items = models.OrderItems.objects.filter(product__vendor__isnull=False).order_by()
+    vendor_rows = models.VendorSalesRollup.objects.all()
+    product_rows = models.VendorProductSalesRollup.objects.all()
+    if vendor_ids is not None:
+        items = items.filter(product__vendor_id__in=vendor_ids)
+        vendor_rows = vendor_rows.filter(vendor_id__in=vendor_ids)
+        product_rows = product_rows.filter(vendor_id__in=vendor_ids)
+
+    line_revenue = ExpressionWrapper(F('quantity') * F('product__price'), output_field=FloatField())
+    totals = dict(revenue=Sum(line_revenue), quantity_sold=Sum('quantity'), order_count=Count('order_id', distinct=True))
+
+    with transaction.atomic():
+        product_rows.delete()
+        vendor_rows.delete()
+        models.VendorProductSalesRollup.objects.bulk_create((
+            models.VendorProductSalesRollup(product_id=row['product_id'], vendor_id=row['product__vendor_id'],
+                                            revenue=row['revenue'] or 0.0, quantity_sold=row['quantity_sold'] or 0,
+                                            order_count=row['order_count'])
+            for row in items.values('product_id', 'product__vendor_id').annotate(**totals).iterator()
+        ), batch_size=1000)
+        created = models.VendorSalesRollup.objects.bulk_create((
+            models.VendorSalesRollup(vendor_id=row['product__vendor_id'], revenue=row['revenue'] or 0.0,
+                                     quantity_sold=row['quantity_sold'] or 0, order_count=row['order_count'])
+            for row in items.values('product__vendor_id').annotate(**totals).iterator()
+        ), batch_size=1000)
+    return len(created)
@@ -0,0 +1,95 @@
+"""
+Time-decayed interaction scores.
+
+``rescore()`` walks CustomerProductInteraction in primary-key chunks. Each
+chunk's view counts, flags and last-interaction times are loaded into NumPy
+arrays (no model instances), and the score is computed for the whole chunk
+at once::
+
+    score = (weights . [view_count, added_to_cart, added_to_wishlist, purchased])
+            * 0.5 ** (age / half_life)
+
+Timestamps are converted to epoch seconds in SQL, so no datetime objects are
+built either. Only rows whose score actually moved are written back, one
+``executemany`` UPDATE per batch: ``bulk_update``'s ``CASE pk WHEN ...``
+statement costs O(batch) per row and took minutes per million rows.
+``last_interaction`` is left alone: it is the clock the decay runs on.
+Weights come from ``INTERACTION_SCORE_WEIGHTS`` (shared with the event
+upserts in main.interactions) and the half-life from
+``INTERACTION_SCORE_HALF_LIFE_DAYS``.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import FloatField, Func
+from django.utils import timezone
+
+from . import interactions, models
+
+HALF_LIFE_DAYS = getattr(settings, 'INTERACTION_SCORE_HALF_LIFE_DAYS', 30.0)
+FEATURES = ('view_count', 'added_to_cart', 'added_to_wishlist', 'purchased')
+# Scores closer than this to the stored value are not rewritten
+TOLERANCE = 1e-3
+
+
+def decayed_scores(features, ages, weights, half_life):
+    """Scores for an (n, len(FEATURES)) feature matrix and ages in seconds"""
+    decay = np.exp2(-np.maximum(ages, 0.0) / half_life) if half_life > 0 else 1.0
+    return features @ weights * decay
+
+
+class Epoch(Func):
+    """Seconds since 1970 of a datetime column, computed by the database"""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='((julianday(%(expressions)s) - 2440587.5) * 86400.0)',
+                           **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra_context)
+
+
+def load_chunk(after, chunk_size):
+    """(ids, features, timestamps, stored scores) for the next ``chunk_size`` rows with pk > ``after``"""
+    rows = list(
+        models.CustomerProductInteraction.objects.filter(pk__gt=after).order_by('pk')
+        .annotate(stamp=Epoch('last_interaction'))
+        .values_list('pk', *FEATURES, 'interaction_score', 'stamp')[:chunk_size]
+    )
+    table = np.array(rows, dtype=np.float64).reshape(len(rows), len(FEATURES) + 3)
+    return table[:, 0].astype(np.int64), table[:, 1:1 + len(FEATURES)], table[:, -1], table[:, -2]
+
+
+def write_scores(ids, scores, batch_size=2000):
+    """Store interaction_score for parallel id/score arrays"""
+    quote = connection.ops.quote_name
+    opts = models.CustomerProductInteraction._meta
+    sql = (f'UPDATE {quote(opts.db_table)} SET {quote(opts.get_field("interaction_score").column)} = %s '
+           f'WHERE {quote(opts.pk.column)} = %s')
+    rows = list(zip(scores.tolist(), ids.tolist()))
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def rescore(chunk_size=50000, batch_size=2000, half_life_days=None, weights=None, now=None):
+    """Recompute every interaction_score; returns (rows scored, rows updated)"""
+    half_life = (HALF_LIFE_DAYS if half_life_days is None else half_life_days) * 86400.0
+    weights = weights or interactions.WEIGHTS
+    weight_vector = np.array([float(weights.get(field, 0.0)) for field in FEATURES])
+    now = (now or timezone.now()).timestamp()
+
+    scored = updated = 0
+    after = 0
+    while True:
+        ids, features, stamps, stored = load_chunk(after, chunk_size)
+        if not len(ids):
+            return scored, updated
+        scores = decayed_scores(features, now - stamps, weight_vector, half_life)
+        changed = np.flatnonzero(np.abs(scores - stored) > TOLERANCE)
+        write_scores(ids[changed], scores[changed], batch_size)
+        scored += len(ids)
+        updated += len(changed)
+        after = int(ids[-1])
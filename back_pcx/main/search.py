@@ -0,0 +1,200 @@
+"""
+Full-text product search.
+
+Product titles, details and category titles are kept in a real text index:
+an FTS5 virtual table on SQLite, or a ``tsvector`` table with a GIN index on
+Postgres. Other backends fall back to ``icontains``. The index is created on
+``post_migrate`` and kept in sync by signals (see main.signals); bulk writers
+call ``reindex()`` themselves and ``rebuild_search_index`` refills it.
+"""
+import re
+
+from django.db import connections, transaction
+from django.db.models import Q
+
+from . import models
+
+FTS_TABLE = 'main_product_fts'
+PG_TABLE = 'main_product_search'
+# bm25 weights for the title, detail and category columns
+SQLITE_WEIGHTS = (10.0, 1.0, 4.0)
+CHUNK_SIZE = 500
+
+_backends = {}
+
+
+def get_backend(using='default'):
+    """'sqlite', 'postgresql' or 'basic' for the given database alias"""
+    if using not in _backends:
+        connection = connections[using]
+        backend = 'basic'
+        if connection.vendor == 'postgresql':
+            backend = 'postgresql'
+        elif connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA compile_options')
+                if any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall()):
+                    backend = 'sqlite'
+        _backends[using] = backend
+    return _backends[using]
+
+
+def _tables():
+    return models.Product._meta.db_table, models.ProductCategory._meta.db_table
+
+
+def create_index(using='default'):
+    """Create the index table if it is missing; returns True when it was created"""
+    backend = get_backend(using)
+    connection = connections[using]
+    if backend == 'basic':
+        return False
+    table = FTS_TABLE if backend == 'sqlite' else PG_TABLE
+    if table in connection.introspection.table_names():
+        return False
+    product_table, _ = _tables()
+    with connection.cursor() as cursor:
+        if backend == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5(title, detail, category, tokenize='porter unicode61')"
+            )
+        else:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {PG_TABLE} ('
+                f'product_id bigint PRIMARY KEY REFERENCES {product_table} (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                f'document tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {PG_TABLE}_document ON {PG_TABLE} USING GIN (document)')
+    return True
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _where(product_ids, category_id):
+    """Parallel lists of WHERE clauses and params selecting the products to (re)index"""
+    if category_id is not None:
+        return ['p.category_id = %s'], [[category_id]]
+    if product_ids is None:
+        return ['1 = 1'], [[]]
+    return (
+        [f'p.id IN ({", ".join(["%s"] * len(chunk))})' for chunk in _chunks(product_ids)],
+        [chunk for chunk in _chunks(product_ids)],
+    )
+
+
+def reindex(product_ids=None, category_id=None, using='default'):
+    """Refresh index rows from the product table, for some or all products"""
+    backend = get_backend(using)
+    if backend == 'basic':
+        return
+    product_table, category_table = _tables()
+    clauses, params = _where(product_ids, category_id)
+    source = (
+        f'FROM {product_table} p LEFT JOIN {category_table} c ON c.id = p.category_id'
+    )
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        for clause, chunk in zip(clauses, params):
+            if backend == 'sqlite':
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT p.id {source} WHERE {clause})', chunk)
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} (rowid, title, detail, category) "
+                    f"SELECT p.id, p.title, COALESCE(p.detail, ''), COALESCE(c.title, '') {source} WHERE {clause}",
+                    chunk,
+                )
+            else:
+                cursor.execute(
+                    f"INSERT INTO {PG_TABLE} (product_id, document) "
+                    f"SELECT p.id, "
+                    f"setweight(to_tsvector('english', COALESCE(p.title, '')), 'A') || "
+                    f"setweight(to_tsvector('english', COALESCE(c.title, '')), 'B') || "
+                    f"setweight(to_tsvector('english', COALESCE(p.detail, '')), 'C') "
+                    f"{source} WHERE {clause} "
+                    f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                    chunk,
+                )
+
+
+def remove(product_ids, using='default'):
+    backend = get_backend(using)
+    if backend == 'basic':
+        return
+    table, column = (FTS_TABLE, 'rowid') if backend == 'sqlite' else (PG_TABLE, 'product_id')
+    with connections[using].cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({", ".join(["%s"] * len(chunk))})', chunk)
+
+
+def fts5_query(text):
+    """Turn free text into an FTS5 expression matching every word as a prefix"""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+class SearchResults:
+    """
+    Lazily evaluated, rank-ordered search hits. Supports ``count()`` and
+    slicing, which is all Django's Paginator needs.
+    """
+    def __init__(self, text, queryset=None, using='default'):
+        self.text = text
+        self.queryset = queryset if queryset is not None else models.Product.objects.all()
+        self.using = using
+        self.backend = get_backend(using)
+        self._count = None
+
+    def _match(self):
+        """(FROM/WHERE clause, params, rank expression, rank order) for the active backend"""
+        if self.backend == 'sqlite':
+            weights = ', '.join(str(w) for w in SQLITE_WEIGHTS)
+            return (f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [fts5_query(self.text)],
+                    f'rowid, bm25({FTS_TABLE}, {weights})', 'ASC')
+        return (f"FROM {PG_TABLE}, websearch_to_tsquery('english', %s) query WHERE document @@ query", [self.text],
+                'product_id, ts_rank_cd(document, query)', 'DESC')
+
+    def _basic(self):
+        qs = self.queryset
+        for word in re.findall(r'\w+', self.text):
+            qs = qs.filter(Q(title__icontains=word) | Q(detail__icontains=word) | Q(category__title__icontains=word))
+        return qs.order_by('id')
+
+    def _empty(self):
+        return not re.search(r'\w', self.text or '')
+
+    def count(self):
+        if self._count is None:
+            if self._empty():
+                self._count = 0
+            elif self.backend == 'basic':
+                self._count = self._basic().count()
+            else:
+                clause, params, _, _ = self._match()
+                with connections[self.using].cursor() as cursor:
+                    cursor.execute(f'SELECT COUNT(*) {clause}', params)
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if self._empty():
+            return []
+        if self.backend == 'basic':
+            return list(self._basic()[index])
+        start = index.start or 0
+        limit = (index.stop - start) if index.stop is not None else -1
+        clause, params, columns, direction = self._match()
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f'SELECT {columns} AS rank {clause} ORDER BY rank {direction} LIMIT %s OFFSET %s',
+                params + [limit if limit >= 0 else 1000000, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        found = self.queryset.in_bulk(ids)
+        return [found[pk] for pk in ids if pk in found]
@@ -1,117 +1,180 @@
 from rest_framework import serializers
 from rest_framework.fields import empty
 from . import models
+from . import images
+from . import ratings
+from . import interactions
+from .fieldsets import ExpandableFieldsMixin
+
+
+class SrcsetField(serializers.ReadOnlyField):
+    """Render a variants map (see main.images) as {format: srcset string}"""
+    def to_representation(self, value):
+        return images.srcset_map(value, self.context.get('request'))
+
+#User Serializers
+class UserSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    """Public account fields, for ?expand=user"""
+    class Meta:
+        model=models.CustomUser
+        fields=['id','username','email','first_name','last_name','profile_picture']
 
 #Vendor Serializers
-class VendorSerializer(serializers.ModelSerializer):
+class VendorSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'user': UserSerializer}
+
     class Meta:
         model=models.Vendor
         fields=['id','user','address']
 
-    def __init__(self, *args, **kwargs):
-        super(VendorSerializer, self).__init__(*args, **kwargs)
-        # self.Meta.depth = 1 
+class VendorDetailSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'user': UserSerializer}
 
-class VendorDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model=models.Vendor
         fields=['id','user','address']
 
-    def __init__(self, *args, **kwargs):
-        super(VendorDetailSerializer, self).__init__(*args, **kwargs)
-        # self.Meta.depth = 1
-
 #Category Serializers
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model=models.ProductCategory
         fields=['id','title','detail','image']
-    def __init__(self, *args, **kwargs):
-        super(CategorySerializer, self).__init__(*args, **kwargs)
-        self.Meta.depth = 1
 
-class CategoryDetailSerializer(serializers.ModelSerializer):
+class CategoryDetailSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model=models.ProductCategory
         fields=['id','title','detail','image'] 
-    def __init__(self, *args, **kwargs):
-        super(CategoryDetailSerializer, self).__init__(*args, **kwargs)
-        self.Meta.depth = 1
 
 #Product Serializers
 class ProductImageListSerializer(serializers.ModelSerializer):
+    image_srcset=SrcsetField(source='image_variants')
+
     class Meta:
         model=models.ProductImage
-        fields=['id','product','image']
+        fields=['id','product','image','image_srcset']
 
     def __init__(self, *args, **kwargs):
         super(ProductImageListSerializer, self).__init__(*args, **kwargs)
         # self.Meta.depth = 1
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    thumbnail_srcset=SrcsetField(source='thumbnail_variants')
+    rating_histogram=serializers.SerializerMethodField()
+
     class Meta:
         model=models.Product
-        fields=['id','category','vendor','title','detail','price','thumbnail']
+        fields=['id','category','vendor','title','detail','price','thumbnail','thumbnail_srcset',
+                'rating_count','rating_sum','rating_average','rating_histogram']
+        read_only_fields=['rating_count','rating_sum','rating_average']
 
     def __init__(self, *args, **kwargs):
         super(ProductListSerializer, self).__init__(*args, **kwargs)
         # self.Meta.depth = 1
 
+    def get_rating_histogram(self, obj):
+        """Number of ratings per star, {"1": n, ..., "5": n}"""
+        return ratings.histogram(obj)
+
+# Ratings embedded in a product payload; the full list lives at /api/productrating/
+PRODUCT_RATINGS_LIMIT = 10
+
+class ProductDetailListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, 'all') else data)
+        # One batch for the whole page instead of two queries per product
+        models.Product.prefetch_related_products(products, limit=5)
+        return super().to_representation(products)
+
 class ProductDetailSerializer(serializers.ModelSerializer):
     product_images=ProductImageListSerializer(many=True, read_only=True)
-    product_ratings=serializers.StringRelatedField(many=True, read_only=True)
+    product_ratings=serializers.SerializerMethodField()
     related_products = serializers.SerializerMethodField()
+    thumbnail_srcset=SrcsetField(source='thumbnail_variants')
     
     class Meta:
         model=models.Product
-        fields=['id','category','vendor','title','detail','price','thumbnail','product_images','product_ratings','related_products']
+        fields=['id','category','vendor','title','detail','price','thumbnail','thumbnail_srcset','product_images','product_ratings','related_products']
+        list_serializer_class=ProductDetailListSerializer
 
     def __init__(self, *args, **kwargs):
         super(ProductDetailSerializer, self).__init__(*args,**kwargs)
         # self.Meta.depth = 1
+
+    def get_product_ratings(self, obj):
+        """Newest ratings first, using the `recent_ratings` prefetch when the view set it up"""
+        ratings = getattr(obj, 'recent_ratings', None)
+        if ratings is None:
+            ratings = obj.product_ratings.order_by('-add_time', '-id')[:PRODUCT_RATINGS_LIMIT]
+        return [str(rating) for rating in ratings]
         
     def get_related_products(self, obj):
         """Get related products for this product"""
         related_products = obj.get_related_products(limit=5)
-        return ProductListSerializer(related_products, many=True, context=self.context).data
+        return ProductListSerializer(related_products, many=True, context=self.context, expand='', fields='').data
 
 #Customer Serializers
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'user': UserSerializer}
+
     class Meta:
         model=models.Customer
         fields=['id','user','mobile']
 
-    def __init__(self, *args, **kwargs):
-        super(CustomerSerializer, self).__init__(*args, **kwargs)
-        # self.Meta.depth = 1 
+class CustomerDetailSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'user': UserSerializer}
 
-class CustomerDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model=models.Customer
         fields=['id','user','mobile']
-
-    def __init__(self, *args, **kwargs):
-        super(CustomerDetailSerializer, self).__init__(*args, **kwargs)
-        self.Meta.depth = 1 
+        # A profile can't be moved to another account
+        read_only_fields=['user']
 
 #Order Serializers
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'customer': CustomerSerializer}
+
     class Meta:
         model=models.Order
         fields=['id','customer']
-    
-    def __init__(self, *args, **kwargs):
-        super(OrderSerializer, self).__init__(*args, **kwargs)
-        self.Meta.depth = 1
+        # Set from the caller by OrderList
+        read_only_fields=['customer']
+
+class OrderDetailSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'order': OrderSerializer, 'product': ProductListSerializer}
 
-class OrderDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model=models.OrderItems
         fields=['id','order','product','quantity','status']
 
-    def __init__(self, *args, **kwargs):
-        super(OrderDetailSerializer, self).__init__(*args, **kwargs)
-        self.Meta.depth = 1
+class CheckoutLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    order_items = CheckoutLineSerializer(many=True, allow_empty=False)
+
+
+class InteractionEventSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    event = serializers.ChoiceField(choices=interactions.CLIENT_EVENTS)
+    count = serializers.IntegerField(min_value=1, max_value=1000, default=1)
+
+
+class InteractionBatchSerializer(serializers.Serializer):
+    events = InteractionEventSerializer(many=True, allow_empty=False, max_length=interactions.MAX_EVENTS)
+
+
+class CheckoutOrderSerializer(serializers.ModelSerializer):
+    order_items = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.Order
+        fields = ['id', 'customer', 'order_time', 'order_items']
+
+    def get_order_items(self, obj):
+        return [{'id': item.id, 'product': item.product_id, 'quantity': item.quantity}
+                for item in self.context.get('items', ())]
 
 class CustomerAddressSerializer(serializers.ModelSerializer):
     class Meta:
@@ -122,33 +185,29 @@ class CustomerAddressSerializer(serializers.ModelSerializer):
         super(CustomerAddressSerializer, self).__init__(*args, **kwargs)
         # self.Meta.depth = 1
 
-class ProductRatingSerializer(serializers.ModelSerializer):
+class ProductRatingSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'customer': CustomerSerializer, 'product': ProductListSerializer}
+
     class Meta:
         model=models.ProductRating
         fields=['id','customer','product','rating','reviews','add_time']
+        # Set from the caller by ProductRatingViewSet
+        read_only_fields=['customer']
 
-    def __init__(self, *args, **kwargs):
-        super(ProductRatingSerializer, self).__init__(*args, **kwargs)
-        self.Meta.depth = 1
+class WishlistItemSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'customer': CustomerSerializer, 'product': ProductListSerializer}
 
-class WishlistItemSerializer(serializers.ModelSerializer):
     class Meta:
         model=models.WishlistItem
         fields=['id','customer','product','added_at']
 
-    def __init__(self, *args, **kwargs):
-        super(WishlistItemSerializer, self).__init__(*args, **kwargs)
-        # self.Meta.depth = 1
+class WishlistDetailSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'customer': CustomerSerializer, 'product': ProductListSerializer}
 
-class WishlistDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model=models.WishlistItem
         fields=['id','customer','product','added_at']
 
-    def __init__(self, *args, **kwargs):
-        super(WishlistDetailSerializer, self).__init__(*args, **kwargs)
-        self.Meta.depth = 1  
-
 # Dashboard Statistics Serializers
 class CustomerDashboardSerializer(serializers.Serializer):
     total_orders = serializers.IntegerField()
@@ -191,11 +250,13 @@ class CustomerProductInteractionSerializer(serializers.ModelSerializer):
 
 # Add Category Serializer with product count
 class ProductCategoryWithStatsSerializer(serializers.ModelSerializer):
-    product_count = serializers.SerializerMethodField()
+    # Annotated by CategoryWithStatsView in one grouped query
+    product_count = serializers.IntegerField(read_only=True)
+    vendor_count = serializers.IntegerField(read_only=True)
+    min_price = serializers.FloatField(read_only=True)
+    max_price = serializers.FloatField(read_only=True)
+    avg_price = serializers.FloatField(read_only=True)
     
     class Meta:
         model = models.ProductCategory
-        fields = ['id', 'title', 'detail', 'image', 'product_count']
-        
-    def get_product_count(self, obj):
-        return obj.category_products.count()  
\ No newline at end of file
+        fields = ['id', 'title', 'detail', 'image', 'product_count', 'vendor_count', 'min_price', 'max_price', 'avg_price']  
\ No newline at end of file
@@ -0,0 +1,149 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import caching, images, models, ratings, rollups, search, serializers
+
+
+# Vendor sales rollups
+@receiver(pre_save, sender=models.OrderItems)
+def remember_order_item(sender, instance, raw=False, **kwargs):
+    instance._previous_line = None
+    if not raw and instance.pk and not instance._state.adding:
+        instance._previous_line = models.OrderItems.objects.filter(pk=instance.pk).first()
+
+@receiver(post_save, sender=models.OrderItems)
+def order_item_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_line', None)
+    if previous is None:
+        rollups.record_items([instance])
+    elif (previous.order_id, previous.product_id) != (instance.order_id, instance.product_id):
+        rollups.retract_items([previous])
+        rollups.record_items([instance], replaced=[previous])
+    elif previous.quantity != instance.quantity:
+        rollups.requantify_item(instance, previous.quantity)
+
+@receiver(post_delete, sender=models.OrderItems)
+def order_item_deleted(sender, instance, **kwargs):
+    rollups.retract_items([instance])
+
+@receiver(pre_save, sender=models.Product)
+def remember_product_pricing(sender, instance, raw=False, **kwargs):
+    instance._previous_pricing = None
+    if not raw and instance.pk and not instance._state.adding:
+        instance._previous_pricing = models.Product.objects.filter(pk=instance.pk).values_list('vendor_id', 'price').first()
+
+@receiver(post_save, sender=models.Product)
+def product_repriced(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_pricing', None)
+    if raw or previous is None:
+        return
+    vendor_id, price = previous
+    if vendor_id != instance.vendor_id:
+        changed = [pk for pk in (vendor_id, instance.vendor_id) if pk is not None]
+        transaction.on_commit(lambda: rollups.rebuild(vendor_ids=changed))
+    elif price != instance.price:
+        rollups.revalue_product(instance.pk, instance.vendor_id, instance.price - price)
+
+
+# Catalog response cache versions
+def bump_catalog_version(sender, **kwargs):
+    caching.bump(sender)
+
+for model in (models.Product, models.ProductCategory, models.ProductImage, models.ProductRating, models.RelatedProduct):
+    post_save.connect(bump_catalog_version, sender=model, dispatch_uid=f'catalog-version-save-{model.__name__}')
+    post_delete.connect(bump_catalog_version, sender=model, dispatch_uid=f'catalog-version-delete-{model.__name__}')
+
+
+# Wishlist validators are per customer
+@receiver(pre_save, sender=models.WishlistItem)
+def remember_wishlist_customer(sender, instance, raw=False, **kwargs):
+    instance._previous_customer_id = None
+    if not raw and instance.pk and not instance._state.adding:
+        instance._previous_customer_id = models.WishlistItem.objects.filter(pk=instance.pk).values_list('customer_id', flat=True).first()
+
+@receiver(post_save, sender=models.WishlistItem)
+@receiver(post_delete, sender=models.WishlistItem)
+def bump_wishlist_version(sender, instance, **kwargs):
+    # An item moved to another customer changes both wishlists
+    customers = {instance.customer_id, getattr(instance, '_previous_customer_id', None)} - {None}
+    caching.bump_labels(*(caching.scoped_label(models.WishlistItem, customer_id) for customer_id in customers))
+
+# ?expand=customer and ?expand=customer.user render the owner, so their saves change that wishlist only
+@receiver(post_save, sender=models.Customer)
+@receiver(post_delete, sender=models.Customer)
+def bump_customer_wishlist_version(sender, instance, **kwargs):
+    caching.bump_labels(caching.scoped_label(models.WishlistItem, instance.pk))
+
+@receiver(post_save, sender=models.CustomUser)
+def bump_user_wishlist_version(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logins only write last_login, which no wishlist renders
+    if raw or (update_fields is not None and not set(update_fields) & set(serializers.UserSerializer.Meta.fields)):
+        return
+    customer_id = models.Customer.objects.filter(user_id=instance.pk).values_list('pk', flat=True).first()
+    if customer_id is not None:
+        caching.bump_labels(caching.scoped_label(models.WishlistItem, customer_id))
+
+
+# Full-text search index
+def create_search_index(sender, using='default', **kwargs):
+    if search.create_index(using=using):
+        search.reindex(using=using)
+
+@receiver(post_save, sender=models.Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.reindex(product_ids=[instance.pk])
+
+@receiver(post_delete, sender=models.Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove([instance.pk])
+
+@receiver(post_save, sender=models.ProductCategory)
+def index_category_products(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        search.reindex(category_id=instance.pk)
+
+@receiver(pre_delete, sender=models.ProductCategory)
+def remember_category_products(sender, instance, **kwargs):
+    instance._search_product_ids = list(instance.category_products.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=models.ProductCategory)
+def index_uncategorized_products(sender, instance, **kwargs):
+    search.reindex(product_ids=getattr(instance, '_search_product_ids', []))
+
+
+# Responsive image derivatives
+@receiver(post_save, sender=models.Product)
+def render_thumbnail_variants(sender, instance, raw=False, **kwargs):
+    if not raw and not images.is_current(instance.thumbnail.name, instance.thumbnail_variants):
+        images.schedule('product', instance.pk, instance.thumbnail.name)
+
+@receiver(post_save, sender=models.ProductImage)
+def render_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw and not images.is_current(instance.image.name, instance.image_variants):
+        images.schedule('image', instance.pk, instance.image.name)
+
+
+# Product rating aggregates
+@receiver(pre_save, sender=models.ProductRating)
+def remember_rating(sender, instance, raw=False, **kwargs):
+    instance._previous_rating = None
+    if not raw and instance.pk and not instance._state.adding:
+        instance._previous_rating = models.ProductRating.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+
+@receiver(post_save, sender=models.ProductRating)
+def rating_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is None:
+        ratings.record(instance.product_id, instance.rating)
+    elif previous != (instance.product_id, instance.rating):
+        ratings.change(previous, (instance.product_id, instance.rating))
+
+@receiver(post_delete, sender=models.ProductRating)
+def rating_deleted(sender, instance, **kwargs):
+    ratings.retract(instance.product_id, instance.rating)
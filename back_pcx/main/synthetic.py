@@ -0,0 +1,152 @@
+"""
+Deterministic synthetic catalog for load testing.
+
+``generate()`` fills an empty database with vendors, categories, products,
+customers, orders, ratings and interactions drawn from one seeded RNG, so
+the same arguments always produce the same rows. Everything is written with
+``bulk_create``; the derived tables that signals would normally maintain
+(sales rollups, rating aggregates, search index, recommendation pools) are
+rebuilt once at the end. Products have no thumbnail, so saving one never
+queues a derivative render of a missing file. Generated accounts share one
+password and use a username prefix, which is how the benchmark runner finds
+them again.
+"""
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from . import caching, models, ratings, recommendations, rollups, search
+
+DEFAULT_PREFIX = 'bench'
+DEFAULT_PASSWORD = 'bench-password'
+WORDS = (
+    'ultra', 'pro', 'max', 'mini', 'quiet', 'rgb', 'gaming', 'studio', 'compact', 'wireless',
+    'mechanical', 'silent', 'turbo', 'eco', 'slim', 'dual', 'quad', 'core', 'edge', 'air',
+)
+NOUNS = (
+    'keyboard', 'mouse', 'monitor', 'graphics card', 'processor', 'cooler', 'case', 'power supply',
+    'motherboard', 'headset', 'webcam', 'router', 'ssd', 'memory kit', 'speaker', 'microphone',
+)
+
+
+def _bulk(model, rows, batch_size):
+    """bulk_create an iterable in batches; returns the created objects (with pks)"""
+    created = []
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return created
+        created.extend(model.objects.bulk_create(batch, batch_size=batch_size))
+
+
+def _cumulative(weights):
+    """Cumulative weights, so each rng.choices() call is a bisect instead of a full pass"""
+    return list(itertools.accumulate(weights))
+
+
+def _users(prefix, kind, count, password, batch_size):
+    return _bulk(models.CustomUser, (
+        models.CustomUser(username=f'{prefix}_{kind}_{i}', email=f'{prefix}_{kind}_{i}@example.com',
+                          password=password, isVendor=kind == 'vendor', isCustomer=kind == 'customer')
+        for i in range(count)
+    ), batch_size)
+
+
+def generate(vendors=10, categories=20, products=2000, customers=500, orders=2000, ratings_count=5000,
+             interactions=10000, seed=42, prefix=DEFAULT_PREFIX, password=DEFAULT_PASSWORD, batch_size=2000):
+    """Create the dataset and return {model name: rows created}"""
+    if models.CustomUser.objects.filter(username__startswith=f'{prefix}_').exists():
+        raise ValueError(f'Users prefixed "{prefix}_" already exist; use a fresh database or another prefix')
+    rng = random.Random(seed)
+    # Hashing is deliberately slow, so every generated account shares one hash
+    password_hash = make_password(password)
+
+    with transaction.atomic():
+        vendor_rows = _bulk(models.Vendor, (
+            models.Vendor(user=user, address=f'{i} Bench Street')
+            for i, user in enumerate(_users(prefix, 'vendor', vendors, password_hash, batch_size))
+        ), batch_size)
+        customer_rows = _bulk(models.Customer, (
+            models.Customer(user=user, mobile=5550000000 + i)
+            for i, user in enumerate(_users(prefix, 'customer', customers, password_hash, batch_size))
+        ), batch_size)
+        category_rows = _bulk(models.ProductCategory, (
+            models.ProductCategory(title=f'{rng.choice(WORDS).title()} {NOUNS[i % len(NOUNS)].title()}s {i}',
+                                   detail=f'Synthetic category {i}')
+            for i in range(categories)
+        ), batch_size)
+
+        # A few popular categories and vendors carry most of the catalog, like a real shop
+        category_ids = [category.pk for category in category_rows]
+        vendor_ids = [vendor.pk for vendor in vendor_rows]
+        category_weights = _cumulative(1.0 / (rank + 1) for rank in range(len(category_ids)))
+        vendor_weights = _cumulative(1.0 / (rank + 1) for rank in range(len(vendor_ids)))
+        product_rows = _bulk(models.Product, (
+            models.Product(
+                title=f'{rng.choice(WORDS).title()} {rng.choice(WORDS)} {rng.choice(NOUNS)} {i}',
+                detail=' '.join(rng.choices(WORDS + NOUNS, k=12)),
+                price=round(rng.lognormvariate(4.5, 0.8), 2),
+                category_id=rng.choices(category_ids, cum_weights=category_weights)[0] if category_ids else None,
+                vendor_id=rng.choices(vendor_ids, cum_weights=vendor_weights)[0] if vendor_ids else None,
+                # No image file backs synthetic rows, so there is nothing to render derivatives from
+                thumbnail='',
+            )
+            for i in range(products)
+        ), batch_size)
+        product_ids = [product.pk for product in product_rows]
+        customer_ids = [customer.pk for customer in customer_rows]
+        # Zipf-like popularity so co-purchases and caches behave realistically
+        popularity = [1.0 / (rank + 1) ** 0.8 for rank in range(len(product_ids))]
+        product_weights = _cumulative(popularity)
+
+        created = {
+            'vendors': len(vendor_rows), 'customers': len(customer_rows),
+            'categories': len(category_rows), 'products': len(product_rows),
+        }
+        if product_ids and customer_ids:
+            order_rows = _bulk(models.Order, (
+                models.Order(customer_id=rng.choice(customer_ids)) for _ in range(orders)
+            ), batch_size)
+            created['orders'] = len(order_rows)
+            created['order_items'] = len(_bulk(models.OrderItems, (
+                models.OrderItems(order_id=order.pk, product_id=product_id, quantity=rng.randint(1, 3),
+                                  status=rng.random() < 0.7)
+                for order in order_rows
+                for product_id in set(rng.choices(product_ids, cum_weights=product_weights, k=rng.randint(1, 4)))
+            ), batch_size))
+            created['ratings'] = len(_bulk(models.ProductRating, (
+                models.ProductRating(customer_id=rng.choice(customer_ids),
+                                     product_id=rng.choices(product_ids, cum_weights=product_weights)[0],
+                                     rating=rng.choices((1, 2, 3, 4, 5), (1, 1, 2, 4, 5))[0],
+                                     reviews=' '.join(rng.choices(WORDS, k=8)))
+                for _ in range(ratings_count)
+            ), batch_size))
+            pairs = set()
+            limit = min(interactions, len(product_ids) * len(customer_ids))
+            while len(pairs) < limit:
+                pairs.add((rng.choice(customer_ids), rng.choices(product_ids, cum_weights=product_weights)[0]))
+            created['interactions'] = len(_bulk(models.CustomerProductInteraction, (
+                models.CustomerProductInteraction(
+                    customer_id=customer_id, product_id=product_id, viewed=True, view_count=rng.randint(1, 20),
+                    added_to_cart=rng.random() < 0.3, added_to_wishlist=rng.random() < 0.1,
+                    purchased=rng.random() < 0.15, interaction_score=round(rng.random() * 10, 3),
+                )
+                for customer_id, product_id in sorted(pairs)
+            ), batch_size))
+            created['statistics'] = len(_bulk(models.ProductStatistics, (
+                models.ProductStatistics(product_id=product_id, view_count=int(weight * 5000),
+                                         purchase_count=int(weight * 300), cart_add_count=int(weight * 800),
+                                         wishlist_add_count=int(weight * 200))
+                for product_id, weight in zip(product_ids, popularity)
+            ), batch_size))
+
+    # bulk_create skips the signals that keep these in step
+    rollups.rebuild()
+    ratings.rebuild()
+    search.reindex()
+    recommendations.refresh_pools()
+    caching.bump(models.Product, models.ProductCategory, models.ProductRating)
+    return created
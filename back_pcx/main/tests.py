@@ -1,9 +1,42 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+
+import numpy as np
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.db.models import Sum
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from asgiref.sync import async_to_sync
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from django.urls import reverse
-from .models import CustomUser, Customer, Product, WishlistItem
+from unittest import mock
+from .models import (
+    CustomUser, Customer, CustomerAddress, CustomerProductInteraction, Order, OrderItems, Product, ProductCategory,
+    ProductImage, ProductRating, ProductStatistics, RelatedProduct, Vendor,
+    VendorProductSalesRollup, VendorSalesRollup, WishlistItem,
+)
+from PIL import Image
+from . import (
+    benchmark, caching, counters, dashboards, images, interactions, itemcf, queryplans, ratings, recommendations,
+    relations, rollups, scoring, synthetic,
+)
+from .authentication import AccountToken, ClaimsUser, user_states
+from .middleware import RequestProfile
+from .serializers import PRODUCT_RATINGS_LIMIT
 
 class WishlistItemTests(TestCase):
     def setUp(self):
@@ -47,3 +80,1257 @@ class WishlistItemTests(TestCase):
 
         # # Assertions
         # self.assertEqual(initial_items_count + 1, updated_items_count, "Expected one more item in the wishlist")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = ProductCategory.objects.create(title='GPUs')
+        for i in range(7):
+            Product.objects.create(title=f'Card {i}', price=float(i % 3), category=self.category)
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(set(response.data), {'links', 'count', 'data'})
+            ids.extend(item['id'] for item in response.data['data'])
+            url = response.data['links']['next']
+        return ids
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get('/api/products/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 7)
+
+    def test_walks_every_row_once_in_sort_order(self):
+        ids = self.collect('/api/products/?page_size=3&ordering=-price')
+        expected = list(Product.objects.order_by('-price', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get('/api/products/?page_size=3&ordering=price')
+        second = self.client.get(first.data['links']['next'])
+        back = self.client.get(second.data['links']['previous'])
+        self.assertEqual(back.data['data'], first.data['data'])
+        self.assertIsNone(back.data['links']['previous'])
+
+    def test_count_modes(self):
+        self.assertEqual(self.client.get('/api/products/?page_size=2&count=exact').data['count'], 7)
+        self.assertIsNone(self.client.get('/api/products/?page_size=2&count=none').data['count'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/products/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CustomerDashboardTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username='buyer', password='testpassword', isCustomer=True)
+        self.customer = Customer.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        CustomerAddress.objects.create(customer=self.customer, address='1 Main St')
+
+    def add_order(self, n_items):
+        order = Order.objects.create(customer=self.customer)
+        for i in range(n_items):
+            product = Product.objects.create(title=f'Part {order.id}-{i}', price=10.0)
+            OrderItems.objects.create(order=order, product=product, quantity=2)
+            WishlistItem.objects.create(customer=self.customer, product=product)
+        return order
+
+    def test_dashboard_totals(self):
+        self.add_order(3)
+        self.add_order(0)
+        response = self.client.get(f'/api/customer/dashboard/{self.customer.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_orders'], 2)
+        self.assertEqual(response.data['total_wishlist_items'], 3)
+        self.assertEqual(response.data['total_addresses'], 1)
+        totals = sorted((o['total_items'], o['total_amount']) for o in response.data['recent_orders'])
+        self.assertEqual(totals, [(0, 0.0), (3, 60.0)])
+
+    def test_query_budget_is_independent_of_order_size(self):
+        for _ in range(5):
+            self.add_order(20)
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/customer/dashboard/{self.customer.id}/')
+        self.assertEqual(len(response.data['recent_orders']), 5)
+        self.assertEqual(len(response.data['recent_wishlist']), 5)
+
+    def test_other_users_are_refused_before_the_aggregates_run(self):
+        self.add_order(3)
+        vendor = Vendor.objects.create(user=CustomUser.objects.create_user(username='seller', password='testpassword'))
+        self.client.force_authenticate(user=CustomUser.objects.create_user(username='stranger', password='testpassword'))
+        for path in [f'/api/customer/dashboard/{self.customer.id}/', f'/api/vendor/dashboard/{vendor.id}/']:
+            with self.assertNumQueries(1):
+                response = self.client.get(path)
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN, path)
+
+
+class VendorRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username='seller', password='testpassword', isVendor=True)
+        self.vendor = Vendor.objects.create(user=self.user)
+        self.customer = Customer.objects.create(user=CustomUser.objects.create_user(username='buyer', password='testpassword'))
+        self.cpu = Product.objects.create(title='CPU', price=100.0, vendor=self.vendor)
+        self.ram = Product.objects.create(title='RAM', price=20.0, vendor=self.vendor)
+
+    def snapshot(self):
+        vendor = VendorSalesRollup.objects.filter(vendor=self.vendor).values_list('revenue', 'order_count', 'quantity_sold').first()
+        products = sorted(VendorProductSalesRollup.objects.filter(order_count__gt=0).values_list('product_id', 'revenue', 'order_count', 'quantity_sold'))
+        return vendor, products
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_incremental_updates_match_rebuild(self):
+        first = Order.objects.create(customer=self.customer)
+        second = Order.objects.create(customer=self.customer)
+        OrderItems.objects.create(order=first, product=self.cpu, quantity=1)
+        line = OrderItems.objects.create(order=first, product=self.ram, quantity=2)
+        OrderItems.objects.create(order=second, product=self.ram, quantity=4)
+        self.assertEqual(self.snapshot()[0], (220.0, 2, 7))
+
+        line.quantity = 3
+        line.save()
+        self.cpu.price = 150.0
+        self.cpu.save()
+        self.assertMatchesRebuild()
+
+    def test_deleting_an_order_settles_order_counts(self):
+        order = Order.objects.create(customer=self.customer)
+        OrderItems.objects.create(order=order, product=self.cpu, quantity=1)
+        OrderItems.objects.create(order=order, product=self.ram, quantity=1)
+        kept = Order.objects.create(customer=self.customer)
+        OrderItems.objects.create(order=kept, product=self.ram, quantity=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(self.snapshot()[0], (20.0, 1, 1))
+        self.assertMatchesRebuild()
+
+    def test_dashboard_reads_rollups(self):
+        order = Order.objects.create(customer=self.customer)
+        OrderItems.objects.create(order=order, product=self.cpu, quantity=2)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(f'/api/vendor/dashboard/{self.vendor.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_orders'], 1)
+        self.assertEqual(response.data['total_revenue'], 200.0)
+        self.assertEqual(response.data['top_products'][0]['quantity_sold'], 2)
+
+    def test_dashboard_falls_back_to_sql_before_rollups_exist(self):
+        for quantity in (2, 1):
+            order = Order.objects.create(customer=self.customer)
+            OrderItems.objects.create(order=order, product=self.cpu, quantity=quantity)
+        self.client.force_authenticate(user=self.user)
+        rolled = self.client.get(f'/api/vendor/dashboard/{self.vendor.id}/').data
+        VendorSalesRollup.objects.all().delete()
+        VendorProductSalesRollup.objects.all().delete()
+        response = self.client.get(f'/api/vendor/dashboard/{self.vendor.id}/')
+        self.assertEqual((response.data['total_orders'], response.data['total_revenue']), (2, 300.0))
+        self.assertEqual(response.data['top_products'][0], rolled['top_products'][0])
+        self.assertEqual(response.data['top_products'][0]['orders'], 2)
+
+
+class RelatedProductMiningTests(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(user=CustomUser.objects.create_user(username='buyer', password='testpassword'))
+        self.cpu, self.board, self.cooler, self.mouse = (
+            Product.objects.create(title=title, price=1.0) for title in ('CPU', 'Board', 'Cooler', 'Mouse')
+        )
+        baskets = [
+            [self.cpu, self.board, self.cooler],
+            [self.cpu, self.board],
+            [self.cpu, self.board],
+            [self.cpu, self.cooler],
+            [self.mouse],
+        ]
+        for products in baskets:
+            order = Order.objects.create(customer=customer)
+            for product in products:
+                OrderItems.objects.create(order=order, product=product)
+
+    def test_counts_pairs_once_per_basket(self):
+        product_ids, support, left, right, together = relations.co_occurrence(relations.order_baskets())
+        counts = {(product_ids[a], product_ids[b]): n for a, b, n in zip(left, right, together)}
+        self.assertEqual(counts[(self.cpu.id, self.board.id)], 3)
+        self.assertEqual(counts[(self.board.id, self.cpu.id)], 3)
+        self.assertEqual(counts[(self.cpu.id, self.cooler.id)], 2)
+        self.assertNotIn((self.mouse.id, self.cpu.id), counts)
+
+    def test_mine_keeps_top_k_and_manual_relations(self):
+        RelatedProduct.objects.create(source_product=self.cooler, target_product=self.cpu, relation_type='manual')
+        relations.mine(relations.order_baskets(), 'purchased_together', top=1, min_count=2)
+        mined = set(RelatedProduct.objects.filter(relation_type='purchased_together')
+                    .values_list('source_product_id', 'target_product_id'))
+        self.assertEqual(mined, {(self.cpu.id, self.board.id), (self.board.id, self.cpu.id)})
+        self.assertTrue(RelatedProduct.objects.filter(source_product=self.cooler, relation_type='manual').exists())
+
+
+class RecommendationPoolTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username='buyer', password='testpassword')
+        self.customer = Customer.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.gpus = ProductCategory.objects.create(title='GPUs')
+        self.cases = ProductCategory.objects.create(title='Cases')
+        self.gpu_ids = [Product.objects.create(title=f'GPU {i}', price=1.0, category=self.gpus).id for i in range(4)]
+        self.case_ids = [Product.objects.create(title=f'Case {i}', price=1.0, category=self.cases).id for i in range(4)]
+        recommendations.refresh_pools(size=3)
+
+    def test_pools_are_capped_per_category(self):
+        pools = recommendations.get_pools([recommendations.GLOBAL_POOL, recommendations.category_key(self.gpus.id)])
+        self.assertEqual(len(pools[recommendations.GLOBAL_POOL]), 3)
+        self.assertTrue(set(pools[recommendations.category_key(self.gpus.id)]) <= set(self.gpu_ids))
+
+    def test_personalized_recommendations_skip_seen_products(self):
+        CustomerProductInteraction.objects.create(customer=self.customer, product_id=self.gpu_ids[-1], viewed=True)
+        response = self.client.get('/api/recommendations/?limit=5')
+        ids = {item['id'] for item in response.data}
+        self.assertTrue(ids)
+        self.assertTrue(ids <= set(self.gpu_ids) - {self.gpu_ids[-1]})
+
+
+class ItemSimilarityTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        patcher = mock.patch.object(itemcf, 'DIRECTORY', self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        itemcf.reset()
+        self.addCleanup(itemcf.reset)
+
+        self.products = [Product.objects.create(title=f'Part {i}', price=1.0) for i in range(5)]
+        gpu, cooler, psu, case, fan = (product.id for product in self.products)
+        self.customers = []
+        # GPU buyers also take the cooler and the PSU; case and fan go together
+        for i, basket in enumerate([(gpu, cooler, psu), (gpu, cooler), (gpu, psu), (case, fan), (cooler, psu)]):
+            customer = Customer.objects.create(user=CustomUser.objects.create_user(username=f'cf{i}', password='pw'))
+            self.customers.append(customer)
+            for product_id in basket:
+                CustomerProductInteraction.objects.create(customer=customer, product_id=product_id, interaction_score=1.0)
+
+    def test_similarities_are_cosine_over_customers(self):
+        entries = np.array([[1, 10, 1.0], [1, 20, 1.0], [2, 10, 2.0], [3, 20, 1.0]])
+        product_ids, left, right, scores = itemcf.similarities(entries)
+        self.assertEqual(product_ids.tolist(), [10, 20])
+        self.assertEqual((left.tolist(), right.tolist()), ([0, 1], [1, 0]))
+        np.testing.assert_allclose(scores, [1 / (np.sqrt(5) * np.sqrt(2))] * 2)
+
+    def test_build_publishes_memory_mapped_neighbours(self):
+        self.assertEqual(itemcf.build(top=2), (5, 8))
+        first = os.path.realpath(os.path.join(self.directory, 'current'))
+        model = itemcf.get_model()
+        self.assertIsInstance(model.neighbors, np.memmap)
+        self.assertFalse(model.neighbors.flags.writeable)
+
+        gpu, cooler, psu, case, fan = (product.id for product in self.products)
+        self.assertEqual(itemcf.recommend({case: 1.0}, 5), [fan])
+        self.assertEqual(itemcf.recommend({gpu: 1.0}, 5, exclude=[psu]), [cooler])
+        self.assertEqual(set(itemcf.recommend({cooler: 1.0, psu: 1.0}, 5)), {gpu})
+
+        itemcf.build(top=2)
+        itemcf.build(top=2)
+        self.assertNotEqual(os.path.realpath(os.path.join(self.directory, 'current')), first)
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.startswith('v')]), itemcf.KEEP_VERSIONS)
+
+    def test_recommendations_rank_similar_products_with_one_interaction_query(self):
+        itemcf.build(top=5)
+        gpu, cooler, psu, case, fan = (product.id for product in self.products)
+        user = self.customers[3].user
+        CustomerProductInteraction.objects.filter(customer=self.customers[3], product_id=fan).delete()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        # customer id, interactions, products
+        with self.assertNumQueries(3):
+            response = client.get('/api/recommendations/?limit=1')
+        self.assertEqual([item['id'] for item in response.data], [fan])
+
+    def test_unbuilt_model_recommends_nothing(self):
+        self.assertIsNone(itemcf.get_model())
+        self.assertEqual(itemcf.recommend({self.products[0].id: 1.0}, 5), [])
+
+
+class BufferedCounterTests(TestCase):
+    def setUp(self):
+        self.hot = Product.objects.create(title='Hot', price=1.0)
+        self.cold = Product.objects.create(title='Cold', price=1.0)
+
+    def test_flush_writes_summed_increments(self):
+        buffer = counters.CounterBuffer(interval=60)
+        for _ in range(50):
+            buffer.add(self.hot.id, 'view_count')
+        buffer.add(self.hot.id, 'purchase_count', 2)
+        buffer.add(self.cold.id, 'cart_add_count')
+        self.assertFalse(ProductStatistics.objects.exists())
+
+        # product lookup, savepoint, insert missing rows, one UPDATE, release
+        with self.assertNumQueries(5):
+            self.assertEqual(buffer.flush(), 2)
+        hot = ProductStatistics.objects.get(product=self.hot)
+        self.assertEqual((hot.view_count, hot.purchase_count), (50, 2))
+        self.assertEqual(ProductStatistics.objects.get(product=self.cold).cart_add_count, 1)
+
+        buffer.add(self.hot.id, 'view_count', 5)
+        buffer.flush()
+        self.assertEqual(ProductStatistics.objects.get(product=self.hot).view_count, 55)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_patch_increment_is_buffered(self):
+        client = APIClient()
+        client.force_authenticate(user=CustomUser.objects.create_user(username='viewer', password='testpassword'))
+        with mock.patch.object(counters.buffer, 'interval', 0):
+            response = client.patch(f'/api/product-statistics/{self.hot.id}/', {'view_count_increment': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(ProductStatistics.objects.get(product=self.hot).view_count, 3)
+
+    def test_negative_increments_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(user=CustomUser.objects.create_user(username='viewer', password='testpassword'))
+        response = client.patch(f'/api/product-statistics/{self.hot.id}/', {'view_count_increment': -5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn(self.hot.id, counters.buffer.pending())
+        with self.assertRaises(ValueError):
+            counters.CounterBuffer(interval=60).add(self.hot.id, 'view_count', -5)
+        response = client.patch(f'/api/product-statistics/{self.hot.id}/', {'view_count_increment': 10 ** 20}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertRaises(ValueError):
+            counters.CounterBuffer(interval=60).add(self.hot.id, 'view_count', counters.MAX_INCREMENT + 1)
+
+    def test_rejected_batch_does_not_block_other_products(self):
+        buffer = counters.CounterBuffer(interval=60)
+        buffer.add(self.cold.id, 'view_count', 3)
+        huge = Product.objects.create(title='Huge', price=1.0)
+        # Rows the database refuses, as a buffer filled before validation could hold
+        buffer._pending[self.hot.id]['view_count'] = -5
+        buffer._pending[huge.id]['view_count'] = 10 ** 20
+        with self.assertLogs('main.counters', 'ERROR'):
+            self.assertEqual(buffer.flush(), 1)
+        self.assertFalse(ProductStatistics.objects.filter(product=huge).exists())
+        self.assertEqual(buffer.pending(), {})
+        self.assertEqual(ProductStatistics.objects.get(product=self.cold).view_count, 3)
+        self.assertFalse(ProductStatistics.objects.filter(product=self.hot).exists())
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = ProductCategory.objects.create(title='GPUs')
+        self.product = Product.objects.create(title='Card', price=10.0, category=self.category)
+
+    def test_repeat_reads_skip_the_database(self):
+        self.client.get('/api/products/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.data[0]['title'], 'Card')
+        self.assertEqual(caching.stats()['hits'], 1)
+        self.assertEqual(caching.stats()['misses'], 1)
+
+    def test_saves_invalidate_dependent_responses(self):
+        self.client.get(f'/api/product/{self.product.id}/')
+        self.client.get('/api/categories/')
+        self.product.title = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.client.get(f'/api/product/{self.product.id}/').data['title'], 'Renamed')
+        # Categories don't depend on products and stay cached
+        with self.assertNumQueries(0):
+            self.client.get('/api/categories/')
+
+    def test_versions_change_only_once_the_write_commits(self):
+        path = f'/api/product/{self.product.id}/'
+        self.client.get(path)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.title = 'Renamed'
+            self.product.save()
+            # A read racing the uncommitted write keeps using the old version's entry
+            self.assertEqual(self.client.get(path).data['title'], 'Card')
+        self.assertEqual(self.client.get(path).data['title'], 'Renamed')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = ProductCategory.objects.create(title='GPUs')
+        self.product = Product.objects.create(title='Card', price=10.0, category=self.category)
+        self.customers = [
+            Customer.objects.create(user=CustomUser.objects.create_user(username=f'shopper{i}', password='pw'))
+            for i in range(2)
+        ]
+
+    def test_unchanged_resources_answer_304_without_queries(self):
+        for path in ['/api/products/', f'/api/product/{self.product.id}/', '/api/categories/',
+                     f'/api/wishlist/{self.customers[0].id}/']:
+            first = self.client.get(path)
+            self.assertEqual(first.status_code, status.HTTP_200_OK, path)
+            self.assertIn('no-cache', first['Cache-Control'])
+            with self.assertNumQueries(0):
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, path)
+            self.assertEqual(response['ETag'], first['ETag'])
+            response = self.client.get(path, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, path)
+
+    def test_writes_change_the_validators(self):
+        etag = self.client.get(f'/api/product/{self.product.id}/')['ETag']
+        self.product.price = 12.0
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(f'/api/product/{self.product.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['price'], 12.0)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_wishlist_validators_are_per_customer(self):
+        paths = [f'/api/wishlist/{customer.id}/' for customer in self.customers]
+        etags = [self.client.get(path)['ETag'] for path in paths]
+        with self.captureOnCommitCallbacks(execute=True):
+            WishlistItem.objects.create(customer=self.customers[0], product=self.product)
+        self.assertEqual(self.client.get(paths[0], HTTP_IF_NONE_MATCH=etags[0]).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(paths[1], HTTP_IF_NONE_MATCH=etags[1]).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_moving_a_wishlist_item_changes_both_customers_validators(self):
+        item = WishlistItem.objects.create(customer=self.customers[0], product=self.product)
+        paths = [f'/api/wishlist/{customer.id}/' for customer in self.customers]
+        etags = [self.client.get(path)['ETag'] for path in paths]
+        item.customer = self.customers[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        for path, etag in zip(paths, etags):
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK, path)
+
+    def test_expanded_owner_edits_refresh_only_that_wishlist(self):
+        for customer in self.customers:
+            WishlistItem.objects.create(customer=customer, product=self.product)
+        paths = [f'/api/wishlist/{customer.id}/?expand=customer.user' for customer in self.customers]
+        etags = [self.client.get(path)['ETag'] for path in paths]
+        user = self.customers[0].user
+        user.first_name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        response = self.client.get(paths[0], HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['customer']['user']['first_name'], 'Renamed')
+        self.assertEqual(self.client.get(paths[1], HTTP_IF_NONE_MATCH=etags[1]).status_code, status.HTTP_304_NOT_MODIFIED)
+        etags[0] = response['ETag']
+        self.customers[0].mobile = 777
+        # Logins write last_login only, which no wishlist renders
+        with self.captureOnCommitCallbacks() as callbacks:
+            user.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customers[0].save()
+        self.assertEqual(self.client.get(paths[0], HTTP_IF_NONE_MATCH=etags[0]).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(paths[1], HTTP_IF_NONE_MATCH=etags[1]).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_rows_are_never_not_modified(self):
+        response = self.client.get('/api/product/999999/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='shopper', password='pw', email='s@example.com')
+        self.customer = Customer.objects.create(user=self.user, mobile='555')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = ProductCategory.objects.create(title='GPUs')
+        self.products = [Product.objects.create(title=f'Card {i}', price=10.0 + i, category=category) for i in range(4)]
+        for product in self.products:
+            WishlistItem.objects.create(customer=self.customer, product=product)
+        self.order = Order.objects.create(customer=self.customer)
+        for product in self.products:
+            OrderItems.objects.create(order=self.order, product=product)
+
+    def test_relations_render_as_ids_by_default(self):
+        response = self.client.get(f'/api/customer/{self.customer.id}/')
+        self.assertEqual(response.data['user'], self.user.id)
+        items = self.client.get(f'/api/wishlist/{self.customer.id}/').data
+        self.assertEqual(sorted(item['product'] for item in items), [product.id for product in self.products])
+
+    def test_expanded_user_never_includes_the_password(self):
+        response = self.client.get(f'/api/customer/{self.customer.id}/?expand=user')
+        self.assertEqual(response.data['user']['username'], 'shopper')
+        self.assertEqual(response.data['user']['email'], 's@example.com')
+        self.assertNotIn('password', response.data['user'])
+
+    def test_expansion_is_joined_not_queried_per_row(self):
+        with CaptureQueriesContext(connection) as shallow:
+            self.client.get(f'/api/order/{self.order.id}/')
+        with CaptureQueriesContext(connection) as expanded:
+            response = self.client.get(f'/api/order/{self.order.id}/?expand=product,order.customer.user')
+        self.assertEqual(len(expanded), len(shallow))
+        self.assertEqual(response.data[0]['product']['title'], 'Card 0')
+        self.assertEqual(response.data[0]['order']['customer']['user']['username'], 'shopper')
+
+    def test_fields_trim_top_level_and_expanded_payloads(self):
+        items = self.client.get(f'/api/wishlist/{self.customer.id}/?expand=product&fields=id,product.title').data
+        self.assertEqual(set(items[0]), {'id', 'product'})
+        self.assertEqual(set(items[0]['product']), {'title'})
+        categories = self.client.get('/api/categories/?fields=id,title').data
+        self.assertEqual(set(categories[0]), {'id', 'title'})
+
+    def test_unknown_names_are_rejected(self):
+        response = self.client.get(f'/api/wishlist/{self.customer.id}/?expand=vendor')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(f'/api/customer/{self.customer.id}/?fields=id,password')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_writes_are_attributed_to_the_caller(self):
+        other = Customer.objects.create(user=CustomUser.objects.create_user(username='other', password='pw'))
+        response = self.client.post('/api/productrating/', {
+            'customer': other.id, 'product': self.products[0].id, 'rating': 5, 'reviews': 'Great',
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['customer'], self.customer.id)
+        self.assertFalse(ProductRating.objects.filter(customer=other).exists())
+        response = self.client.post('/api/orders/', {'customer': other.id})
+        self.assertEqual(response.data['customer'], self.customer.id)
+
+        rating = ProductRating.objects.create(customer=other, product=self.products[1], rating=1)
+        response = self.client.patch(f'/api/productrating/{rating.id}/', {'rating': 5})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.patch(f'/api/customer/{self.customer.id}/', {'user': other.user_id, 'mobile': '777'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(Customer.objects.values_list('user_id', 'mobile').get(pk=self.customer.pk), (self.user.pk, 777))
+
+    def test_fields_and_expand_only_shape_the_response_of_a_write(self):
+        response = self.client.post(f'/api/productrating/?fields=id,product&expand=product', {
+            'product': self.products[0].id, 'rating': 4, 'reviews': 'Fine',
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(set(response.data), {'id', 'product'})
+        self.assertEqual(response.data['product']['title'], 'Card 0')
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.gpus = ProductCategory.objects.create(title='GPUs')
+        self.cases = ProductCategory.objects.create(title='Cases')
+        self.acme = Vendor.objects.create(user=CustomUser.objects.create_user(username='acme', password='pw'))
+        self.zeta = Vendor.objects.create(user=CustomUser.objects.create_user(username='zeta', password='pw'))
+        for title, price, category, vendor in [
+            ('GPU A', 300.0, self.gpus, self.acme), ('GPU B', 800.0, self.gpus, self.zeta),
+            ('GPU C', 1200.0, self.gpus, self.acme), ('Case A', 60.0, self.cases, self.acme),
+            ('Case B', 90.0, self.cases, self.zeta),
+        ]:
+            Product.objects.create(title=title, price=price, category=category, vendor=vendor)
+        Product.objects.filter(title='GPU A').update(rating_average=4.5)
+
+    def test_list_filters_combine(self):
+        response = self.client.get(f'/api/products/?category={self.gpus.id}&vendor={self.acme.id}&max_price=1000')
+        self.assertEqual([item['title'] for item in response.data], ['GPU A'])
+        response = self.client.get('/api/products/?min_price=80&min_rating=4&ordering=price')
+        self.assertEqual([item['title'] for item in response.data], ['GPU A'])
+        response = self.client.get(f'/api/products/?category=GPU&vendor={self.acme.id},{self.zeta.id}&ordering=-price')
+        self.assertEqual([item['title'] for item in response.data], ['GPU C', 'GPU B', 'GPU A'])
+        self.assertEqual(self.client.get('/api/products/?min_price=cheap').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_facet_counts_leave_out_their_own_filter(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/products/facets/?category={self.gpus.id}&vendor={self.acme.id}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Categories are counted for acme only, vendors for GPUs only
+        self.assertEqual(
+            [(row['title'], row['count']) for row in response.data['categories']], [('GPUs', 2), ('Cases', 1)]
+        )
+        self.assertEqual([(row['name'], row['count']) for row in response.data['vendors']], [('acme', 2), ('zeta', 1)])
+        buckets = {(row['min'], row['max']): row['count'] for row in response.data['price']}
+        self.assertEqual(buckets[(250, 500)], 1)
+        self.assertEqual(buckets[(1000, None)], 1)
+        self.assertEqual(sum(buckets.values()), 2)
+
+    def test_facets_reject_bad_numbers(self):
+        response = self.client.get('/api/products/facets/?min_rating=high')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IndexAdvisorTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='planner', password='pw')
+        self.customer = Customer.objects.create(user=user)
+        product = Product.objects.create(title='Part', price=1.0)
+        order = Order.objects.create(customer=self.customer)
+        OrderItems.objects.create(order=order, product=product)
+
+    def test_sqlite_plans_flag_scans_and_temp_sorts(self):
+        lines, findings = queryplans._sqlite_findings([
+            (2, 0, 0, 'SCAN main_order'),
+            (3, 0, 0, 'SCAN main_product USING INDEX main_product_price_idx'),
+            (9, 0, 0, 'USE TEMP B-TREE FOR ORDER BY'),
+        ])
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(findings, [(queryplans.FULL_SCAN, 'main_order'), (queryplans.TEMP_SORT, 'ORDER BY')])
+
+    def test_suggestions_put_equality_columns_before_ordering(self):
+        items = OrderItems.objects.filter(order_id=1, quantity__gte=2).order_by('-status')
+        self.assertEqual(queryplans.suggest(items), (OrderItems, ('order', 'status')))
+        items = OrderItems.objects.filter(order_id=1, quantity__gte=2)
+        self.assertEqual(queryplans.suggest(items), (OrderItems, ('order', 'quantity')))
+        # Already indexed
+        self.assertIsNone(queryplans.suggest(Order.objects.filter(customer_id=1).order_by('-order_time')))
+        self.assertIsNone(queryplans.suggest(OrderItems.objects.filter(order_id=1)))
+
+    def test_rollup_order_line_lookup_is_served_by_the_order_index(self):
+        plan, = queryplans.capture({'order_existing_lines': queryplans.representative_queries()['order_existing_lines']})
+        self.assertEqual(plan.findings, [])
+        self.assertIsNone(plan.suggestion)
+
+    def test_flagged_queries_produce_a_migration(self):
+        plans = queryplans.capture({'by_quantity': OrderItems.objects.filter(order__customer=self.customer).order_by('quantity')})
+        indexes = queryplans.suggested_indexes(plans)
+        self.assertEqual([(model, index.fields) for model, index in indexes], [(OrderItems, ['quantity'])])
+        filename, source = queryplans.migration(indexes)
+        self.assertTrue(filename.endswith('_suggested_indexes.py'))
+        self.assertIn("migrations.AddIndex(", source)
+        self.assertIn("fields=['quantity']", source)
+
+    def test_command_explains_representative_queries_and_logs(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.log', delete=False) as log:
+            log.write(json.dumps({'sql': 'SELECT * FROM main_orderitems WHERE quantity > %s', 'params': [1]}) + '\n')
+            log.write('SELECT id FROM main_order WHERE customer_id = ?\n')
+        self.addCleanup(os.remove, log.name)
+        out = io.StringIO()
+        call_command('advise_indexes', '--log', log.name, '--check', stdout=out)
+        output = out.getvalue()
+        self.assertIn('log:1: full scan: main_orderitems', output)
+        self.assertNotIn('log:2', output)
+        self.assertIn('0 indexes suggested', output)
+
+
+class CategoryStatsTests(TestCase):
+    def test_stats_for_every_category_in_one_query(self):
+        cache.clear()
+        acme = Vendor.objects.create(user=CustomUser.objects.create_user(username='acme', password='pw'))
+        zeta = Vendor.objects.create(user=CustomUser.objects.create_user(username='zeta', password='pw'))
+        categories = [ProductCategory.objects.create(title=f'Category {i}') for i in range(6)]
+        for price, vendor in [(10.0, acme), (30.0, acme), (50.0, zeta)]:
+            Product.objects.create(title='Part', price=price, category=categories[0], vendor=vendor)
+        client = APIClient()
+        client.force_authenticate(user=acme.user)
+        with self.assertNumQueries(1):
+            response = client.get('/api/categories-with-stats/')
+        stats = {row['id']: row for row in response.data}
+        self.assertEqual(len(stats), 6)
+        first = stats[categories[0].id]
+        self.assertEqual((first['product_count'], first['vendor_count']), (3, 2))
+        self.assertEqual((first['min_price'], first['max_price'], first['avg_price']), (10.0, 50.0, 30.0))
+        empty = stats[categories[1].id]
+        self.assertEqual((empty['product_count'], empty['vendor_count'], empty['avg_price']), (0, 0, None))
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.gpus = ProductCategory.objects.create(title='Graphics Cards')
+        self.fast = Product.objects.create(title='Radeon RX 7900', detail='Fast graphics', price=900.0, category=self.gpus)
+        self.slow = Product.objects.create(title='Office Mouse', detail='Works with any radeon build', price=9.0)
+
+    def search(self, q):
+        response = self.client.get('/api/search/', {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['data']]
+
+    def test_ranks_title_matches_first(self):
+        self.assertEqual(self.search('radeon'), [self.fast.id, self.slow.id])
+
+    def test_index_follows_product_and_category_changes(self):
+        self.assertEqual(self.search('graphics card'), [self.fast.id])
+        self.gpus.title = 'Video Adapters'
+        self.gpus.save()
+        self.assertEqual(self.search('adapter'), [self.fast.id])
+        self.fast.delete()
+        self.assertEqual(self.search('radeon'), [self.slow.id])
+
+    def test_paginates_with_envelope(self):
+        response = self.client.get('/api/search/', {'q': 'radeon', 'page_size': 1})
+        self.assertEqual(response.data['count'], 2)
+        self.assertIsNotNone(response.data['links']['next'])
+        self.assertEqual(len(response.data['data']), 1)
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username='seller', password='testpassword', isVendor=True)
+        self.vendor = Vendor.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.gpus = ProductCategory.objects.create(title='GPUs')
+
+    def upload(self, name, content, **data):
+        return self.client.post('/api/vendor/products/import/',
+                                {'file': SimpleUploadedFile(name, content if isinstance(content, bytes) else content.encode('utf-8')), **data},
+                                format='multipart')
+
+    def test_csv_import_reports_bad_rows_without_aborting(self):
+        content = (
+            'title,price,category,images\n'
+            'Card A,199.99,gpus,uploads/a1.jpg|uploads/a2.jpg\n'
+            ',10,GPUs,\n'
+            'Card B,cheap,GPUs,\n'
+            'Card C,5,Monitors,\n'
+            'Card D,49,,\n'
+        )
+        response = self.upload('products.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 3))
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4, 5])
+        card = Product.objects.get(title='Card A')
+        self.assertEqual((card.vendor_id, card.category_id), (self.vendor.id, self.gpus.id))
+        self.assertEqual(ProductImage.objects.filter(product=card).count(), 2)
+
+    def test_ndjson_import_can_create_categories(self):
+        content = '{"title": "Case", "price": 80, "category": "Cases"}\nnot json\n'
+        response = self.upload('products.ndjson', content, create_categories='true')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertEqual(Product.objects.get(title='Case').category.title, 'Cases')
+
+    def test_paths_outside_media_root_are_rejected(self):
+        content = (
+            '{"title": "Leak", "price": 1, "thumbnail": "../../../../etc/passwd"}\n'
+            '{"title": "Abs", "price": 1, "images": ["/etc/passwd"]}\n'
+            '{"title": "Climb", "price": 1, "images": "uploads/ok.jpg|uploads/../../x.jpg"}\n'
+            '{"title": "Fine", "price": 1, "thumbnail": "uploads/fine.jpg"}\n'
+        )
+        response = self.upload('products.ndjson', content)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 3))
+        self.assertEqual(set(Product.objects.values_list('title', flat=True)), {'Fine'})
+        self.assertIn('thumbnail', response.data['errors'][0]['errors'])
+
+    def test_undecodable_upload_is_a_row_error(self):
+        response = self.upload('products.csv', b'title,price\nCard A,10\n\xff\xfe,1\nCard B,2\n')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 3)
+        response = self.upload('products.csv', b'\xff\xfetitle,price\n')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['failed'], 1)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = self.settings(MEDIA_ROOT=self.media, MEDIA_URL='/media/')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def png(self, name, width, height):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (width, height), (200, 30, 30, 255)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_renders_variants_and_list_exposes_srcset(self):
+        with mock.patch.object(images, 'WORKERS', 0), self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(title='Monitor', price=300, thumbnail=self.png('monitor.png', 400, 200))
+        product.refresh_from_db()
+        # 640 and 1024 would upscale the 400px original, so they collapse into a 400w copy
+        self.assertEqual(sorted(product.thumbnail_variants['webp'], key=int), ['160', '320', '400'])
+        for path in product.thumbnail_variants['jpeg'].values():
+            with Image.open(os.path.join(self.media, path)) as rendered:
+                self.assertEqual(rendered.format, 'JPEG')
+
+        response = APIClient().get('/api/products/')
+        srcset = response.data[0]['thumbnail_srcset']
+        self.assertEqual(sorted(srcset), ['jpeg', 'webp'])
+        self.assertTrue(srcset['webp'].startswith('http://testserver/media/derivatives/'))
+        self.assertTrue(srcset['webp'].endswith(' 400w'))
+
+    def test_bulk_generation_uses_process_pool(self):
+        product = Product.objects.create(title='Case', price=80)
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=default_storage.save(f'uploads/case-{i}.png', self.png('case.png', 1200, 900)))
+            for i in range(3)
+        ])
+        rendered, failed = images.generate(kinds=['image'], workers=2)
+        self.assertEqual((rendered, failed), (3, 0))
+        for image in ProductImage.objects.all():
+            self.assertTrue(images.is_current(image.image.name, image.image_variants))
+            self.assertEqual(sorted(image.image_variants['webp'], key=int), ['160', '320', '640', '1024'])
+        # Everything is current now, so a second run has nothing to do
+        self.assertEqual(images.generate(kinds=['image'], workers=2), (0, 0))
+
+    def test_paths_outside_media_root_are_skipped(self):
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside, ignore_errors=True)
+        with open(os.path.join(outside, 'secret.png'), 'wb') as handle:
+            handle.write(self.png('secret.png', 400, 200).read())
+        name = os.path.relpath(os.path.join(outside, 'secret.png'), self.media)
+        with self.assertLogs('main.images', 'WARNING'):
+            self.assertEqual(images.render_job(('image', 1, name)), ('image', 1, None))
+        self.assertEqual(os.listdir(outside), ['secret.png'])
+        self.assertEqual(os.listdir(self.media), [])
+
+
+class ProductDetailQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = ProductCategory.objects.create(title='GPUs')
+        user = CustomUser.objects.create_user(username='reviewer', password='testpassword')
+        self.customer = Customer.objects.create(user=user, mobile=5550100)
+
+    def add_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(title=f'Card {i}', price=100 + i, category=self.category)
+            ProductImage.objects.create(product=product, image=f'uploads/card-{i}.jpg')
+            for rating in range(1, 13):
+                ProductRating.objects.create(customer=self.customer, product=product, rating=rating % 5 + 1, reviews=f'Review {rating}')
+        return product
+
+    def test_listing_cost_is_constant_per_page(self):
+        self.add_products(2)
+        # products, images, ratings slice, explicit relations, category fallback
+        with self.assertNumQueries(5):
+            self.client.get('/api/product/')
+        cache.clear()
+        last = self.add_products(8)
+        first = Product.objects.order_by('id').first()
+        RelatedProduct.objects.create(source_product=first, target_product=last, relation_type='manual')
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/product/')
+
+        payload = {row['id']: row for row in response.data}
+        self.assertEqual(len(payload), 10)
+        self.assertEqual([p['id'] for p in payload[first.id]['related_products']], [last.id])
+        fallback = [p['id'] for p in payload[last.id]['related_products']]
+        self.assertEqual(len(fallback), 5)
+        self.assertNotIn(last.id, fallback)
+        self.assertEqual(len(payload[last.id]['product_images']), 1)
+        # Ratings are bounded and newest first
+        self.assertEqual(len(payload[last.id]['product_ratings']), PRODUCT_RATINGS_LIMIT)
+        self.assertEqual(payload[last.id]['product_ratings'][0], '3-Review 12')
+
+    def test_single_product_matches_list_payload(self):
+        product = self.add_products(3)
+        listed = {row['id']: row for row in self.client.get('/api/product/').data}[product.id]
+        self.assertEqual(self.client.get(f'/api/product/{product.id}/').data, listed)
+
+
+class ProductRatingAggregateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = CustomUser.objects.create_user(username='critic', password='testpassword')
+        self.customer = Customer.objects.create(user=user, mobile=5550101)
+        self.good = Product.objects.create(title='Good', price=10)
+        self.bad = Product.objects.create(title='Bad', price=10)
+
+    def rate(self, product, rating):
+        return ProductRating.objects.create(customer=self.customer, product=product, rating=rating, reviews='...')
+
+    def aggregates(self, product):
+        product.refresh_from_db()
+        return product.rating_count, product.rating_sum, product.rating_average, ratings.histogram(product)
+
+    def test_saving_an_older_copy_keeps_newer_aggregates(self):
+        stale = Product.objects.get(pk=self.good.pk)
+        self.rate(self.good, 5)
+        Product.objects.filter(pk=self.good.pk).update(thumbnail_variants={'source': 'uploads/good.png'})
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual(self.aggregates(self.good)[:3], (1, 5, 5.0))
+        self.assertEqual((self.good.title, self.good.thumbnail_variants), ('Renamed', {'source': 'uploads/good.png'}))
+
+    def test_writes_keep_aggregates_in_step(self):
+        self.rate(self.good, 5)
+        four = self.rate(self.good, 4)
+        one = self.rate(self.bad, 1)
+        self.assertEqual(self.aggregates(self.good), (2, 9, 4.5, {'1': 0, '2': 0, '3': 0, '4': 1, '5': 1}))
+
+        four.rating = 2
+        four.save()
+        self.assertEqual(self.aggregates(self.good)[:3], (2, 7, 3.5))
+        # Moving a rating to another product updates both
+        four.product = self.bad
+        four.save()
+        self.assertEqual(self.aggregates(self.good)[:3], (1, 5, 5.0))
+        self.assertEqual(self.aggregates(self.bad), (2, 3, 1.5, {'1': 1, '2': 1, '3': 0, '4': 0, '5': 0}))
+        one.delete()
+        four.delete()
+        self.assertEqual(self.aggregates(self.bad), (0, 0, 0.0, {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0}))
+
+    def test_rebuild_matches_incremental_updates(self):
+        for rating in (5, 4, 4, 7):
+            self.rate(self.good, rating)
+        self.rate(self.bad, 2)
+        expected = [self.aggregates(self.good), self.aggregates(self.bad)]
+        Product.objects.update(rating_count=0, rating_sum=0, rating_average=0, rating_5_count=0)
+        self.assertEqual(ratings.rebuild(), 2)
+        self.assertEqual([self.aggregates(self.good), self.aggregates(self.bad)], expected)
+
+    def test_product_list_orders_by_rating(self):
+        self.rate(self.good, 5)
+        self.rate(self.bad, 2)
+        unrated = Product.objects.create(title='New', price=10)
+        response = APIClient().get('/api/products/?ordering=-rating')
+        self.assertEqual([row['id'] for row in response.data], [self.good.id, self.bad.id, unrated.id])
+        self.assertEqual(response.data[0]['rating_histogram']['5'], 1)
+        page = APIClient().get('/api/products/?ordering=-rating&page_size=2').data
+        self.assertEqual([row['title'] for row in page['data']], ['Good', 'Bad'])
+
+
+class SyntheticDatasetTests(TestCase):
+    def test_generation_is_deterministic_and_keeps_derived_tables_in_step(self):
+        sizes = dict(vendors=2, categories=3, products=30, customers=5, orders=12, ratings_count=40, interactions=25)
+        created = synthetic.generate(seed=7, **sizes)
+        self.assertEqual((created['products'], created['ratings'], created['interactions']), (30, 40, 25))
+        titles = list(Product.objects.order_by('id').values_list('title', 'price'))
+        self.assertEqual(sum(Product.objects.values_list('rating_count', flat=True)), 40)
+        # No missing image files: saving a generated product queues no derivative render
+        self.assertFalse(Product.objects.exclude(thumbnail='').exists())
+        product = Product.objects.first()
+        with mock.patch.object(images, 'schedule') as schedule, self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        schedule.assert_not_called()
+        self.assertEqual(VendorSalesRollup.objects.aggregate(total=Sum('quantity_sold'))['total'],
+                         OrderItems.objects.aggregate(total=Sum('quantity'))['total'])
+        with self.assertRaises(ValueError):
+            synthetic.generate(seed=7, **sizes)
+
+        synthetic.generate(seed=7, prefix='again', **sizes)
+        self.assertEqual(list(Product.objects.order_by('id').values_list('title', 'price')[30:]), titles)
+
+    def test_benchmark_statistics_and_query_counts(self):
+        summary = benchmark.summarize([(200, ms / 1000) for ms in range(1, 101)] + [(500, 0.5)], elapsed=2.0)
+        self.assertEqual(summary['latency_ms']['p50'], 51)
+        self.assertEqual(summary['latency_ms']['p99'], 100)
+        self.assertEqual((summary['errors'], summary['throughput_rps']), (1, 50.5))
+
+        synthetic.generate(vendors=1, categories=2, products=10, customers=2, orders=3, ratings_count=5, interactions=4)
+        calls = benchmark.build_calls('product_detail', 3, random.Random(1))
+        counts = benchmark.count_queries(calls, 'testserver')
+        self.assertEqual(counts['samples'], 3)
+        self.assertGreater(counts['mean'], 0)
+
+
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = ProductCategory.objects.create(title='GPUs')
+        for i in range(6):
+            Product.objects.create(title=f'Card {i}', price=10 + i, category=self.category)
+
+    def test_disabled_by_default(self):
+        response = APIClient().get('/api/products/')
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_SAMPLE_RATE=1.0, REQUEST_PROFILING_SLOW_MS=0)
+    def test_sampled_request_reports_timing_and_logs(self):
+        with self.assertLogs('main.profiling', level='WARNING') as logs:
+            response = APIClient().get('/api/products/')
+        timing = response['Server-Timing']
+        for metric in ('db;dur=', 'view;dur=', 'serialize;dur=', 'render;dur=', 'total;dur='):
+            self.assertIn(metric, timing)
+        self.assertIn('desc="1 queries"', timing)
+        record = json.loads(logs.records[0].getMessage().split(' ', 1)[1])
+        self.assertEqual((record['path'], record['queries'], record['sampled']), ('/api/products/', 1, True))
+
+    @override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_untouched(self):
+        response = APIClient().get('/api/products/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_repeated_query_shapes_are_grouped(self):
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile):
+            for product in Product.objects.all():
+                # One query per row: the classic N+1
+                ProductCategory.objects.get(pk=product.category_id)
+            list(Product.objects.filter(pk__in=[1, 2]))
+            list(Product.objects.filter(pk__in=[1, 2, 3]))
+        repeated = profile.repeated(threshold=5)
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0][1], 6)
+        self.assertEqual(profile.queries, 9)
+        self.assertEqual(len(profile.repeated(threshold=2)), 2)
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        user_states.clear()
+        self.user = CustomUser.objects.create_user(username='seller', password='secret-pass', isVendor=True)
+        self.vendor = Vendor.objects.create(user=self.user, address='1 Main St')
+        Product.objects.create(title='Card', price=10, vendor=self.vendor)
+
+    def tearDown(self):
+        user_states.clear()
+
+    def test_login_token_carries_profile_claims(self):
+        response = self.client.post('/api/login/', {'username': 'seller', 'password': 'secret-pass'})
+        data = response.json()
+        self.assertEqual((data['user_type'], data['vendor_id']), ('vendor', self.vendor.pk))
+        token = AccountToken(data['refresh'])
+        self.assertEqual((token['user_type'], token['vendor_id'], token['customer_id']), ('vendor', self.vendor.pk, None))
+
+    def test_claims_token_skips_user_lookup(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccountToken.for_user(self.user).access_token}')
+        # First request reads is_active; after that only the products query is left
+        with self.assertNumQueries(2):
+            first = client.get('/api/vendor/products/')
+        with self.assertNumQueries(1):
+            second = client.get('/api/vendor/products/')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(len(second.data), 1)
+
+    def test_deactivated_user_is_rejected_once_state_expires(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccountToken.for_user(self.user).access_token}')
+        self.assertEqual(client.get('/api/vendor/products/').status_code, 200)
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        user_states.clear()
+        self.assertEqual(client.get('/api/vendor/products/').status_code, 401)
+
+    def test_tokens_without_claims_still_work(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        response = client.get('/api/vendor/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertNotIsInstance(response.wsgi_request.user, ClaimsUser)
+
+    def test_refresh_rereads_profile_claims(self):
+        refresh = AccountToken.for_user(self.user)
+        self.assertIsNone(refresh['customer_id'])
+        CustomUser.objects.filter(pk=self.user.pk).update(isVendor=False, isCustomer=True)
+        customer = Customer.objects.create(user=self.user)
+        response = self.client.post('/api/token/refresh/', {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        access = AccessToken(response.json()['access'])
+        self.assertEqual((access['user_type'], access['customer_id'], access['vendor_id']), ('customer', customer.pk, None))
+
+
+class AsyncDashboardTests(TransactionTestCase):
+    # Committed rows, so the dashboard pool threads' own connections can see them
+
+    def setUp(self):
+        cache.clear()
+        user_states.clear()
+        self.user = CustomUser.objects.create_user(username='buyer', password='testpassword', isCustomer=True)
+        self.customer = Customer.objects.create(user=self.user)
+        seller = CustomUser.objects.create_user(username='seller', password='testpassword', isVendor=True)
+        self.vendor = Vendor.objects.create(user=seller, address='1 Main St')
+        self.seller = seller
+        WishlistItem.objects.create(customer=self.customer,
+                                    product=Product.objects.create(title='Wish', price=5.0, vendor=self.vendor))
+        for i in range(3):
+            order = Order.objects.create(customer=self.customer)
+            product = Product.objects.create(title=f'Part {i}', price=10.0, vendor=self.vendor)
+            OrderItems.objects.create(order=order, product=product, quantity=i + 1)
+
+    def tearDown(self):
+        user_states.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccountToken.for_user(user).access_token}')
+        return client
+
+    def test_async_dashboards_match_sync(self):
+        for user, kind, pk in ((self.user, 'customer', self.customer.pk), (self.seller, 'vendor', self.vendor.pk)):
+            client = self.client_for(user)
+            sync = client.get(f'/api/{kind}/dashboard/{pk}/')
+            concurrent = client.get(f'/api/async/{kind}/dashboard/{pk}/')
+            self.assertEqual(concurrent.status_code, 200)
+            self.assertEqual(concurrent.json(), json.loads(json.dumps(sync.data)))
+        self.assertEqual(concurrent.json()['total_orders'], 3)
+
+    def test_async_dashboard_checks_access(self):
+        self.assertEqual(APIClient().get(f'/api/async/customer/dashboard/{self.customer.pk}/').status_code, 401)
+        client = self.client_for(self.seller)
+        self.assertEqual(client.get(f'/api/async/customer/dashboard/{self.customer.pk}/').status_code, 403)
+        self.assertEqual(client.get('/api/async/vendor/dashboard/999999/').status_code, 404)
+
+    def test_async_dashboard_refuses_before_running_the_aggregates(self):
+        client = self.client_for(self.seller)
+        with mock.patch.object(dashboards, 'gather') as gather:
+            self.assertEqual(client.get(f'/api/async/customer/dashboard/{self.customer.pk}/').status_code, 403)
+            self.assertEqual(client.get('/api/async/customer/dashboard/999999/').status_code, 404)
+            self.assertEqual(self.client_for(self.user).get(
+                f'/api/async/vendor/dashboard/{self.vendor.pk}/').status_code, 403)
+        gather.assert_not_called()
+
+    def test_gather_runs_queries_on_the_pool(self):
+        threads = async_to_sync(dashboards.gather)({
+            name: (lambda: threading.current_thread().name) for name in ('a', 'b', 'c')
+        })
+        self.assertEqual(list(threads), ['a', 'b', 'c'])
+        self.assertTrue(all(name.startswith('dashboard') for name in threads.values()))
+        results = async_to_sync(dashboards.gather)(dashboards.customer_queries(self.customer.pk))
+        self.assertEqual(dashboards.customer_payload(results)['total_wishlist_items'], 1)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        user_states.clear()
+        self.user = CustomUser.objects.create_user(username='buyer', password='testpassword', isCustomer=True)
+        self.customer = Customer.objects.create(user=self.user)
+        seller = CustomUser.objects.create_user(username='seller', password='testpassword', isVendor=True)
+        self.vendor = Vendor.objects.create(user=seller, address='1 Main St')
+        self.products = [Product.objects.create(title=f'Part {i}', price=10.0 + i, vendor=self.vendor) for i in range(25)]
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccountToken.for_user(self.user).access_token}')
+
+    def tearDown(self):
+        user_states.clear()
+
+    def checkout(self, products, quantity=2):
+        return self.client.post('/api/checkout/', {
+            'order_items': [{'product': product.pk, 'quantity': quantity} for product in products],
+        }, format='json')
+
+    def test_checkout_writes_order_statistics_and_interactions(self):
+        CustomerProductInteraction.objects.create(customer=self.customer, product=self.products[0], view_count=4)
+        response = self.checkout(self.products[:3])
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.customer_id, self.customer.pk)
+        self.assertEqual(sorted(order.order_items.values_list('product_id', 'quantity')),
+                         [(product.pk, 2) for product in self.products[:3]])
+        self.assertEqual(len(response.data['order_items']), 3)
+        self.assertEqual(sorted(ProductStatistics.objects.values_list('product_id', 'purchase_count')),
+                         [(product.pk, 1) for product in self.products[:3]])
+        interactions = CustomerProductInteraction.objects.filter(customer=self.customer)
+        self.assertEqual(interactions.filter(purchased=True).count(), 3)
+        self.assertEqual(interactions.get(product=self.products[0]).view_count, 4)
+        self.assertEqual(interactions.get(product=self.products[0]).interaction_score, 4 + 5)
+        rollup = VendorSalesRollup.objects.get(vendor=self.vendor)
+        self.assertEqual((rollup.order_count, rollup.quantity_sold, rollup.revenue), (1, 6, 2 * (10 + 11 + 12)))
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        # The first request also reads the user's active flag
+        self.checkout(self.products[:1])
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.checkout(self.products[1:3]).status_code, 201)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.checkout(self.products[3:]).status_code, 201)
+        self.assertEqual(len(small), len(large))
+        incremental = sorted(VendorProductSalesRollup.objects.values_list('product_id', 'order_count', 'quantity_sold', 'revenue'))
+        rollups.rebuild()
+        self.assertEqual(incremental, sorted(VendorProductSalesRollup.objects.values_list(
+            'product_id', 'order_count', 'quantity_sold', 'revenue')))
+
+    def test_invalid_cart_writes_nothing(self):
+        response = self.client.post('/api/checkout/', {
+            'order_items': [{'product': self.products[0].pk}, {'product': 999999}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999999', response.data['error'])
+        self.assertEqual(self.client.post('/api/checkout/', {'order_items': []}, format='json').status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(ProductStatistics.objects.exists())
+
+    def test_only_customers_can_check_out(self):
+        client = APIClient()
+        client.force_authenticate(user=self.vendor.user)
+        self.assertEqual(client.post('/api/checkout/', {'order_items': [{'product': self.products[0].pk}]},
+                                     format='json').status_code, 404)
+
+
+class InteractionEventTests(TestCase):
+    def setUp(self):
+        user_states.clear()
+        self.user = CustomUser.objects.create_user(username='buyer', password='testpassword', isCustomer=True)
+        self.customer = Customer.objects.create(user=self.user)
+        self.products = [Product.objects.create(title=f'Part {i}', price=10.0) for i in range(20)]
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccountToken.for_user(self.user).access_token}')
+
+    def tearDown(self):
+        user_states.clear()
+
+    def send(self, events):
+        return self.client.post('/api/interaction-events/', {'events': events}, format='json')
+
+    def test_events_merge_into_one_row_per_product(self):
+        first, second = self.products[:2]
+        CustomerProductInteraction.objects.create(customer=self.customer, product=first, viewed=True, view_count=4)
+        with mock.patch.object(counters.buffer, 'interval', 0):
+            response = self.send([
+                {'product': first.pk, 'event': 'view', 'count': 2},
+                {'product': first.pk, 'event': 'view', 'count': 3},
+                {'product': first.pk, 'event': 'cart'},
+                {'product': second.pk, 'event': 'wishlist'},
+                {'product': 999999, 'event': 'view'},
+            ])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, {'events': 5, 'interactions': 2})
+        rows = {row.product_id: row for row in CustomerProductInteraction.objects.filter(customer=self.customer)}
+        self.assertEqual(len(rows), 2)
+        self.assertEqual((rows[first.pk].view_count, rows[first.pk].added_to_cart, rows[first.pk].interaction_score),
+                         (9, True, 9 + 3))
+        self.assertEqual((rows[second.pk].viewed, rows[second.pk].added_to_wishlist, rows[second.pk].interaction_score),
+                         (False, True, 2))
+        stats = {row.product_id: row for row in ProductStatistics.objects.all()}
+        self.assertEqual((stats[first.pk].view_count, stats[first.pk].cart_add_count), (5, 1))
+        self.assertEqual(stats[second.pk].wishlist_add_count, 1)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        user_states.is_active(self.user.pk)
+        with mock.patch.object(counters.buffer, 'interval', 0):
+            with CaptureQueriesContext(connection) as small:
+                self.send([{'product': product.pk, 'event': 'view'} for product in self.products[:2]])
+            with CaptureQueriesContext(connection) as large:
+                self.send([{'product': product.pk, 'event': event} for product in self.products for event in ('view', 'cart')])
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(CustomerProductInteraction.objects.filter(added_to_cart=True).count(), 20)
+
+    def test_clients_cannot_send_purchases(self):
+        response = self.send([{'product': self.products[0].pk, 'event': 'purchase'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.send([]).status_code, 400)
+        self.assertFalse(CustomerProductInteraction.objects.exists())
+
+
+class InteractionScoringTests(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(user=CustomUser.objects.create_user(username='buyer', password='testpassword'))
+        self.fresh, self.old, self.idle = [
+            CustomerProductInteraction.objects.create(customer=customer, product=Product.objects.create(title=f'P{i}', price=1.0),
+                                                      **fields)
+            for i, fields in enumerate([
+                {'viewed': True, 'view_count': 4, 'added_to_cart': True},
+                {'viewed': True, 'view_count': 4, 'added_to_cart': True, 'purchased': True},
+                {},
+            ])
+        ]
+        self.now = timezone.now()
+        # update() leaves last_interaction (auto_now) as given
+        CustomerProductInteraction.objects.filter(pk=self.fresh.pk).update(last_interaction=self.now)
+        CustomerProductInteraction.objects.filter(pk=self.old.pk).update(last_interaction=self.now - timedelta(days=30))
+
+    def test_scores_decay_with_age(self):
+        scored, updated = scoring.rescore(chunk_size=2, half_life_days=30, now=self.now)
+        self.assertEqual((scored, updated), (3, 2))
+        scores = dict(CustomerProductInteraction.objects.values_list('pk', 'interaction_score'))
+        self.assertAlmostEqual(scores[self.fresh.pk], 4 + 3, places=3)
+        self.assertAlmostEqual(scores[self.old.pk], (4 + 3 + 5) / 2, places=3)
+        self.assertEqual(scores[self.idle.pk], 0.0)
+        stamps = dict(CustomerProductInteraction.objects.values_list('pk', 'last_interaction'))
+        self.assertEqual(stamps[self.fresh.pk], self.now)
+
+    def test_unchanged_scores_are_not_rewritten(self):
+        scoring.rescore(half_life_days=30, now=self.now)
+        self.assertEqual(scoring.rescore(half_life_days=30, now=self.now), (3, 0))
+
+    def test_event_upserts_use_the_same_weights(self):
+        interaction = CustomerProductInteraction(view_count=4, added_to_cart=True, purchased=True)
+        features = np.array([[4, 1, 0, 1]], dtype=float)
+        weights = np.array([interactions.WEIGHTS[field] for field in scoring.FEATURES])
+        self.assertAlmostEqual(interactions.score(interaction),
+                               scoring.decayed_scores(features, np.zeros(1), weights, 86400.0)[0])
@@ -31,6 +31,9 @@ urlpatterns = [
     # Dashboard endpoints
     path('customer/dashboard/<int:pk>/', views.CustomerDashboardView.as_view(), name='customer_dashboard'),
     path('vendor/dashboard/<int:pk>/', views.VendorDashboardView.as_view(), name='vendor_dashboard'),
+    # Same payloads with the queries run concurrently; for ASGI deployments
+    path('async/customer/dashboard/<int:pk>/', views.customer_dashboard_async, name='customer_dashboard_async'),
+    path('async/vendor/dashboard/<int:pk>/', views.vendor_dashboard_async, name='vendor_dashboard_async'),
 
     # UserSpecific Addresses --Authtentication
     path('addresses/<int:pk>/', views.CustomerAddressList.as_view(), name='user_addresses'),
@@ -42,6 +45,7 @@ urlpatterns = [
     path('vendors/', views.VendorList.as_view()),
     path('vendor/<int:pk>/', views.VendorDetail.as_view()),
     path('vendor/products/', views.VendorProductsView.as_view(), name='vendor_products'),
+    path('vendor/products/import/', views.VendorProductImportView.as_view(), name='vendor_products_import'),
 
     #Categories --No Authtentication
     path('categories/', views.CategoryList.as_view()),
@@ -50,6 +54,10 @@ urlpatterns = [
     #Products --No Authtentication
     path('products/', views.ProductList.as_view()),
     path('products/<int:pk>/', views.ProductList.as_view()),
+    path('products/facets/', views.ProductFacetsView.as_view()),
+
+    # Full-text product search --No Authtentication
+    path('search/', views.ProductSearchView.as_view(), name='product_search'),
 
     #Customers --No Authtentication
     path('customers/', views.CustomerList.as_view()),
@@ -58,6 +66,7 @@ urlpatterns = [
     #Orders --Authtentication
     path('orders/', views.OrderList.as_view()),
     path('order/<int:pk>/', views.OrderDetail.as_view()),
+    path('checkout/', views.CheckoutView.as_view(), name='checkout'),
 
     # Related Products endpoints
     path('related-products/', views.RelatedProductList.as_view()),
@@ -69,6 +78,7 @@ urlpatterns = [
     # Customer Interactions endpoints
     path('customer-interactions/', views.CustomerProductInteractionList.as_view()),
     path('customer-interactions/<int:pk>/', views.CustomerProductInteractionDetail.as_view()),
+    path('interaction-events/', views.InteractionEventsView.as_view(), name='interaction_events'),
     
     # Recommendations endpoints
     path('recommendations/', views.RecommendedProductsView.as_view()),
@@ -78,6 +88,9 @@ urlpatterns = [
     
     # Vendor Statistics endpoint
     path('vendor/statistics/', views.VendorStatisticsView.as_view()),
+
+    # Catalog response cache counters --Admin
+    path('cache-stats/', views.CacheStatsView.as_view()),
 ]
 
 urlpatterns+=router.urls
\ No newline at end of file
@@ -1,5 +1,4 @@
 from rest_framework import generics,permissions,pagination,viewsets
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -8,10 +7,30 @@ from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view
 from . import serializers
 from . import models
+from . import recommendations
+from . import facets
+from . import itemcf
+from . import counters
+from . import search
+from . import importers
+from . import checkout
+from . import interactions
+from rest_framework.parsers import MultiPartParser
 from django.http.response import JsonResponse
 from django.contrib.auth import authenticate
 import json
 from .models import CustomUser, Customer, Vendor
+from .pagination import KeysetPagination, SearchPagination
+from .authentication import AccountToken, ClaimsJWTAuthentication, customer_id_for, vendor_id_for
+from .caching import CachedResponseMixin
+from .fieldsets import ExpandableViewMixin
+from . import caching
+from . import dashboards
+from django.db.models import Avg, Count, Max, Min, Prefetch
+from django.views.decorators.http import require_GET
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework.exceptions import ParseError, PermissionDenied
 
 @csrf_exempt
 def register(request):
@@ -77,25 +96,16 @@ def login(request):
                     'user': user.username,
                     'uid': user.id,
                 }
-                refresh = RefreshToken.for_user(user)
-                response_data['refresh'] = str(refresh)  # Remove the trailing comma and parenthesis
+                # The token carries the role and profile ids, so later requests needn't look them up
+                refresh = AccountToken.for_user(user)
+                response_data['refresh'] = str(refresh)
                 response_data['access'] = str(refresh.access_token)
-                if user.isVendor:
+                if refresh['user_type'] == 'vendor':
                     response_data['user_type'] = 'vendor'
-                    # Fetch the vendor_id if the user is a vendor
-                    try:
-                        vendor = Vendor.objects.get(user=user)
-                        response_data['vendor_id'] = vendor.id
-                    except Vendor.DoesNotExist:
-                        response_data['vendor_id'] = None
-                elif user.isCustomer:
+                    response_data['vendor_id'] = refresh['vendor_id']
+                elif refresh['user_type'] == 'customer':
                     response_data['user_type'] = 'customer'
-                    # Fetch the customer_id if the user is a customer
-                    try:
-                        customer = Customer.objects.get(user=user)
-                        response_data['customer_id'] = customer.id
-                    except Customer.DoesNotExist:
-                        response_data['customer_id'] = None
+                    response_data['customer_id'] = refresh['customer_id']
             else:
                 response_data = {
                     'bool': False,
@@ -115,22 +125,24 @@ def login(request):
 
 
 #Vendor Views
-class VendorList(generics.ListCreateAPIView):
+class VendorList(ExpandableViewMixin, generics.ListCreateAPIView):
     queryset = models.Vendor.objects.all()
     serializer_class = serializers.VendorSerializer
     permission_classes=[]
     
-class VendorDetail(generics.RetrieveUpdateDestroyAPIView):
+class VendorDetail(ExpandableViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = models.Vendor.objects.all()
     serializer_class = serializers.VendorDetailSerializer
     permission_classes=[permissions.IsAuthenticated]  
     #--this is View level authentication
 
 #Category Views
-class CategoryList(generics.ListCreateAPIView):
+class CategoryList(CachedResponseMixin, generics.ListCreateAPIView):
     queryset = models.ProductCategory.objects.all()
     serializer_class = serializers.CategorySerializer
     permission_classes=[]
+    cache_models = (models.ProductCategory,)
+    ordering_fields = {'id': 'id', 'title': 'title'}
 
 class CategoryDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = models.ProductCategory.objects.all()
@@ -138,48 +150,69 @@ class CategoryDetail(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 #Product Views
-class ProductList(generics.ListCreateAPIView):
+class ProductList(CachedResponseMixin, generics.ListCreateAPIView):
     queryset = models.Product.objects.all()
     serializer_class = serializers.ProductListSerializer
     permission_classes = []
+    cache_models = (models.Product, models.ProductCategory)
+    # Sort keys accepted by ?ordering=
+    ordering_fields = {'id': 'id', 'price': 'price', 'title': 'title', 'rating': 'rating_average'}
 
     def get_queryset(self):
         qs = super().get_queryset()
         vendor_id = self.kwargs.get('pk')
+
+        # Unpaginated lists honour ?ordering= too; the paginator re-applies it per page
+        ordering = self.request.GET.get('ordering', '')
+        if ordering.lstrip('-') in self.ordering_fields:
+            prefix = '-' if ordering.startswith('-') else ''
+            qs = qs.order_by(prefix + self.ordering_fields[ordering.lstrip('-')], prefix + 'pk')
         
         if vendor_id:
             qs = qs.filter(vendor_id=vendor_id)
         
-        # Get category from query params
-        category = self.request.GET.get('category')
-        featured = self.request.GET.get('featured')
-        
-        # Filter by category if provided
-        if category:
-            try:
-                category_id = int(category)
-                qs = qs.filter(category_id=category_id)
-            except (ValueError, TypeError):
-                # If category is not a valid integer, try to find by title
-                try:
-                    category_obj = models.ProductCategory.objects.filter(title__icontains=category).first()
-                    if category_obj:
-                        qs = qs.filter(category=category_obj)
-                except Exception as e:
-                    print(f"Error filtering by category: {str(e)}")
+        # ?category=, ?vendor=, ?min_price=, ?max_price=, ?min_rating=
+        try:
+            qs = facets.apply(qs, facets.parse(self.request.GET))
+        except facets.FacetError as e:
+            raise ParseError(str(e))
         
-        # Filter featured products if requested
+        # Featured products are the best rated ones that match
+        featured = self.request.GET.get('featured')
         if featured and featured.lower() == 'true':
-            # Implement featured product logic (e.g., products with highest ratings or sales)
-            # For now, just return the first 5 products as featured
-            qs = qs.order_by('-id')[:5]
+            qs = qs.order_by('-rating_average', '-id')[:5]
         
         return qs
         # pagination_class = pagination.PageNumberPagination --this is View level pagination
 
-class ProductDetailViewSet(viewsets.ModelViewSet):
-    queryset = models.Product.objects.all()
+# Facet counts (per category, vendor and price bucket) for the ProductList filters
+class ProductFacetsView(CachedResponseMixin, generics.GenericAPIView):
+    permission_classes = []
+    cache_models = (models.Product, models.ProductCategory)
+
+    def get(self, request, *args, **kwargs):
+        return self.cached_response(request, self.facets, *args, **kwargs)
+
+    def facets(self, request, *args, **kwargs):
+        try:
+            filters = facets.parse(request.GET)
+        except facets.FacetError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(facets.counts(filters))
+
+class ProductDetailViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    # Images and a bounded slice of ratings load in one query each for the whole page
+    queryset = models.Product.objects.prefetch_related(
+        'product_images',
+        Prefetch(
+            'product_ratings',
+            queryset=models.ProductRating.objects.order_by('-add_time', '-id')[:serializers.PRODUCT_RATINGS_LIMIT],
+            to_attr='recent_ratings',
+        ),
+    )
     serializer_class = serializers.ProductDetailSerializer
+    cache_models = (models.Product, models.ProductCategory, models.ProductImage, models.ProductRating, models.RelatedProduct)
+    ordering_fields = {'id': 'id', 'price': 'price', 'title': 'title'}
     # permission_classes = [permissions.IsAuthenticated]
     permission_classes = []
 
@@ -189,32 +222,71 @@ class ProductImageViewSet(viewsets.ModelViewSet):
     permission_classes = []
 
 #Customer Views
-class CustomerList(generics.ListCreateAPIView):
+class CustomerList(ExpandableViewMixin, generics.ListCreateAPIView):
     queryset = models.Customer.objects.all()
     serializer_class = serializers.CustomerSerializer
     permission_classes=[]
 
-class CustomerDetail(generics.RetrieveUpdateDestroyAPIView):
+class CustomerDetail(ExpandableViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = models.Customer.objects.all()
     serializer_class = serializers.CustomerDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+# Writes are attributed to the caller's Customer; the serializers' customer field is read-only
+class CallerCustomerMixin:
+    def caller_customer_id(self):
+        customer_id = customer_id_for(self.request.user)
+        if customer_id is None:
+            raise PermissionDenied('Customer not found for this user')
+        return customer_id
+
+    def perform_create(self, serializer):
+        serializer.save(customer_id=self.caller_customer_id())
+
+    def perform_update(self, serializer):
+        customer_id = self.caller_customer_id()
+        if serializer.instance.customer_id != customer_id:
+            raise PermissionDenied('You can only change your own records')
+        serializer.save(customer_id=customer_id)
+
 #Order Views
-class OrderList(generics.ListCreateAPIView):
+class OrderList(CallerCustomerMixin, ExpandableViewMixin, generics.ListCreateAPIView):
     queryset = models.Order.objects.all()
     serializer_class = serializers.OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    ordering_fields = {'id': 'id', 'order_time': 'order_time'}
+
+# Whole-cart checkout: the order and all of its lines in one transaction (see main.checkout)
+class CheckoutView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-class OrderDetail(generics.ListAPIView):
-    # queryset = models.OrderItems.objects.all()
+    def post(self, request):
+        customer_id = customer_id_for(request.user)
+        if customer_id is None:
+            return Response(
+                {"error": "Customer not found for this user"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        cart = serializers.CheckoutSerializer(data=request.data)
+        if not cart.is_valid():
+            return Response({"error": cart.errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            order, items = checkout.place_order(
+                customer_id, [(line['product'], line['quantity']) for line in cart.validated_data['order_items']]
+            )
+        except checkout.CheckoutError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = serializers.CheckoutOrderSerializer(order, context={'items': items})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+class OrderDetail(ExpandableViewMixin, generics.ListAPIView):
+    queryset = models.OrderItems.objects.all()
     serializer_class = serializers.OrderDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         order_id=self.kwargs['pk']
-        order=models.Order.objects.get(id=order_id)
-        order_items=models.OrderItems.objects.filter(order=order)
-        return order_items
+        return super().get_queryset().filter(order_id=order_id)
 
 # Customer Address List 
 class CustomerAddressList(generics.ListAPIView):
@@ -235,17 +307,22 @@ class CustomerAddressViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
 # Customer Address List 
-class ProductRatingViewSet(viewsets.ModelViewSet):
+class ProductRatingViewSet(CallerCustomerMixin, ExpandableViewMixin, viewsets.ModelViewSet):
     queryset = models.ProductRating.objects.all()
     serializer_class = serializers.ProductRatingSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 # Customer Address List 
-class WishlistItemList(generics.ListAPIView):
+class WishlistItemList(CachedResponseMixin, ExpandableViewMixin, generics.ListAPIView):
     queryset = models.WishlistItem.objects.all()
     serializer_class = serializers.WishlistDetailSerializer
     permission_classes = []
     # permission_classes = [permissions.IsAuthenticated]
+    cache_models = (models.Product,)
+
+    def cache_labels(self):
+        # Only writes to this customer's wishlist, customer row or account change the response
+        return super().cache_labels() + [caching.scoped_label(models.WishlistItem, self.kwargs['pk'])]
 
     def get_queryset(self):
         qs=super().get_queryset()
@@ -254,7 +331,7 @@ class WishlistItemList(generics.ListAPIView):
         return qs
     
 # Wishlist ViewSet ---Authentication
-class WishlistItemViewSet(viewsets.ModelViewSet):
+class WishlistItemViewSet(ExpandableViewMixin, viewsets.ModelViewSet):
     queryset = models.WishlistItem.objects.all()
     serializer_class = serializers.WishlistItemSerializer
     # permission_classes = [permissions.IsAuthenticated]
@@ -266,54 +343,23 @@ class CustomerDashboardView(APIView):
     
     def get(self, request, pk=None):
         try:
+            # Totals, recent orders and recent wishlist items (see main.dashboards)
+            queries = dashboards.customer_queries(pk)
+            # The customer row comes first, so a stranger's request stops before the other aggregates
+            results = dashboards.run({'customer': queries.pop('customer')})
+            
             # Verify the customer exists and belongs to the authenticated user
-            customer = models.Customer.objects.get(id=pk)
-            if customer.user != request.user and not request.user.is_staff:
+            owner_id = dashboards.customer_owner(results)
+            if owner_id is None:
+                raise models.Customer.DoesNotExist
+            if owner_id != request.user.id and not request.user.is_staff:
                 return Response(
                     {"error": "You do not have permission to view this dashboard"},
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            # Get customer statistics
-            total_orders = models.Order.objects.filter(customer=customer).count()
-            total_wishlist_items = models.WishlistItem.objects.filter(customer=customer).count()
-            total_addresses = models.CustomerAddress.objects.filter(customer=customer).count()
-            
-            # Get recent orders (last 5)
-            recent_orders_data = []
-            recent_orders = models.Order.objects.filter(customer=customer).order_by('-order_time')[:5]
-            for order in recent_orders:
-                order_items = models.OrderItems.objects.filter(order=order)
-                total_amount = sum(item.product.price * item.quantity for item in order_items)
-                recent_orders_data.append({
-                    'id': order.id,
-                    'date': order.order_time.strftime('%Y-%m-%d %H:%M'),
-                    'total_items': order_items.count(),
-                    'total_amount': total_amount
-                })
-            
-            # Get recent wishlist items (last 5)
-            recent_wishlist_data = []
-            recent_wishlist = models.WishlistItem.objects.filter(customer=customer).order_by('-added_at')[:5]
-            for item in recent_wishlist:
-                recent_wishlist_data.append({
-                    'id': item.id,
-                    'product_id': item.product.id,
-                    'product_title': item.product.title,
-                    'product_price': item.product.price,
-                    'added_at': item.added_at.strftime('%Y-%m-%d %H:%M')
-                })
-            
-            # Prepare response data
-            dashboard_data = {
-                'total_orders': total_orders,
-                'total_wishlist_items': total_wishlist_items,
-                'total_addresses': total_addresses,
-                'recent_orders': recent_orders_data,
-                'recent_wishlist': recent_wishlist_data
-            }
-            
-            serializer = serializers.CustomerDashboardSerializer(dashboard_data)
+            results.update(dashboards.run(queries))
+            serializer = serializers.CustomerDashboardSerializer(dashboards.customer_payload(results))
             return Response(serializer.data)
             
         except models.Customer.DoesNotExist:
@@ -327,75 +373,29 @@ class CustomerDashboardView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+
 class VendorDashboardView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request, pk=None):
         try:
+            # Product count, order/revenue totals, recent orders and top products (see main.dashboards)
+            queries = dashboards.vendor_queries(pk)
+            # Ownership first, so a stranger's request stops before the aggregates
+            results = dashboards.run({'owner': queries.pop('owner')})
+            
             # Verify the vendor exists and belongs to the authenticated user
-            vendor = models.Vendor.objects.get(id=pk)
-            if vendor.user != request.user and not request.user.is_staff:
+            owner_id = dashboards.vendor_owner(results)
+            if owner_id is None:
+                raise models.Vendor.DoesNotExist
+            if owner_id != request.user.id and not request.user.is_staff:
                 return Response(
                     {"error": "You do not have permission to view this dashboard"},
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            # Get vendor statistics
-            vendor_products = models.Product.objects.filter(vendor=vendor)
-            total_products = vendor_products.count()
-            
-            # Calculate orders and revenue
-            total_orders = 0
-            total_revenue = 0
-            order_items = models.OrderItems.objects.filter(product__vendor=vendor)
-            
-            # Get unique orders
-            unique_orders = set()
-            for item in order_items:
-                unique_orders.add(item.order.id)
-                total_revenue += item.product.price * item.quantity
-            
-            total_orders = len(unique_orders)
-            
-            # Get recent orders (last 5)
-            recent_orders_data = []
-            recent_order_items = order_items.order_by('-order__order_time')[:5]
-            for item in recent_order_items:
-                recent_orders_data.append({
-                    'order_id': item.order.id,
-                    'date': item.order.order_time.strftime('%Y-%m-%d %H:%M'),
-                    'product': item.product.title,
-                    'quantity': item.quantity,
-                    'amount': item.product.price * item.quantity
-                })
-            
-            # Get top products (by order quantity)
-            top_products_data = []
-            from django.db.models import Count, Sum
-            top_products = vendor_products.annotate(
-                order_count=Count('orderitems'),
-                total_quantity=Sum('orderitems__quantity')
-            ).order_by('-order_count')[:5]
-            
-            for product in top_products:
-                top_products_data.append({
-                    'id': product.id,
-                    'title': product.title,
-                    'price': product.price,
-                    'orders': getattr(product, 'order_count', 0),
-                    'quantity_sold': getattr(product, 'total_quantity', 0) or 0
-                })
-            
-            # Prepare response data
-            dashboard_data = {
-                'total_products': total_products,
-                'total_orders': total_orders,
-                'total_revenue': total_revenue,
-                'recent_orders': recent_orders_data,
-                'top_products': top_products_data
-            }
-            
-            serializer = serializers.VendorDashboardSerializer(dashboard_data)
+            results.update(dashboards.run(queries))
+            serializer = serializers.VendorDashboardSerializer(dashboards.vendor_payload(results))
             return Response(serializer.data)
             
         except models.Vendor.DoesNotExist:
@@ -409,17 +409,74 @@ class VendorDashboardView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+
+# Async Dashboard Views
+# Plain Django async views for ASGI deployments: the dashboard queries run
+# concurrently on the main.dashboards thread pool. DRF views are sync only,
+# so authentication and permission checks are done by hand.
+async def _dashboard_user(request):
+    """The authenticated user, or None"""
+    try:
+        authenticated = await sync_to_async(ClaimsJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return authenticated[0] if authenticated else None
+
+
+async def _async_dashboard(request, queries, owner_query, owner, payload, serializer_class, not_found):
+    user = await _dashboard_user(request)
+    if user is None:
+        return JsonResponse({"error": "Authentication credentials were not provided."},
+                            status=status.HTTP_401_UNAUTHORIZED)
+    try:
+        # Ownership first, as in the sync views, so a stranger's request never reaches the pool
+        results = await sync_to_async(dashboards.run)({owner_query: queries.pop(owner_query)})
+        owner_id = owner(results)
+        if owner_id is None:
+            return JsonResponse({"error": not_found}, status=status.HTTP_404_NOT_FOUND)
+        if owner_id != user.id and not user.is_staff:
+            return JsonResponse({"error": "You do not have permission to view this dashboard"},
+                                status=status.HTTP_403_FORBIDDEN)
+        results.update(await dashboards.gather(queries))
+        return JsonResponse(serializer_class(payload(results)).data)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def customer_dashboard_async(request, pk):
+    return await _async_dashboard(request, dashboards.customer_queries(pk), 'customer', dashboards.customer_owner,
+                                  dashboards.customer_payload,
+                                  serializers.CustomerDashboardSerializer, "Customer not found")
+
+
+@require_GET
+async def vendor_dashboard_async(request, pk):
+    return await _async_dashboard(request, dashboards.vendor_queries(pk), 'owner', dashboards.vendor_owner,
+                                  dashboards.vendor_payload,
+                                  serializers.VendorDashboardSerializer, "Vendor not found")
+
 # Vendor Products View
 class VendorProductsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    ordering_fields = {'id': 'id', 'price': 'price', 'title': 'title'}
     
     def get(self, request):
         try:
-            # Get the vendor associated with the authenticated user
-            vendor = models.Vendor.objects.get(user=request.user)
+            # Get the vendor associated with the authenticated user (from the token claims)
+            vendor_id = vendor_id_for(request.user)
+            if vendor_id is None:
+                raise models.Vendor.DoesNotExist
             
             # Get all products for this vendor
-            products = models.Product.objects.filter(vendor=vendor)
+            products = models.Product.objects.filter(vendor_id=vendor_id)
+            
+            # Paginate when the client asks for it (?page_size= / ?cursor=)
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(products, request, view=self)
+            if page is not None:
+                serializer = serializers.ProductListSerializer(page, many=True)
+                return paginator.get_paginated_response(serializer.data)
             
             # Serialize the products
             serializer = serializers.ProductListSerializer(products, many=True)
@@ -439,12 +496,14 @@ class VendorProductsView(APIView):
     
     def post(self, request):
         try:
-            # Get the vendor associated with the authenticated user
-            vendor = models.Vendor.objects.get(user=request.user)
+            # Get the vendor associated with the authenticated user (from the token claims)
+            vendor_id = vendor_id_for(request.user)
+            if vendor_id is None:
+                raise models.Vendor.DoesNotExist
             
             # Add the vendor to the product data
             product_data = request.data.copy()
-            product_data['vendor'] = vendor.id
+            product_data['vendor'] = vendor_id
             
             # Create the product
             serializer = serializers.ProductListSerializer(data=product_data)
@@ -476,6 +535,28 @@ class VendorProductsView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+# Vendor bulk product import (CSV / NDJSON upload)
+class VendorProductImportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        vendor_id = vendor_id_for(request.user)
+        if vendor_id is None:
+            return Response(
+                {"error": "Vendor not found for this user"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload a CSV or NDJSON file as 'file'"}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('format')
+        if fmt not in (None, '', 'csv', 'ndjson'):
+            return Response({"error": "format must be 'csv' or 'ndjson'"}, status=status.HTTP_400_BAD_REQUEST)
+        create_categories = str(request.data.get('create_categories', '')).lower() in ('1', 'true', 'yes')
+        result = importers.import_upload(vendor_id, upload, fmt=fmt or None, create_categories=create_categories)
+        return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST)
+
 # Related Products API views
 class RelatedProductList(generics.ListCreateAPIView):
     queryset = models.RelatedProduct.objects.all()
@@ -486,7 +567,10 @@ class RelatedProductList(generics.ListCreateAPIView):
         product_id = self.request.query_params.get('product_id')
         if product_id:
             queryset = queryset.filter(source_product_id=product_id)
-        return queryset
+        relation_type = self.request.query_params.get('relation_type')
+        if relation_type:
+            queryset = queryset.filter(relation_type=relation_type)
+        return queryset.order_by('-relevance_score')
 
 
 class RelatedProductDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -504,6 +588,25 @@ class ProductStatisticsView(generics.RetrieveUpdateAPIView):
         stats, created = models.ProductStatistics.objects.get_or_create(product_id=product_id)
         return stats
 
+    def patch(self, request, *args, **kwargs):
+        # {"view_count_increment": 1, ...} is buffered and written behind;
+        # plain field values still go through the regular partial update
+        increments = {
+            field: request.data[f'{field}_increment'] for field in counters.FIELDS
+            if f'{field}_increment' in request.data
+        }
+        if not increments:
+            return super().patch(request, *args, **kwargs)
+        try:
+            increments = {field: int(amount) for field, amount in increments.items()}
+        except (TypeError, ValueError):
+            return Response({"error": "Increments must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(1 <= amount <= counters.MAX_INCREMENT for amount in increments.values()):
+            return Response({"error": f"Increments must be between 1 and {counters.MAX_INCREMENT}"}, status=status.HTTP_400_BAD_REQUEST)
+        for field, amount in increments.items():
+            counters.increment(self.kwargs['pk'], field, amount)
+        return Response(increments, status=status.HTTP_202_ACCEPTED)
+
 
 # Customer Interactions API views
 class CustomerProductInteractionList(generics.ListCreateAPIView):
@@ -514,11 +617,11 @@ class CustomerProductInteractionList(generics.ListCreateAPIView):
         if not user.is_authenticated:
             return models.CustomerProductInteraction.objects.none()
             
-        customer = models.Customer.objects.filter(user=user).first()
-        if not customer:
+        customer_id = customer_id_for(user)
+        if not customer_id:
             return models.CustomerProductInteraction.objects.none()
             
-        return models.CustomerProductInteraction.objects.filter(customer=customer)
+        return models.CustomerProductInteraction.objects.filter(customer_id=customer_id)
 
 
 class CustomerProductInteractionDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -526,40 +629,106 @@ class CustomerProductInteractionDetail(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.CustomerProductInteractionSerializer
 
 
+# A session's view/cart/wishlist events in one request (see main.interactions)
+class InteractionEventsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        batch = serializers.InteractionBatchSerializer(data=request.data)
+        if not batch.is_valid():
+            return Response({"error": batch.errors}, status=status.HTTP_400_BAD_REQUEST)
+        events = [(event['product'], event['event'], event['count']) for event in batch.validated_data['events']]
+        customer_id = customer_id_for(request.user)
+        written = interactions.record(customer_id, events) if customer_id else 0
+        # Product statistics count everyone's events, buffered like the PATCH increments
+        interactions.count(events)
+        return Response({'events': len(events), 'interactions': written}, status=status.HTTP_202_ACCEPTED)
+
+
 # New view for product recommendations
+# Categories are taken from this many of the customer's top-scored interactions
+INTEREST_DEPTH = 20
+
 class RecommendedProductsView(generics.ListAPIView):
     serializer_class = serializers.ProductListSerializer
+    # A ranked list of at most ``limit`` products
+    pagination_class = None
     
     def get_queryset(self):
         user = self.request.user
         limit = int(self.request.query_params.get('limit', 5))
         
-        # If user is authenticated, try to get personalized recommendations
+        # Candidates come from the item similarity model (build_item_similarity)
+        # and the precomputed pools (refresh_recommendation_pools), both held in
+        # memory; only the chosen rows are read from the DB
         if user.is_authenticated:
-            customer = models.Customer.objects.filter(user=user).first()
-            if customer:
-                # Get recently viewed or interacted products
-                interactions = models.CustomerProductInteraction.objects.filter(customer=customer)
-                if interactions.exists():
-                    # Get products from the same categories as recently interacted products
-                    interacted_categories = models.Product.objects.filter(
-                        customer_interactions__customer=customer
-                    ).values_list('category_id', flat=True).distinct()
-                    
-                    return models.Product.objects.filter(
-                        category_id__in=interacted_categories
-                    ).exclude(
-                        customer_interactions__customer=customer
-                    ).order_by('?')[:limit]
+            customer_id = customer_id_for(user)
+            if customer_id:
+                # Interacted products, strongest (time-decayed, see rescore_interactions) first
+                interacted = list(models.CustomerProductInteraction.objects.filter(
+                    customer_id=customer_id
+                ).order_by('-interaction_score').values_list(
+                    'product_id', 'interaction_score', 'purchased', 'product__category_id'
+                ))
+                if interacted:
+                    seen = [product_id for product_id, *_ in interacted]
+                    top = interacted[:INTEREST_DEPTH]
+                    # Products similar to what the customer engaged with most, best first
+                    product_ids = itemcf.recommend(
+                        {product_id: score + purchased for product_id, score, purchased, _ in top},
+                        limit,
+                        exclude=seen,
+                    )
+                    if len(product_ids) < limit:
+                        # Top up from the pools of the same categories
+                        categories = {category_id for *_, category_id in top if category_id is not None}
+                        product_ids += recommendations.sample(
+                            [recommendations.category_key(category_id) for category_id in categories],
+                            limit - len(product_ids),
+                            exclude=seen + product_ids,
+                        )
+                    if product_ids:
+                        products = models.Product.objects.in_bulk(product_ids)
+                        return [products[pk] for pk in product_ids if pk in products]
         
-        # Fallback to popular products or featured products
-        return models.Product.objects.all().order_by('?')[:limit]
+        # Fallback to the global pool of popular products
+        product_ids = recommendations.sample([recommendations.GLOBAL_POOL], limit)
+        if product_ids:
+            return models.Product.objects.filter(id__in=product_ids)
+        # Pools not built yet
+        return models.Product.objects.order_by('-id')[:limit]
 
 
 # New view for category statistics
-class CategoryWithStatsView(generics.ListAPIView):
-    queryset = models.ProductCategory.objects.all()
+class CategoryWithStatsView(CachedResponseMixin, generics.ListAPIView):
+    # Every category's stats come from one grouped LEFT JOIN on Product
+    queryset = models.ProductCategory.objects.annotate(
+        product_count=Count('category_products'),
+        vendor_count=Count('category_products__vendor', distinct=True),
+        min_price=Min('category_products__price'),
+        max_price=Max('category_products__price'),
+        avg_price=Avg('category_products__price'),
+    )
     serializer_class = serializers.ProductCategoryWithStatsSerializer
+    cache_models = (models.ProductCategory, models.Product)
+
+
+# Full-text product search, ranked and page-number paginated
+class ProductSearchView(generics.ListAPIView):
+    serializer_class = serializers.ProductListSerializer
+    pagination_class = SearchPagination
+    permission_classes = []
+
+    def get_queryset(self):
+        return search.SearchResults(self.request.query_params.get('q', ''))
+
+
+# Response cache hit/miss counters
+class CacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(caching.stats())
 
 
 # New view for vendor statistics
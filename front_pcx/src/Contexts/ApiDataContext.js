@@ -3,7 +3,7 @@
  * Provides centralized API data fetching and caching throughout the application
  */
 import React, { createContext, useContext, useReducer, useCallback, useEffect, useState, useRef } from "react";
-import { API_BASE_URL, CACHE_EXPIRATION } from "./config";
+import { API_BASE_URL, CACHE_EXPIRATION, INTERACTION_EVENTS } from "./config";
 import { productsAPI, categoriesAPI, authAPI } from "../services/api";
 import axios from "axios";
 import { useAuth } from './AuthContext';
@@ -745,84 +745,50 @@ export const ApiDataProvider = ({ children }) => {
         }
     };
 
-    // Track product view
-    const trackProductView = async (productId) => {
-        if (!productId) return;
+    // Interaction events are queued and sent in one request per batch
+    const pendingEvents = useRef([]);
+    const flushTimer = useRef(null);
+    
+    const flushInteractionEvents = useCallback(async () => {
+        clearTimeout(flushTimer.current);
+        flushTimer.current = null;
+        const events = pendingEvents.current.splice(0);
+        if (events.length === 0 || !authState.token) return;
         
         try {
-            const customerId = await getCustomerId();
-            
-            if (customerId) {
-                // For logged in users, track on the server
-                await fetchData(`/customer-interactions/`, 'POST', {
-                    customer: customerId,
-                    product: productId,
-                    viewed: true,
-                    view_count: 1
-                });
-            }
-            
-            // Always increment product statistics (anonymous)
-            await fetchData(`/product-statistics/${productId}/`, 'PATCH', {
-                view_count_increment: 1
-            });
+            // Customer interactions and product statistics are both updated server side
+            await fetchData('/interaction-events/', 'POST', { events });
         } catch (error) {
-            console.error('Error tracking product view:', error);
+            console.error('Error sending interaction events:', error);
             // Don't throw error for tracking failures
         }
-    };
+    }, [authState.token, fetchData]);
     
-    // Track cart add
-    const trackCartAdd = async (productId) => {
+    const trackEvent = useCallback((productId, event) => {
         if (!productId) return;
         
-        try {
-            const customerId = await getCustomerId();
-            
-            if (customerId) {
-                // For logged in users, track on the server
-                await fetchData(`/customer-interactions/`, 'POST', {
-                    customer: customerId,
-                    product: productId,
-                    added_to_cart: true
-                });
-            }
-            
-            // Always increment product statistics (anonymous)
-            await fetchData(`/product-statistics/${productId}/`, 'PATCH', {
-                cart_add_count_increment: 1
-            });
-        } catch (error) {
-            console.error('Error tracking cart add:', error);
-            // Don't throw error for tracking failures
+        pendingEvents.current.push({ product: Number(productId), event });
+        if (pendingEvents.current.length >= INTERACTION_EVENTS.BATCH_SIZE) {
+            flushInteractionEvents();
+        } else if (!flushTimer.current) {
+            flushTimer.current = setTimeout(flushInteractionEvents, INTERACTION_EVENTS.FLUSH_DELAY);
         }
-    };
+    }, [flushInteractionEvents]);
+    
+    // Send what is queued before the page goes away
+    useEffect(() => {
+        window.addEventListener('pagehide', flushInteractionEvents);
+        return () => window.removeEventListener('pagehide', flushInteractionEvents);
+    }, [flushInteractionEvents]);
+    
+    // Track product view
+    const trackProductView = async (productId) => trackEvent(productId, 'view');
+    
+    // Track cart add
+    const trackCartAdd = async (productId) => trackEvent(productId, 'cart');
     
     // Track wishlist add
-    const trackWishlistAdd = async (productId) => {
-        if (!productId) return;
-        
-        try {
-            const customerId = await getCustomerId();
-            
-            if (customerId) {
-                // For logged in users, track on the server
-                await fetchData(`/customer-interactions/`, 'POST', {
-                    customer: customerId,
-                    product: productId,
-                    added_to_wishlist: true
-                });
-            }
-            
-            // Always increment product statistics (anonymous)
-            await fetchData(`/product-statistics/${productId}/`, 'PATCH', {
-                wishlist_add_count_increment: 1
-            });
-        } catch (error) {
-            console.error('Error tracking wishlist add:', error);
-            // Don't throw error for tracking failures
-        }
-    };
+    const trackWishlistAdd = async (productId) => trackEvent(productId, 'wishlist');
     
     // Fetch related products
     const fetchRelatedProducts = async (productId, limit = 5) => {
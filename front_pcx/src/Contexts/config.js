@@ -31,4 +31,10 @@ export const USER_ROLES = {
 export const API_TIMEOUT = 30000;
 
 // Cache Expiration (in milliseconds)
-export const CACHE_EXPIRATION = 5 * 60 * 1000; // 5 minutes 
\ No newline at end of file
+export const CACHE_EXPIRATION = 5 * 60 * 1000; // 5 minutes 
+
+// Interaction events are sent to /interaction-events/ in batches
+export const INTERACTION_EVENTS = {
+  FLUSH_DELAY: 2000, // ms after the first queued event
+  BATCH_SIZE: 50,
+};
@@ -54,9 +54,9 @@ const UserProfile = () => {
                 // Use the appropriate endpoint based on user type
                 let endpoint;
                 if (userType === 'customer') {
-                    endpoint = `/customer/${authState.userId}/`;
+                    endpoint = `/customer/${authState.userId}/?expand=user`;
                 } else if (userType === 'vendor') {
-                    endpoint = `/vendor/${authState.userId}/`;
+                    endpoint = `/vendor/${authState.userId}/?expand=user`;
                 } else {
                     throw new Error('Unknown user type');
                 }
@@ -109,9 +109,9 @@ const UserProfile = () => {
             // Use the appropriate endpoint based on user type
             let endpoint;
             if (userType === 'customer') {
-                endpoint = `/customer/${authState.userId}/`;
+                endpoint = `/customer/${authState.userId}/?expand=user`;
             } else if (userType === 'vendor') {
-                endpoint = `/vendor/${authState.userId}/`;
+                endpoint = `/vendor/${authState.userId}/?expand=user`;
             } else {
                 throw new Error('Unknown user type');
             }
@@ -151,9 +151,9 @@ const UserProfile = () => {
             // Use the appropriate endpoint based on user type
             let endpoint;
             if (userType === 'customer') {
-                endpoint = `/customer/${authState.userId}/`;
+                endpoint = `/customer/${authState.userId}/?expand=user`;
             } else if (userType === 'vendor') {
-                endpoint = `/vendor/${authState.userId}/`;
+                endpoint = `/vendor/${authState.userId}/?expand=user`;
             } else {
                 throw new Error('Unknown user type');
             }
@@ -64,13 +64,13 @@ const UserProfile = () => {
                 if (!customerId) {
                     throw new Error('Customer ID not found. Please log in again.');
                 }
-                endpoint = `/customer/${customerId}/`;
+                endpoint = `/customer/${customerId}/?expand=user`;
             } else if (authState.userType === 'vendor') {
                 vendorId = authState.vendorId || localStorage.getItem('vendor_id');
                 if (!vendorId) {
                     throw new Error('Vendor ID not found. Please log in again.');
                 }
-                endpoint = `/vendor/${vendorId}/`;
+                endpoint = `/vendor/${vendorId}/?expand=user`;
             } else {
                 throw new Error('Unknown user type');
             }
@@ -127,9 +127,9 @@ const UserProfile = () => {
             // Use the appropriate endpoint based on user type
             let endpoint;
             if (authState.userType === 'customer') {
-                endpoint = `/customer/${authState.customerId}/`;
+                endpoint = `/customer/${authState.customerId}/?expand=user`;
             } else if (authState.userType === 'vendor') {
-                endpoint = `/vendor/${authState.vendorId}/`;
+                endpoint = `/vendor/${authState.vendorId}/?expand=user`;
             } else {
                 throw new Error('Unknown user type');
             }
@@ -178,10 +178,10 @@ const UserProfile = () => {
             };
             
             if (authState.userType === 'customer') {
-                endpoint = `/customer/${authState.customerId}/`;
+                endpoint = `/customer/${authState.customerId}/?expand=user`;
                 userData.mobile = profileData.mobile;
             } else if (authState.userType === 'vendor') {
-                endpoint = `/vendor/${authState.vendorId}/`;
+                endpoint = `/vendor/${authState.vendorId}/?expand=user`;
                 userData.address = profileData.address;
             } else {
                 throw new Error('Unknown user type');
@@ -78,6 +78,11 @@ const CategoryGrid = () => {
                                 <FontAwesomeIcon icon={faBoxOpen} />
                                 <span>{category.product_count} Products</span>
                             </div>
+                            {category.vendor_count > 0 && (
+                                <div className="stat">
+                                    <span>{category.vendor_count} Vendors</span>
+                                </div>
+                            )}
                         </div>
                     </div>
                 </Link>
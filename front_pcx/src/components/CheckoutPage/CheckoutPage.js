@@ -55,18 +55,12 @@ const CheckoutPage = () => {
             // Create order items array
             const orderItems = items.map(item => ({
                 product: item.product.id,
-                quantity: item.quantity || 1,
-                price: item.product.price
+                quantity: item.quantity || 1
             }));
             
-            // Create order
-            const response = await fetchData('/orders/', 'POST', {
-                customer: user.id,
-                order_items: orderItems,
-                order_time: new Date().toISOString(),
-                shipping_address: null, // This would be selected during checkout
-                payment_method: 'credit_card', // This would be selected during checkout
-                order_status: 'pending'
+            // Create the order and all of its items in one request
+            const response = await fetchData('/checkout/', 'POST', {
+                order_items: orderItems
             });
             
             // Clear cart after successful order
@@ -212,7 +212,7 @@ export const customerAPI = {
   addAddress: (addressData) => api.post('/address/', addressData),
   updateAddress: (id, addressData) => api.put(`/address/${id}/`, addressData),
   deleteAddress: (id) => api.delete(`/address/${id}/`),
-  getWishlist: (customerId) => api.get(`/wishlist/${customerId}/`),
+  getWishlist: (customerId) => api.get(`/wishlist/${customerId}/?expand=product`),
   addToWishlist: (wishlistData) => api.post('/wishlistitem/', wishlistData),
   removeFromWishlist: (wishlistItemId) => api.delete(`/wishlistitem/${wishlistItemId}/`),
   removeFromWishlistByProduct: (customerId, productId) => api.delete(`/wishlistitem/?customer=${customerId}&product=${productId}`),
@@ -247,7 +247,7 @@ export const cartAPI = {
 // Wishlist API - Using customerAPI methods but keeping the interface for backward compatibility
 export const wishlistAPI = {
   getWishlist: (customerId) => {
-    return api.get(`/wishlist/${customerId}/`);
+    return api.get(`/wishlist/${customerId}/?expand=product`);
   },
   addToWishlist: (wishlistData) => {
     return api.post('/wishlistitem/', wishlistData);